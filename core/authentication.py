@@ -0,0 +1,27 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+AUTH_CACHE_ATTR = '_jwt_authentication_result'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that stores its outcome on the underlying Django request,
+    so the middleware and DRF share one token decode and one user lookup.
+    """
+
+    def authenticate(self, request):
+        django_request = getattr(request, '_request', request)
+        cached = getattr(django_request, AUTH_CACHE_ATTR, None)
+
+        if cached is None:
+            try:
+                cached = (super().authenticate(request), None)
+            except AuthenticationFailed as e:
+                cached = (None, e)
+            setattr(django_request, AUTH_CACHE_ATTR, cached)
+
+        result, error = cached
+        if error is not None:
+            raise error
+        return result
@@ -0,0 +1,89 @@
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+# Samples kept per route; older ones are dropped as new requests come in.
+METRICS_SAMPLES = 500
+DUPLICATE_QUERY_LENGTH = 200
+
+# Samples of this process; read them with get_route_stats.
+_samples = defaultdict(lambda: deque(maxlen=METRICS_SAMPLES))
+_samples_lock = threading.Lock()
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times the queries of a request.
+    Queries are fingerprinted by their SQL without parameters, so the same
+    query run once per row shows up as a duplicate.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[sql] += 1
+
+    def get_duplicates(self, limit=5):
+        return {sql[:DUPLICATE_QUERY_LENGTH]: count
+                for sql, count in self.fingerprints.most_common(limit) if count > 1}
+
+
+def record(route, sample):
+    """Adds a request's timings (in ms), query count and duplicate queries to the samples of its route."""
+    with _samples_lock:
+        _samples[route].append(sample)
+
+
+def _percentile(values, percent):
+    """Helper function to get the nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def get_route_stats():
+    """
+    Returns per-route latency percentiles, database time and query counts over
+    the recent samples, slowest p95 first, with the queries most often
+    repeated within a single request.
+    """
+    with _samples_lock:
+        samples = {route: list(route_samples)
+                   for route, route_samples in _samples.items()}
+
+    stats = []
+    for route, route_samples in samples.items():
+        totals = sorted(sample['total'] for sample in route_samples)
+        queries = [sample['queries'] for sample in route_samples]
+        duplicates = Counter()
+        for sample in route_samples:
+            for sql, count in sample['duplicates'].items():
+                duplicates[sql] = max(duplicates[sql], count)
+        stats.append({
+            'route': route,
+            'requests': len(route_samples),
+            'p50_ms': round(_percentile(totals, 50), 2),
+            'p95_ms': round(_percentile(totals, 95), 2),
+            'p99_ms': round(_percentile(totals, 99), 2),
+            'db_ms_mean': round(sum(sample['db'] for sample in route_samples) / len(route_samples), 2),
+            'view_ms_mean': round(sum(sample['view'] for sample in route_samples) / len(route_samples), 2),
+            'render_ms_mean': round(sum(sample['render'] for sample in route_samples) / len(route_samples), 2),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'duplicate_queries': [{'sql': sql, 'max_per_request': count}
+                                  for sql, count in duplicates.most_common(5)],
+        })
+    return sorted(stats, key=lambda route_stats: route_stats['p95_ms'], reverse=True)
+
+
+def clear():
+    with _samples_lock:
+        _samples.clear()
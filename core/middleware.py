@@ -1,103 +1,182 @@
 import json
+import time
+from contextlib import ExitStack
+from django.db import connections
 from django.http import JsonResponse
-from django.urls import resolve
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from .models import BlacklistedToken
-import hashlib
+from . import metrics
+from .authentication import CachedJWTAuthentication
+from .utils import is_token_blacklisted
 
 
 User = get_user_model()
 
 
-class RoleBasedAccessMiddleware(MiddlewareMixin):
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        path = request.path
-        view_name = resolve(path).view_name
-        if not 'auth' in request.path or 'logout' in request.path:
-            return None
+INVALID_TOKEN_RESPONSE = {
+    "detail": "Given token not valid for any token type",
+    "code": "token_not_valid",
+    "messages": [
+        {
+            "token_class": "AccessToken",
+            "token_type": "access",
+            "message": "Token is invalid or expired"
+        }
+    ]
+}
 
-        # Attempt token validation explicitly
 
-        if 'auth' in path and not 'confirm' in path:
-            jwt_auth = JWTAuthentication()
-            if request.headers.get('Authorization'):
-                try:
-                    if jwt_auth.authenticate(request):
-                        user, token = jwt_auth.authenticate(request)
-                        request.user = user
-                    else:
-                        return JsonResponse({
-                            "detail": "Given token not valid for any token type",
-                            "code": "token_not_valid",
-                            "messages": [
-                                {
-                                    "token_class": "AccessToken",
-                                    "token_type": "access",
-                                    "message": "Token is invalid or expired"
-                                }
-                            ]
-                        }, status=401)
-                except AuthenticationFailed as e:
-                    print(f"Authentication failed: {e}")
-
-            user = request.user
-
-            if not request.user.is_authenticated:
-                if request.user.is_active != False:
-                    return JsonResponse({"detail": "User is inactive."}, status=403)
-                if not any(substring in path for substring in ['create', 'reset_password', 'logout']):
-                    return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
-                elif request.method == 'POST':
-                    data = {}
-                    if request.content_type.startswith("multipart/form-data"):
-                        data = request.POST
-                    else:
-                        decoded_body = request.body.decode(
-                            'utf-8').replace('\r\n', '')
-                        print(f"Decoded Body: {decoded_body}")
-
-                        data = json.loads(decoded_body)
-                    email = data.get('email')
-
-                    if not email:
-                        return JsonResponse({"detail": "email is required"}, status=400)
+class RouteAccess:
+    """How RoleBasedAccessMiddleware treats one URL pattern."""
 
-                    try:
-                        user = User.objects.get(email=email)
-                    except User.DoesNotExist:
-                        return JsonResponse({"detail": "User not found"}, status=404)
-                else:
-                    return None
-
-            # Check if the path belongs to "customer" or "staff" endpoints
-            if 'customer' in path and user.is_staff:
-                return JsonResponse(
-                    {"detail": "Only customers are allowed to access this page."},
-                    status=403
-                )
-            elif not 'customer' in path and not user.is_staff:
-                return JsonResponse(
-                    {"detail": "Only staff are allowed to access this page."},
-                    status=403
-                )
+    def __init__(self, route):
+        self.requires_check = 'auth' in route and not any(
+            substring in route for substring in ['logout', 'confirm'])
+        self.allows_anonymous = any(
+            substring in route for substring in ['create', 'reset_password', 'logout'])
+        self.is_customer_route = 'customer' in route
+
+
+class RoleBasedAccessMiddleware(MiddlewareMixin):
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        # Classification only depends on the matched URL pattern, so it is
+        # computed once per pattern instead of on every request.
+        self.route_access = {}
+
+    def get_route_access(self, request):
+        route = request.resolver_match.route if request.resolver_match else request.path
+        route_access = self.route_access.get(route)
+        if route_access is None:
+            route_access = self.route_access[route] = RouteAccess(route)
+        return route_access
 
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route_access = self.get_route_access(request)
+        if not route_access.requires_check:
             return None
 
-        return None  # Allow the request to proceed
+        if request.headers.get('Authorization'):
+            try:
+                result = CachedJWTAuthentication().authenticate(request)
+                if not result:
+                    return JsonResponse(INVALID_TOKEN_RESPONSE, status=401)
+                request.user, _ = result
+            except AuthenticationFailed:
+                # DRF raises the same cached error when the view authenticates.
+                pass
+
+        user = request.user
+
+        if not request.user.is_authenticated:
+            if request.user.is_active != False:
+                return JsonResponse({"detail": "User is inactive."}, status=403)
+            if not route_access.allows_anonymous:
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+            elif request.method == 'POST':
+                data = {}
+                if request.content_type.startswith("multipart/form-data"):
+                    data = request.POST
+                else:
+                    try:
+                        data = json.loads(request.body or b'{}')
+                    except ValueError:
+                        return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+                email = data.get('email') if hasattr(data, 'get') else None
+
+                if not email:
+                    return JsonResponse({"detail": "email is required"}, status=400)
 
-def hash_token(token):
-    return hashlib.sha256(token.encode()).hexdigest()
+                try:
+                    user = User.objects.get(email=email)
+                except User.DoesNotExist:
+                    return JsonResponse({"detail": "User not found"}, status=404)
+            else:
+                return None
+
+        # Check if the path belongs to "customer" or "staff" endpoints
+        if route_access.is_customer_route and user.is_staff:
+            return JsonResponse(
+                {"detail": "Only customers are allowed to access this page."},
+                status=403
+            )
+        elif not route_access.is_customer_route and not user.is_staff:
+            return JsonResponse(
+                {"detail": "Only staff are allowed to access this page."},
+                status=403
+            )
+
+        return None
 
 
 class TokenBlacklistMiddleware(MiddlewareMixin):
     def process_request(self, request):
         auth_header = request.headers.get('Authorization')
         if auth_header:
-            token = auth_header.split(' ')[1]  # Assuming 'Bearer <token>'
-            hashed_token = hash_token(token)
-            if BlacklistedToken.objects.filter(token_hash=hashed_token).exists():
+            parts = auth_header.split(' ')  # Assuming 'Bearer <token>'
+            if len(parts) == 2 and is_token_blacklisted(parts[1]):
                 return JsonResponse({'detail': 'Token is blacklisted'}, status=401)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the database queries, database time, view and render time and
+    total latency of each request, tagged by the view it resolved to (e.g.
+    store:orders-list), and sends them back in a Server-Timing header. View
+    time is the time spent in the view outside the database, which for the
+    API views is mostly serializers; render time is spent turning the
+    serialized data into JSON. Samples are kept per route by core.metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = metrics.QueryRecorder()
+        request._render_time = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        render = request._render_time
+        view = max(total - recorder.duration - render, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'view;dur={view * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        route = self.get_route(request)
+        if route:
+            metrics.record(route, {
+                'total': total * 1000,
+                'db': recorder.duration * 1000,
+                'view': view * 1000,
+                'render': render * 1000,
+                'queries': recorder.count,
+                'duplicates': recorder.get_duplicates(),
+            })
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before the response is rendered.
+        start = time.perf_counter()
+
+        def finish_render(response):
+            request._render_time += time.perf_counter() - start
+        response.add_post_render_callback(finish_render)
+        return response
+
+    def get_route(self, request):
+        """Helper function to name a request after its view, prefixed with the app the view belongs to."""
+        match = request.resolver_match
+        if match is None:
+            return None
+        app = getattr(match.func, '__module__', '').split('.')[0]
+        return f"{app}:{match.view_name}" if app else match.view_name
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_extendedgroup_for_superuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blacklistedtoken',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
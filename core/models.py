@@ -7,13 +7,28 @@ from django.contrib.auth.models import (
     BaseUserManager, PermissionsMixin, AbstractBaseUser, UserManager, AbstractUser
 )
 from django.contrib.auth.models import Group as BaseGroup
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from store.caching import is_cache_shared
 
 if django.VERSION >= (3, 2):
     from django.contrib.auth.hashers import make_password
 
+PERMISSION_CACHE_PREFIX = 'effective-permissions:'
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+
+
+def get_permission_cache_key(user_id):
+    return f"{PERMISSION_CACHE_PREFIX}{user_id}"
+
+
+def invalidate_permission_cache(user_ids):
+    """Drops the cached effective permissions of the given users."""
+    cache.delete_many([get_permission_cache_key(user_id)
+                      for user_id in user_ids])
+
 
 class CUserManager(BaseUserManager):
     use_in_migrations = True
@@ -165,9 +180,32 @@ class User(AbstractCUser):
     class Meta(AbstractCUser.Meta):
         swappable = 'AUTH_USER_MODEL'
 
+    def get_effective_permissions(self):
+        """
+        Returns (belongs to a superuser group, set of 'app_label.codename' permissions).
+        The result is memoized on the instance and kept in the shared cache until
+        invalidate_permission_cache is called for this user. A per-process cache
+        is skipped, since invalidating it would not reach the other workers.
+        """
+        if not hasattr(self, '_effective_permissions'):
+            cache_key = get_permission_cache_key(self.pk)
+            shared = is_cache_shared()
+            effective_permissions = cache.get(cache_key) if shared else None
+            if effective_permissions is None:
+                effective_permissions = (
+                    self.groups.filter(
+                        extendedgroup__for_superuser=True).exists(),
+                    frozenset(super().get_all_permissions()),
+                )
+                if shared:
+                    cache.set(cache_key, effective_permissions,
+                              PERMISSION_CACHE_TIMEOUT)
+            self._effective_permissions = effective_permissions
+        return self._effective_permissions
+
     def has_superuser_group(self):
         """Check if user is in the 'superuser' group."""
-        return self.groups.filter(extendedgroup__for_superuser=True).exists()
+        return self.get_effective_permissions()[0]
 
     def is_effective_superuser(self):
         """User is a superuser if either the DB field is set or they belong to the 'superuser' group."""
@@ -175,11 +213,20 @@ class User(AbstractCUser):
 
     def has_perm(self, perm, obj=None):
         """Grant all permissions if the user is an effective superuser."""
-        return self.is_effective_superuser() or super().has_perm(perm, obj)
+        if self.is_effective_superuser():
+            return True
+        if obj is not None:
+            return super().has_perm(perm, obj)
+        return self.is_active and perm in self.get_effective_permissions()[1]
 
     def has_module_perms(self, app_label):
         """Grant all module permissions if the user is an effective superuser."""
-        return self.is_effective_superuser() or super().has_module_perms(app_label)
+        if self.is_effective_superuser():
+            return True
+        return self.is_active and any(
+            perm.split('.', 1)[0] == app_label for perm in self.get_effective_permissions()[1]
+        )
+
 
 class Group(BaseGroup):
     class Meta:
@@ -219,6 +266,9 @@ class StaffNotification(models.Model):
 class BlacklistedToken(models.Model):
     token_hash = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Rows blacklisted before this was recorded expire ACCESS_TOKEN_LIFETIME
+    # after created_at.
+    expires_at = models.DateTimeField(null=True)
 
     def __str__(self):
         return self.token_hash
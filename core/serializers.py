@@ -21,10 +21,8 @@ from rest_framework.serializers import ModelSerializer
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from dotenv import load_dotenv
 from .signals import group_created
-from .models import User, StaffNotification, BlacklistedToken
+from .models import User, StaffNotification
 from .utils import generate_jwt_for_user, blacklist_token
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 
 load_dotenv()
@@ -42,6 +40,20 @@ def send_email(user: User, context, subject, template):
     )
 
 
+# Prefetches that let UserSerializer represent a list of users in a fixed
+# number of queries.
+USER_PREFETCHES = ['groups__extendedgroup',
+                   'groups__permissions', 'user_permissions']
+
+
+def is_in_superuser_group(user):
+    """Helper function to check for a superuser group, from the prefetched groups when there are."""
+    if 'groups' in getattr(user, '_prefetched_objects_cache', {}):
+        return any(getattr(group, 'extendedgroup', None) is not None and group.extendedgroup.for_superuser
+                   for group in user.groups.all())
+    return user.groups.filter(extendedgroup__for_superuser=True).exists()
+
+
 def generate_random_password(length=12):
     characters = string.ascii_letters + string.digits + string.punctuation
     password = ''.join(secrets.choice(characters) for _ in range(length))
@@ -75,7 +87,7 @@ class UpdateCurrentUserSerializer(BaseUserSerializer):
         return obj.groups.count()
 
     def get_is_superuser(self, obj: User):
-        return obj.is_superuser or obj.groups.filter(extendedgroup__for_superuser=True).exists()
+        return obj.is_superuser or is_in_superuser_group(obj)
 
     def get_permissions(self, obj):
         """
@@ -122,26 +134,6 @@ class AcceptInvitationSerializer(BaseUserSerializer):
         return user
 
 
-def _notify_permission_change(users):
-    """Helper function to send permission updates for users"""
-    channel_layer = get_channel_layer()
-    permissions_updates = [
-        {
-            "user_id": user.id,
-            "permissions": [perm.name for perm in Permission.objects.filter(codename__in=[perm.split('.')[1] for perm in user.get_all_permissions()])]
-        }
-        for user in users
-    ]
-
-    async_to_sync(channel_layer.group_send)(
-        "staff_permissions",
-        {
-            "type": "bulk_permissions_update",
-            "updates": permissions_updates
-        }
-    )
-
-
 class UserSerializer(BaseUserSerializer):
     groups_count = serializers.SerializerMethodField()
     group_ids = serializers.ListField(
@@ -162,7 +154,7 @@ class UserSerializer(BaseUserSerializer):
         return super().validate(attrs)
 
     def get_is_superuser(self, obj: User):
-        return obj.is_superuser or obj.groups.filter(extendedgroup__for_superuser=True).exists()
+        return obj.is_superuser or is_in_superuser_group(obj)
 
     def get_permissions(self, obj):
         """
@@ -194,8 +186,6 @@ class UserSerializer(BaseUserSerializer):
         if hasattr(self, 'group_ids') and not user.is_superuser:
             groups = Group.objects.filter(id__in=self.group_ids)
             user.groups.set(groups)
-            # Send WebSocket notification when groups are updated
-            _notify_permission_change([user])
 
         return user
 
@@ -1,16 +1,17 @@
 import os
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete, post_migrate
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
-import requests
 from store.models import Customer, Request, FileTransfer, Order, ContactInquiry, QuoteRequest, OnlinePayment
-from ..models import ExtendedGroup, StaffNotification
-from core.tasks import send_notification_email_task
-from django.core.mail import send_mail, EmailMultiAlternatives
+from ..models import Group as ProxyGroup
+from ..models import ExtendedGroup, StaffNotification, User, invalidate_permission_cache
+from core.tasks import send_notification_email_task, schedule_permission_broadcast
+from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from dotenv import load_dotenv
-from store.serializers import order_created
+from store.emails import get_order_files, send_html_email_with_attachments
 
 load_dotenv()
 
@@ -28,63 +29,88 @@ def create_extended_group(sender, instance, **kwargs):
         ExtendedGroup.objects.create(group=instance, for_superuser=for_superuser)
 
 
+def _invalidate_permissions(user_ids, broadcast=True):
+    """
+    Helper function to drop cached effective permissions now and again once the
+    transaction commits, so a concurrent request cannot cache the old permissions.
+    Connected staff are sent their new permissions on commit as well.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    invalidate_permission_cache(user_ids)
+    transaction.on_commit(lambda: invalidate_permission_cache(user_ids))
+    if broadcast:
+        schedule_permission_broadcast(user_ids)
+
+
+def _get_group_user_ids(group_ids):
+    return User.objects.filter(groups__in=group_ids).values_list('id', flat=True).distinct()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_permissions_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list('id', flat=True))
+    elif action in ['post_add', 'post_remove']:
+        _invalidate_permissions(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        _invalidate_permissions(
+            instance.__dict__.pop('_cleared_user_ids', []) if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_permissions_on_user_permission_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list('id', flat=True))
+    elif action in ['post_add', 'post_remove']:
+        _invalidate_permissions(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        _invalidate_permissions(
+            instance.__dict__.pop('_cleared_user_ids', []) if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_on_group_permission_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_group_ids = list(
+            instance.group_set.values_list('id', flat=True))
+    elif action in ['post_add', 'post_remove']:
+        _invalidate_permissions(_get_group_user_ids(
+            pk_set if reverse else [instance.pk]))
+    elif action == 'post_clear':
+        _invalidate_permissions(_get_group_user_ids(
+            instance.__dict__.pop('_cleared_group_ids', []) if reverse else [instance.pk]))
+
+
+@receiver(post_save, sender=ExtendedGroup)
+@receiver(post_delete, sender=ExtendedGroup)
+def invalidate_permissions_on_extended_group_change(sender, instance, **kwargs):
+    _invalidate_permissions(_get_group_user_ids([instance.group_id]))
+
+
+@receiver(pre_delete, sender=Group)
+@receiver(pre_delete, sender=ProxyGroup)
+def invalidate_permissions_on_group_delete(sender, instance, **kwargs):
+    _invalidate_permissions(_get_group_user_ids([instance.pk]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_permissions_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which does not affect permissions.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    _invalidate_permissions([instance.pk], broadcast=False)
+
+
 @receiver(post_delete, sender=Customer)
 def delete_associated_user(sender, instance, **kwargs):
     if instance.user:
         instance.user.delete()
 
 
-def send_html_email_with_attachments(subject, context, template_name, from_email, recipient_list, files=[]):
-    # Render HTML and plain-text bodies
-    html_content = render_to_string(template_name, context)
-    # text_content = render_to_string(template_name, context)
-
-    # Create email with HTML + plain text
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body='',
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email.attach_alternative(html_content, "text/html")
-
-    existing_filenames = set()
-
-    for file in files:
-        url = file.get("url")
-        name = file.get("name")
-
-        if not url:
-            print("Skipping file with no URL.")
-            continue
-
-        try:
-            response = requests.get(url)
-            print(f"Fetching: {url} - Status: {response.status_code}")
-
-            if response.status_code == 200:
-                filename = name or os.path.basename(url.split('?')[0])
-                
-                # Ensure unique filename
-                if filename in existing_filenames:
-                    base, ext = os.path.splitext(filename)
-                    count = 1
-                    while f"{base}_{count}{ext}" in existing_filenames:
-                        count += 1
-                    filename = f"{base}_{count}{ext}"
-                existing_filenames.add(filename)
-
-                content_type = response.headers.get("Content-Type", "application/octet-stream")
-                email.attach(filename, response.content, content_type)
-                print(f"Attached: {filename} ({len(response.content)} bytes)")
-            else:
-                print(f"Failed to download: {url}")
-        except Exception as e:
-            print(f"Error attaching {url}: {e}")
-
-    email.send()
-
-
 def send_notification_email(instance, model_name):
     print("Sending notification email")
     staff_notifications = StaffNotification.objects.select_related(
@@ -131,21 +157,13 @@ def send_notification_email(instance, model_name):
                 'po_number': instance.po_number,
                 'payment_submission_link': 'your_payment_submission_link_here'
             }
-        attached_files = []
-        order_items = instance.items.all()
-        for item in order_items:
-            if item.front_pdf:
-                attached_files.append({'url':item.front_pdf.url, 'name': item.front_pdf_name})        
-            if item.back_pdf:
-                attached_files.append({'url':item.back_pdf.url, 'name': item.back_pdf_name})        
-
         send_html_email_with_attachments(
                 subject=subject,
                 context=context,
                 template_name=template,
                 from_email=settings.EMAIL_HOST_USER,
                 recipient_list=list(staff_notifications),
-                files=attached_files,
+                files=get_order_files(instance),
             )
     # Enqueue email tasks
     name = instance.name if hasattr(instance, 'name') else instance.customer.user.name
@@ -174,29 +192,6 @@ def notify_on_file_transfer_creation(sender, instance, created, **kwargs):
         send_notification_email(instance, 'FileTransfer')
 
 
-@receiver(order_created)
-def notify_on_order_creation(sender, **kwargs):
-    order = kwargs.get('order')
-    attached_files = kwargs.get('attached_files')
-    context=kwargs.get('context')
-
-    staff_notifications = StaffNotification.objects.select_related(
-    'user').values_list('user__email', flat=True)
-
-    template = 'email/new_order_notification_admin.html'
-    subject = f"New Order - {order.po_number}"
-    
-    send_html_email_with_attachments(
-        subject=subject,
-        context=context,
-        template_name=template,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=list(staff_notifications),
-        files=attached_files,
-    )
-
-
-
 @receiver(post_save, sender=ContactInquiry)
 def notify_on_contact_inquiry_creation(sender, instance, created, **kwargs):
     if created:
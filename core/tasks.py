@@ -1,9 +1,18 @@
+import threading
+from asgiref.sync import async_to_sync
 from celery import shared_task
+from channels.layers import get_channel_layer
 from django.core.mail import send_mail
 from django.conf import settings
-from .models import BlacklistedToken
-from datetime import datetime, timedelta
+from django.db import transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import BlacklistedToken
+from .utils import get_permission_updates, warm_blacklist_cache
+
+# Users whose permission update is waiting for the transaction to commit.
+_pending_broadcast = threading.local()
 
 
 @shared_task
@@ -25,5 +34,47 @@ def send_notification_email_task(staff_email, instance_name, request_type):
 
 @shared_task
 def delete_expired_tokens_task():
+    """
+    Deletes blacklisted tokens that have expired, then reloads the rest into
+    the cache in case entries were evicted.
+    """
+    now = timezone.now()
+    BlacklistedToken.objects.filter(expires_at__lte=now).delete()
     BlacklistedToken.objects.filter(
-        created_at__lt=datetime.now() - timedelta(days=1)).delete()
+        expires_at__isnull=True,
+        created_at__lte=now - jwt_settings.ACCESS_TOKEN_LIFETIME).delete()
+    warm_blacklist_cache()
+
+
+
+def _send_pending_permission_updates():
+    user_ids = getattr(_pending_broadcast, 'user_ids', None)
+    if not user_ids:
+        return
+    _pending_broadcast.user_ids = set()
+
+    async_to_sync(get_channel_layer().group_send)(
+        "staff_permissions",
+        {
+            "type": "bulk_permissions_update",
+            "updates": get_permission_updates(user_ids)
+        }
+    )
+
+
+def schedule_permission_broadcast(user_ids):
+    """
+    Sends a permission update for the given users once the current transaction
+    commits. Users changed several times within one transaction go out once,
+    in a single message. The message is sent from the web process, whose
+    channel layer is the one the staff consumers listen on.
+    """
+    pending = getattr(_pending_broadcast, 'user_ids', None)
+    if pending is None:
+        pending = _pending_broadcast.user_ids = set()
+    pending.update(user_ids)
+    if pending:
+        # The first callback to run sends every pending user; the others
+        # find nothing left. Users of a rolled back transaction go out with
+        # the next broadcast, with their current permissions.
+        transaction.on_commit(_send_pending_permission_updates)
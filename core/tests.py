@@ -1,3 +1,168 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from . import tasks, utils
+from .models import Group as ProxyGroup
+from .models import User, BlacklistedToken, get_permission_cache_key
 
-# Create your tests here.
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'wallsprint-test-cache'),
+    }
+}
+
+
+class PermissionBroadcastTests(TestCase):
+    def setUp(self):
+        tasks._pending_broadcast.user_ids = set()
+        self.channel_layer = get_channel_layer()
+        self.channel_name = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(
+            "staff_permissions", self.channel_name)
+        self.addCleanup(async_to_sync(self.channel_layer.flush))
+
+        self.user = User.objects.create_user(
+            username='staff', email='staff@example.com', password='password')
+        self.group = Group.objects.create(name='Designers')
+        self.permission = Permission.objects.get(codename='view_order')
+
+    def get_messages(self):
+        queue = self.channel_layer.channels.get(self.channel_name)
+        messages = []
+        while queue and not queue.empty():
+            messages.append(queue.get_nowait()[1])
+        return messages
+
+    def test_changes_within_a_transaction_are_sent_once_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.groups.add(self.group)
+                self.group.permissions.add(self.permission)
+            self.assertEqual(self.get_messages(), [])
+
+        messages = self.get_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['type'], 'bulk_permissions_update')
+        self.assertEqual(messages[0]['updates'], [
+            {'user_id': self.user.id, 'permissions': [self.permission.name]}])
+
+    def test_rolled_back_changes_are_not_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.groups.add(self.group)
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.get_messages(), [])
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='staff', email='staff@example.com', password='password')
+
+    def test_deleting_a_group_drops_its_members_permissions(self):
+        for model in [Group, ProxyGroup]:
+            with self.subTest(model=model.__module__):
+                group = model.objects.create(name=f'Designers {model.__module__}')
+                self.user.groups.add(group)
+                User.objects.get(pk=self.user.pk).get_effective_permissions()
+                self.assertIsNotNone(cache.get(get_permission_cache_key(self.user.pk)))
+
+                group.delete()
+
+                self.assertIsNone(cache.get(get_permission_cache_key(self.user.pk)))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_skipped(self):
+        group = Group.objects.create(name='Designers')
+        group.permissions.add(Permission.objects.get(codename='view_order'))
+        self.user.groups.add(group)
+        self.assertTrue(User.objects.get(pk=self.user.pk).has_perm('store.view_order'))
+        self.assertIsNone(cache.get(get_permission_cache_key(self.user.pk)))
+
+        # Another worker revoking the permission would not clear this process's cache.
+        Group.permissions.through.objects.filter(group=group).delete()
+
+        self.assertFalse(User.objects.get(pk=self.user.pk).has_perm('store.view_order'))
+
+    def test_other_models_keep_fast_deletes(self):
+        self.assertTrue(Collector(using='default').can_fast_delete(
+            BlacklistedToken.objects.all()))
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        utils._local_blacklist.clear()
+        self.user = User.objects.create_user(
+            username='staff', email='staff@example.com', password='password')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def forget_cached(self):
+        cache.clear()
+        utils._local_blacklist.clear()
+
+    def test_logout_is_written_to_the_database(self):
+        response = self.client.post(
+            '/api/v1/auth/logout/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        self.assertEqual(response.status_code, 204)
+        blacklisted_token = BlacklistedToken.objects.get(
+            token_hash=utils.hash_token(self.token))
+        self.assertEqual(int(blacklisted_token.expires_at.timestamp()),
+                         AccessToken(self.token)['exp'])
+
+    def test_blacklist_survives_losing_the_cache(self):
+        utils.blacklist_raw_token(self.token)
+        self.forget_cached()
+
+        self.assertTrue(utils.is_token_blacklisted(self.token))
+        with self.assertNumQueries(0):
+            self.assertTrue(utils.is_token_blacklisted(self.token))
+
+    def test_rows_without_expiry_use_the_access_token_lifetime(self):
+        BlacklistedToken.objects.create(token_hash=utils.hash_token(self.token))
+        expired_token = str(AccessToken.for_user(self.user))
+        BlacklistedToken.objects.create(token_hash=utils.hash_token(expired_token))
+        BlacklistedToken.objects.filter(token_hash=utils.hash_token(expired_token)).update(
+            created_at=timezone.now() - jwt_settings.ACCESS_TOKEN_LIFETIME - timedelta(minutes=1))
+
+        self.assertTrue(utils.is_token_blacklisted(self.token))
+        self.assertFalse(utils.is_token_blacklisted(expired_token))
+
+    def test_tokens_not_blacklisted_are_cached_as_misses(self):
+        self.assertFalse(utils.is_token_blacklisted(self.token))
+        with self.assertNumQueries(0):
+            self.assertFalse(utils.is_token_blacklisted(self.token))
+
+        utils.blacklist_raw_token(self.token)
+        self.assertTrue(utils.is_token_blacklisted(self.token))
+
+    def test_cleanup_deletes_expired_rows_and_warms_the_cache(self):
+        utils.blacklist_raw_token(self.token)
+        BlacklistedToken.objects.create(
+            token_hash='expired', expires_at=timezone.now() - timedelta(minutes=1))
+        self.forget_cached()
+
+        tasks.delete_expired_tokens_task()
+
+        self.assertQuerySetEqual(
+            BlacklistedToken.objects.values_list('token_hash', flat=True),
+            [utils.hash_token(self.token)])
+        with self.assertNumQueries(0):
+            self.assertTrue(utils.is_token_blacklisted(self.token))
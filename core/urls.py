@@ -9,5 +9,7 @@ router.register("permissions", views.PermissionViewSet, basename="permissions")
 
 urlpatterns = router.urls
 
+urlpatterns.append(path('request-metrics/',
+                   views.RequestMetricsView.as_view(), name='request-metrics'))
 urlpatterns.append(path('test-websocket/',
                    views.TestWebSocketView.as_view(), name='test_websocket'))
@@ -1,7 +1,17 @@
 import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from django.core.cache import cache
+from django.db.models import Q
 from django.http import JsonResponse
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
 from rest_framework import serializers
 from rest_framework.response import Response
 from rest_framework import status
@@ -94,11 +104,165 @@ class CustomModelViewSet(ModelViewSet):
         )
 
 
-def blacklist_token(request):
-    def hash_token(token):
-        return hashlib.sha256(token.encode()).hexdigest()
+BLACKLIST_CACHE_PREFIX = 'blacklisted-token:'
+LOCAL_BLACKLIST_SIZE = 10000
+# Tokens found not to be blacklisted are rechecked against the database after
+# this many seconds, which bounds how late a process with its own cache sees a
+# logout made through another process.
+BLACKLIST_MISS_TIMEOUT = 60
+
+# Hashes this process already knows to be blacklisted, mapped to their expiry.
+_local_blacklist = OrderedDict()
+_local_blacklist_lock = threading.Lock()
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _get_token_expiry(token):
+    """Helper function to read a token's exp claim without verifying it."""
+    try:
+        return int(AccessToken(token, verify=False)['exp'])
+    except (TokenError, KeyError):
+        return int(time.time() + jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def _remember_blacklisted(hashed_token, expires_at):
+    with _local_blacklist_lock:
+        _local_blacklist[hashed_token] = expires_at
+        _local_blacklist.move_to_end(hashed_token)
+        while len(_local_blacklist) > LOCAL_BLACKLIST_SIZE:
+            _local_blacklist.popitem(last=False)
+
+
+def get_unexpired_blacklisted_tokens():
+    """
+    Returns the blacklisted tokens that have not expired yet. Rows without
+    expires_at are assumed to expire ACCESS_TOKEN_LIFETIME after they were
+    created.
+    """
+    now = timezone.now()
+    return BlacklistedToken.objects.filter(
+        Q(expires_at__gt=now) |
+        Q(expires_at__isnull=True,
+          created_at__gt=now - jwt_settings.ACCESS_TOKEN_LIFETIME)
+    )
+
+
+def _get_row_expiry(blacklisted_token):
+    expires_at = blacklisted_token.expires_at or (
+        blacklisted_token.created_at + jwt_settings.ACCESS_TOKEN_LIFETIME)
+    return int(expires_at.timestamp())
+
+
+def _cache_blacklisted(hashed_token, expires_at):
+    timeout = expires_at - int(time.time())
+    if timeout > 0:
+        cache.set(BLACKLIST_CACHE_PREFIX + hashed_token, expires_at, timeout)
+        _remember_blacklisted(hashed_token, expires_at)
+
+
+def blacklist_raw_token(token):
+    """
+    Blacklists a token until it expires. The database row is the source of
+    truth; the cache entry, with a timeout matching the token's exp claim,
+    spares later requests the database lookup.
+    """
+    hashed_token = hash_token(token)
+    expires_at = _get_token_expiry(token)
+    if expires_at <= time.time():
+        return
 
+    BlacklistedToken.objects.update_or_create(
+        token_hash=hashed_token,
+        defaults={'expires_at': datetime.fromtimestamp(
+            expires_at, tz=dt_timezone.utc)},
+    )
+    _cache_blacklisted(hashed_token, expires_at)
+
+
+def is_token_blacklisted(token):
+    """
+    Checks the in-process LRU first and the cache second. On a cache miss the
+    database is asked, and the answer is cached: until the token expires when
+    it is blacklisted, for BLACKLIST_MISS_TIMEOUT seconds when it is not.
+    """
+    hashed_token = hash_token(token)
+    now = time.time()
+
+    with _local_blacklist_lock:
+        expires_at = _local_blacklist.get(hashed_token)
+        if expires_at is not None and expires_at <= now:
+            del _local_blacklist[hashed_token]
+            expires_at = None
+    if expires_at is not None:
+        return True
+
+    key = BLACKLIST_CACHE_PREFIX + hashed_token
+    expires_at = cache.get(key)
+    if expires_at is None:
+        blacklisted_token = get_unexpired_blacklisted_tokens().filter(
+            token_hash=hashed_token).first()
+        if blacklisted_token is None:
+            cache.set(key, 0, BLACKLIST_MISS_TIMEOUT)
+            return False
+        _cache_blacklisted(hashed_token, _get_row_expiry(blacklisted_token))
+        return True
+
+    if not expires_at:
+        return False
+    _remember_blacklisted(hashed_token, expires_at)
+    return True
+
+
+def warm_blacklist_cache():
+    """Loads every unexpired blacklisted token from the database into the cache."""
+    count = 0
+    for blacklisted_token in get_unexpired_blacklisted_tokens().iterator():
+        _cache_blacklisted(blacklisted_token.token_hash,
+                           _get_row_expiry(blacklisted_token))
+        count += 1
+    return count
+
+
+def blacklist_token(request):
     auth_header = request.headers.get('Authorization')
     token = auth_header.split(' ')[1]
-    hashed_token = hash_token(token)
-    BlacklistedToken.objects.create(token_hash=hashed_token)
+    blacklist_raw_token(token)
+
+
+def get_permission_updates(user_ids):
+    """
+    Builds the bulk_permissions_update payload for the given users with one
+    grouped query over direct and group permissions, instead of a permission
+    lookup per user. Superusers get every permission and inactive users none,
+    matching ModelBackend.get_all_permissions.
+    """
+    users = list(User.objects.filter(id__in=user_ids).values_list(
+        'id', 'is_active', 'is_superuser'))
+    permissions_by_user = {user_id: set() for user_id, _, _ in users}
+
+    if any(is_active and is_superuser for _, is_active, is_superuser in users):
+        all_permissions = set(
+            Permission.objects.values_list('name', flat=True))
+    else:
+        all_permissions = set()
+
+    active_user_ids = [user_id for user_id, is_active,
+                       is_superuser in users if is_active and not is_superuser]
+    if active_user_ids:
+        direct = Permission.objects.filter(user__in=active_user_ids).values_list(
+            'user', 'name').order_by()
+        through_groups = Permission.objects.filter(
+            group__user__in=active_user_ids).values_list('group__user', 'name').order_by()
+        for user_id, name in direct.union(through_groups):
+            permissions_by_user[user_id].add(name)
+
+    return [
+        {
+            "user_id": user_id,
+            "permissions": sorted(all_permissions if is_active and is_superuser else permissions_by_user[user_id])
+        }
+        for user_id, is_active, is_superuser in users
+    ]
@@ -1,4 +1,3 @@
-import hashlib
 import os
 from django.db.models import Count
 from rest_framework.permissions import AllowAny,  IsAuthenticated, IsAdminUser
@@ -14,20 +13,18 @@ from dotenv import load_dotenv
 from .serializers import (AddUsersToGroupSerializer, GroupSerializer, PermissionSerializer, AddUserToGroupSerializer, CreateGroupSerializer,
                           UserListSerializer, UserSerializer, UpdateGroupSerializer, UserCreateSerializer, InviteStaffSerializer, UpdateStaffSerializer,
                           UpdateCurrentUserSerializer, AcceptInvitationSerializer, ResendStaffInvitationSerializer, GenerateTokenSerializer, send_email, StaffNotificationSerializer, CreateStaffNotificationSerializer,
-                          SimpleStaffSerializer
+                          SimpleStaffSerializer, USER_PREFETCHES
                           )
-from .models import User, StaffNotification, BlacklistedToken
-from .utils import bulk_delete_objects, generate_jwt_for_user
+from .models import User, StaffNotification
+from .metrics import get_route_stats
+from .utils import bulk_delete_objects, generate_jwt_for_user, blacklist_raw_token
 from .utils import CustomModelViewSet
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken
 from django.contrib.auth import get_user_model
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from django.db.models.signals import m2m_changed
-from django.dispatch import receiver
 from django.views.generic import TemplateView
+from djoser import views as djoser_views
 
 load_dotenv()
 # Create your views here.
@@ -35,7 +32,8 @@ load_dotenv()
 
 class GroupViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'delete', 'put', 'options']
-    queryset = Group.objects.prefetch_related('permissions', 'user_set').all()
+    queryset = Group.objects.select_related('extendedgroup').prefetch_related(
+        'permissions', *[f'user_set__{lookup}' for lookup in USER_PREFETCHES]).all()
     permission_classes = [permissions.IsAdminUser]
 
     def get_serializer_class(self):
@@ -166,34 +164,6 @@ class GroupViewSet(viewsets.ModelViewSet):
         status_code = status.HTTP_200_OK if not missing_user_ids else status.HTTP_207_MULTI_STATUS
         return Response(response_data, status=status_code)
 
-    def _notify_permission_change(self, group):
-        channel_layer = get_channel_layer()
-        # Get all users in the group
-        users = group.user_set.all()
-        print(f"Sending permission update for group: {group.name}")
-
-        permissions_updates = [
-            {
-                "user_id": user.id,
-                "permissions": [perm.name for perm in Permission.objects.filter(codename__in=[perm.split('.')[1] for perm in user.get_all_permissions()])]
-            }
-            for user in users
-        ]
-
-        # Send a single bulk message
-        async_to_sync(channel_layer.group_send)(
-            "staff_permissions",
-            {
-                "type": "bulk_permissions_update",
-                "updates": permissions_updates
-            }
-        )
-
-    def update(self, request, *args, **kwargs):
-        response = super().update(request, *args, **kwargs)
-        self._notify_permission_change(self.get_object())
-        return response
-
 
 class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Permission.objects.exclude(name__startswith="Can ")
@@ -216,10 +186,17 @@ class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
+class UserViewSet(djoser_views.UserViewSet):
+    """djoser's user routes, with the groups and permissions UserSerializer reads prefetched."""
+
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(*USER_PREFETCHES)
+
+
 class StaffViewSet(viewsets.ModelViewSet, viewsets.GenericViewSet):
     http_method_names = ['post', 'put', 'get', 'delete']
     queryset = User.objects.prefetch_related(
-        'groups__permissions').filter(is_staff=True)
+        *USER_PREFETCHES).filter(is_staff=True)
     serializer_class = InviteStaffSerializer
     permission_classes = [permissions.IsAdminUser]
 
@@ -423,8 +400,6 @@ class LogoutView(APIView):
     permission_classes = (AllowInactiveUser,)
 
     def post(self, request):
-        def hash_token(token):
-            return hashlib.sha256(token.encode()).hexdigest()
         try:
             auth_header = request.headers.get('Authorization')
             if not auth_header:
@@ -434,44 +409,20 @@ class LogoutView(APIView):
             if len(parts) != 2 or parts[0].lower() != 'bearer':
                 return Response({"detail": "Invalid Authorization header format."}, status=400)
 
-            token = parts[1]
-            hashed_token = hash_token(token)
-            BlacklistedToken.objects.create(token_hash=hashed_token)
+            blacklist_raw_token(parts[1])
             return Response(status=204)
         except Exception as e:
             return Response({"detail": str(e)}, status=400)
 
-# Add signal handler for group membership changes
-
+class RequestMetricsView(APIView):
+    """
+    Latency percentiles, database time and query counts per route, from the
+    recent requests served by this process.
+    """
+    permission_classes = [IsAdminUser]
 
-@receiver(m2m_changed, sender=Group.user_set.through)
-def handle_group_membership_change(sender, instance, action, reverse, model, pk_set, **kwargs):
-    if action in ["post_add", "post_remove", "post_clear"]:
-        channel_layer = get_channel_layer()
-        if reverse:
-            # If users were changed on a group
-            users = model.objects.filter(pk__in=pk_set)
-        else:
-            # If groups were changed on a user
-            users = [instance]
-
-        # Create a list of all user permissions in one go
-        permissions_updates = [
-            {
-            "user_id": user.id,
-            "permissions": [perm.name for perm in Permission.objects.filter(codename__in=[perm.split('.')[1] for perm in user.get_all_permissions()])]
-            }
-            for user in users
-        ]
-
-        # Send a single bulk message
-        async_to_sync(channel_layer.group_send)(
-            "staff_permissions",
-            {
-                "type": "bulk_permissions_update",
-                "updates": permissions_updates
-            }
-        )
+    def get(self, request):
+        return Response(get_route_stats())
 
 
 class TestWebSocketView(TemplateView):
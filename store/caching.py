@@ -0,0 +1,107 @@
+import time
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_PREFIX = 'version:'
+# Version scopes; each one covers the models a group of responses is built from.
+CATALOGS = 'catalogs'
+PORTALS = 'portals'
+PAGES = 'pages'
+# Bumped on every stock change, for responses that list items across catalogs.
+INVENTORY = 'inventory'
+CATALOG_STOCK_PREFIX = 'catalog-stock:'
+PORTAL_STOCK_PREFIX = 'portal-stock:'
+
+CATALOG_LISTING_PREFIX = 'catalog-listing:'
+CATALOG_LISTING_TIMEOUT = 60 * 60 * 24
+
+
+def is_cache_shared():
+    """Whether every process reads and writes the same default cache."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def is_versioning_enabled():
+    """
+    Version stamps are only trustworthy when every process reads the same
+    cache. With a per-process cache, a bump made in a Celery worker (copying
+    a catalog's items, say) never reaches the web process, which would keep
+    answering 304 and serving stale listings. Listing caches and conditional
+    GETs are therefore off unless the default cache is shared.
+    """
+    return is_cache_shared()
+
+
+def get_versions(*scopes):
+    """
+    Returns {scope: version} for the given scopes. Versions are the time of the
+    last change in nanoseconds; a scope missing from the cache starts at the
+    current time, so nothing cached before the cache was cleared is reused.
+    """
+    keys = {VERSION_PREFIX + scope: scope for scope in scopes}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_version(scope):
+    return get_versions(scope)[scope]
+
+
+def _bump(scopes):
+    now = time.time_ns()
+    cache.set_many({VERSION_PREFIX + scope: now for scope in scopes}, None)
+
+
+def bump_version(*scopes):
+    """
+    Moves the given scopes to a new version, which invalidates everything
+    derived from them. The scopes are bumped again on commit, so anything
+    derived from the old rows while the transaction was open is not reused
+    either.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def get_listing_scopes(kind, owner_id):
+    """
+    Returns the scopes the listing of kind ('portal' or 'catalog') for
+    owner_id is versioned by: CATALOGS for edits to catalogs and their items,
+    and the owner's own stock scope for available_inventory, so checkouts only
+    invalidate the listings that show the items they changed.
+    """
+    prefix = PORTAL_STOCK_PREFIX if kind == 'portal' else CATALOG_STOCK_PREFIX
+    return (CATALOGS, f"{prefix}{owner_id}")
+
+
+def get_stock_scopes(catalog_ids, portal_ids):
+    """Returns the scopes to bump after stock changed in the given catalogs and portals."""
+    return ([INVENTORY] +
+            [f"{CATALOG_STOCK_PREFIX}{catalog_id}" for catalog_id in catalog_ids] +
+            [f"{PORTAL_STOCK_PREFIX}{portal_id}" for portal_id in portal_ids])
+
+
+def get_cached_listing(kind, owner_id, build):
+    """
+    Returns the serialized listing of kind ('portal' or 'catalog') for
+    owner_id, calling build() to produce it on a miss.
+    """
+    if not is_versioning_enabled():
+        return build()
+    scopes = get_listing_scopes(kind, owner_id)
+    versions = get_versions(*scopes)
+    key = f"{CATALOG_LISTING_PREFIX}{kind}:{owner_id}:" + \
+        ":".join(str(versions[scope]) for scope in scopes)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, CATALOG_LISTING_TIMEOUT)
+    return payload
@@ -0,0 +1,177 @@
+from django.db import transaction
+from .caching import CATALOGS, PORTALS, bump_version
+from .models import Attribute, AttributeOption, Catalog, CatalogItem, Portal, PortalContent, TemplateField
+from .utils import rebuild_portal_access
+
+# Catalogs with more items than this are copied by copy_catalog_items_task.
+COPY_IN_BACKGROUND_THRESHOLD = 200
+
+
+def _clone(instance, **overrides):
+    """Helper function to build an unsaved copy of instance with the given field values replaced."""
+    values = {field.attname: getattr(instance, field.attname)
+              for field in instance._meta.concrete_fields if not field.primary_key}
+    values.update(overrides)
+    return type(instance)(**values)
+
+
+def _bulk_clone(model, rows, parent_field, parent_ids, **overrides):
+    """
+    Inserts copies of rows in one statement, pointing parent_field at the copy
+    of each row's parent, and returns {original pk: copy pk}. MySQL does not
+    return primary keys from bulk_create, so the copies are then read back by
+    their parents in pk order. The parents are new rows, so only these copies
+    can reference them.
+    """
+    parent_attname = model._meta.get_field(parent_field).attname
+    rows = [row for row in rows if getattr(row, parent_attname) in parent_ids]
+    if not rows:
+        return {}
+
+    copies = model.objects.bulk_create([
+        _clone(row, **{parent_attname: parent_ids[getattr(row, parent_attname)]}, **overrides)
+        for row in rows
+    ])
+    if any(copy.pk is None for copy in copies):
+        copies = model.objects.filter(**{
+            f'{parent_attname}__in': parent_ids.values()}).order_by('pk')
+    return {row.pk: copy.pk for row, copy in zip(rows, copies)}
+
+
+def _copy_item_children(item_ids):
+    """Helper function to copy the attributes, options and template fields of catalog items given {original pk: copy pk}."""
+    attribute_ids = _bulk_clone(
+        Attribute, Attribute.objects.filter(catalog_item_id__in=item_ids).order_by('pk'),
+        'catalog_item', item_ids)
+    _bulk_clone(
+        AttributeOption, AttributeOption.objects.filter(item_attribute_id__in=attribute_ids).order_by('pk'),
+        'item_attribute', attribute_ids)
+    _bulk_clone(
+        TemplateField, TemplateField.objects.filter(catalog_item_id__in=item_ids).order_by('pk'),
+        'catalog_item', item_ids, editable_item_id=None)
+
+
+@transaction.atomic()
+def copy_catalog_items(source_catalog_id, catalog_id):
+    """
+    Copies every item of a catalog, with its attributes, options and template
+    fields, into another catalog that has no items yet. Runs a fixed number of
+    statements however many items there are. Returns the number of items copied.
+    """
+    item_ids = _bulk_clone(
+        CatalogItem, CatalogItem.objects.filter(catalog_id=source_catalog_id).order_by('pk'),
+        'catalog', {source_catalog_id: catalog_id})
+    _copy_item_children(item_ids)
+    bump_version(CATALOGS)
+    return len(item_ids)
+
+
+@transaction.atomic()
+def copy_catalog(catalog, title, copy_items=False):
+    """
+    Copies a catalog under a new title. Items are copied with it when
+    copy_items is set, unless there are more than COPY_IN_BACKGROUND_THRESHOLD;
+    those are left to copy_catalog_items_task. Returns the new catalog and
+    whether its items are still being copied.
+    """
+    from .tasks import copy_catalog_items_task
+
+    new_catalog = _clone(catalog, title=title)
+    new_catalog.save()
+    if not copy_items:
+        return new_catalog, False
+
+    if catalog.catalog_items.count() > COPY_IN_BACKGROUND_THRESHOLD:
+        transaction.on_commit(lambda: copy_catalog_items_task.delay(
+            catalog.pk, new_catalog.pk))
+        return new_catalog, True
+
+    copy_catalog_items(catalog.pk, new_catalog.pk)
+    return new_catalog, False
+
+
+@transaction.atomic()
+def copy_catalog_item(catalog_item, title, catalog):
+    """Copies a catalog item, with its attributes, options and template fields, into catalog."""
+    new_catalog_item = _clone(catalog_item, title=title, catalog_id=catalog.pk)
+    new_catalog_item.save()
+    _copy_item_children({catalog_item.pk: new_catalog_item.pk})
+    bump_version(CATALOGS)
+    return new_catalog_item
+
+
+@transaction.atomic()
+def copy_portal(portal, title, logo, customers=None, customer_groups=None,
+                same_permissions=False, same_catalogs=False, catalog_title=None):
+    """
+    Copies a portal with its contents. With same_permissions the portal and
+    content level customers and groups are copied, otherwise the given
+    customers or customer_groups get the new portal. With same_catalogs the
+    contents keep their catalogs, otherwise a catalog named catalog_title is
+    created for the contents that can have catalogs. Assignments are inserted
+    through the m2m tables directly, so access is rebuilt once at the end.
+    """
+    new_portal = Portal.objects.create(
+        title=title, logo=logo, copy_from_portal_id=portal.pk)
+
+    if same_permissions:
+        customer_ids = list(portal.customers.values_list('id', flat=True))
+        group_ids = list(portal.customer_groups.values_list('id', flat=True))
+    else:
+        customer_ids = [customer.pk for customer in customers or []]
+        group_ids = [] if customer_ids else [
+            group.pk for group in customer_groups or []]
+    Portal.customers.through.objects.bulk_create([
+        Portal.customers.through(portal_id=new_portal.pk, customer_id=customer_id)
+        for customer_id in customer_ids
+    ])
+    Portal.customer_groups.through.objects.bulk_create([
+        Portal.customer_groups.through(portal_id=new_portal.pk, customergroup_id=group_id)
+        for group_id in group_ids
+    ])
+
+    contents = list(portal.contents.order_by('pk'))
+    content_ids = _bulk_clone(
+        PortalContent, contents, 'portal', {portal.pk: new_portal.pk},
+        location_id=None)
+    # Redirects to another content of the portal point at its copy.
+    redirected = [content for content in contents
+                  if content.redirect_page_id in content_ids]
+    if redirected:
+        new_contents = PortalContent.objects.in_bulk(
+            [content_ids[content.pk] for content in redirected])
+        for content in redirected:
+            new_contents[content_ids[content.pk]].redirect_page_id = content_ids[content.redirect_page_id]
+        PortalContent.objects.bulk_update(new_contents.values(), ['redirect_page'])
+
+    if same_permissions:
+        PortalContent.customers.through.objects.bulk_create([
+            PortalContent.customers.through(
+                portalcontent_id=content_ids[row.portalcontent_id], customer_id=row.customer_id)
+            for row in PortalContent.customers.through.objects.filter(portalcontent_id__in=content_ids)
+        ])
+        PortalContent.customer_groups.through.objects.bulk_create([
+            PortalContent.customer_groups.through(
+                portalcontent_id=content_ids[row.portalcontent_id], customergroup_id=row.customergroup_id)
+            for row in PortalContent.customer_groups.through.objects.filter(portalcontent_id__in=content_ids)
+        ])
+
+    if same_catalogs:
+        assignments = [
+            (content_ids[row.portalcontent_id], row.catalog_id)
+            for row in PortalContent.catalogs.through.objects.filter(portalcontent_id__in=content_ids)
+        ]
+    elif catalog_title:
+        new_catalog = Catalog.objects.create(title=catalog_title)
+        assignments = [(content_ids[content.pk], new_catalog.pk)
+                       for content in contents if content.can_have_catalogs]
+    else:
+        assignments = []
+    PortalContent.catalogs.through.objects.bulk_create([
+        PortalContent.catalogs.through(portalcontent_id=content_id, catalog_id=catalog_id)
+        for content_id, catalog_id in assignments
+    ])
+
+    rebuild_portal_access([new_portal.pk])
+    bump_version(CATALOGS, PORTALS)
+    return new_portal
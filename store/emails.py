@@ -0,0 +1,233 @@
+import logging
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from core.models import StaffNotification
+from .filecache import get_resource_key, read_cached_file, write_cached_file
+from .models import CatalogItem, LowInventoryAlert
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_FETCH_WORKERS = 8
+ATTACHMENT_FETCH_TIMEOUT = 30
+
+
+def get_order_files(order):
+    """Helper function to list the proof PDFs of an order as {'url', 'name', 'key'} dicts."""
+    files = []
+    for item in order.items.all():
+        if item.front_pdf:
+            files.append({'url': item.front_pdf.url, 'name': item.front_pdf_name,
+                          'key': get_resource_key(item.front_pdf)})
+        if item.back_pdf:
+            files.append({'url': item.back_pdf.url, 'name': item.back_pdf_name,
+                          'key': get_resource_key(item.back_pdf)})
+    return files
+
+
+def _unique_filename(filename, existing_filenames):
+    if filename in existing_filenames:
+        base, ext = os.path.splitext(filename)
+        count = 1
+        while f"{base}_{count}{ext}" in existing_filenames:
+            count += 1
+        filename = f"{base}_{count}{ext}"
+    existing_filenames.add(filename)
+    return filename
+
+
+def _download(session, url, key):
+    response = session.get(url, timeout=ATTACHMENT_FETCH_TIMEOUT)
+    response.raise_for_status()
+    if key:
+        try:
+            write_cached_file(key, response.content)
+        except OSError as e:
+            logger.warning("Failed to cache attachment %s: %s", url, e)
+    return response.content, response.headers.get("Content-Type", "application/octet-stream")
+
+
+def fetch_attachments(files):
+    """
+    Returns the given files as (filename, content, content_type) tuples ready
+    for EmailMessage.attach. Files with a cache key are read from the local file
+    cache; the rest are downloaded concurrently over one pooled session and
+    cached. Each URL is fetched once, however many times it is listed. Files
+    that cannot be downloaded are logged and left out.
+    """
+    keys = {file['url']: file.get('key') for file in files if file.get('url')}
+    downloads = {}
+    for url, key in keys.items():
+        content = read_cached_file(key) if key else None
+        if content is not None:
+            content_type, _ = mimetypes.guess_type(url.split('?')[0])
+            downloads[url] = content, content_type or "application/octet-stream"
+
+    urls = [url for url in keys if url not in downloads]
+    if not urls:
+        return _build_attachments(files, downloads)
+
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_maxsize=ATTACHMENT_FETCH_WORKERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with ThreadPoolExecutor(max_workers=min(ATTACHMENT_FETCH_WORKERS, len(urls))) as executor:
+            futures = {url: executor.submit(_download, session, url, keys[url])
+                       for url in urls}
+        for url, future in futures.items():
+            try:
+                downloads[url] = future.result()
+            except requests.RequestException as e:
+                logger.warning("Failed to download attachment %s: %s", url, e)
+
+    return _build_attachments(files, downloads)
+
+
+def _build_attachments(files, downloads):
+    attachments = []
+    existing_filenames = set()
+    for file in files:
+        url = file.get('url')
+        if url not in downloads:
+            continue
+        filename = _unique_filename(
+            file.get('name') or os.path.basename(url.split('?')[0]), existing_filenames)
+        content, content_type = downloads[url]
+        attachments.append((filename, content, content_type))
+    return attachments
+
+
+def build_html_email(subject, context, template_name, recipient_list, attachments=(), from_email=None):
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body='',
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        to=recipient_list,
+    )
+    email.attach_alternative(render_to_string(
+        template_name, context), "text/html")
+    for attachment in attachments:
+        email.attach(*attachment)
+    return email
+
+
+def send_html_email_with_attachments(subject, context, template_name, from_email, recipient_list, files=[]):
+    build_html_email(subject, context, template_name, recipient_list,
+                     fetch_attachments(files), from_email).send()
+
+
+def get_order_email_context(order):
+    return {
+        'order_number': order.po_number,
+        'customer_name': order.name,
+        'response_days': 2,
+        'wallsprinting_phone': os.getenv('WALLSPRINTING_PHONE'),
+        'wallsprinting_website': os.getenv('WALLSPRINTING_WEBSITE'),
+        'invoice_number': order.po_number,
+        'po_number': order.po_number,
+        'payment_submission_link': 'your_payment_submission_link_here'
+    }
+
+
+def send_order_emails(order, send_confirmation=False):
+    """
+    Sends the emails of a new order: the customer's confirmation when requested
+    and the staff notification. The proof PDFs are downloaded once and attached
+    to both, and the emails go out over a single SMTP connection.
+    """
+    items = order.items.all()
+    context = get_order_email_context(order)
+    attachments = fetch_attachments(get_order_files(order))
+    emails = []
+
+    if send_confirmation:
+        contains_business_card = any(
+            item.catalog_item.item_type == CatalogItem.BUSINESS_CARD for item in items)
+        template = 'email/order_confirmation_editable.html' if contains_business_card else 'email/order_confirmation.html'
+        emails.append(build_html_email(
+            subject=f"Your Walls Printing Order Confirmation - {order.po_number}",
+            context=context,
+            template_name=template,
+            recipient_list=[order.email_address],
+            attachments=attachments,
+        ))
+
+    staff_emails = list(StaffNotification.objects.values_list(
+        'user__email', flat=True))
+    if staff_emails:
+        emails.append(build_html_email(
+            subject=f"New Order - {order.po_number}",
+            context=context,
+            template_name='email/new_order_notification_admin.html',
+            recipient_list=staff_emails,
+            attachments=attachments,
+        ))
+
+    if emails:
+        with get_connection() as connection:
+            connection.send_messages(emails)
+
+
+def _get_recipients(catalog):
+    return tuple(sorted({email.strip() for email in (catalog.recipient_emails or '').split(',') if email.strip()}))
+
+
+def send_low_inventory_digests():
+    """
+    Sends one email per recipient list covering every catalog item that ran
+    low since the last digest. Alerts of items whose stock recovered are
+    resolved first, so the next shortage of the same item is reported again.
+    Returns the number of emails sent.
+    """
+    now = timezone.now()
+    LowInventoryAlert.objects.filter(
+        resolved_at__isnull=True,
+        catalog_item__available_inventory__gte=F(
+            'catalog_item__minimum_inventory')
+    ).update(resolved_at=now)
+
+    alerts = list(LowInventoryAlert.objects.filter(
+        resolved_at__isnull=True, sent_at__isnull=True
+    ).select_related('catalog_item__catalog').order_by('catalog_item__catalog_id', 'catalog_item__title'))
+    if not alerts:
+        return 0
+
+    digests = {}
+    for alert in alerts:
+        catalog = alert.catalog_item.catalog
+        digests.setdefault(_get_recipients(catalog), {}).setdefault(
+            catalog, []).append(alert.catalog_item)
+
+    emails = []
+    for recipients, catalogs in digests.items():
+        if not recipients:
+            continue
+        sections = []
+        for catalog, catalog_items in catalogs.items():
+            lines = [f"- {catalog_item.title}: {catalog_item.available_inventory} left (minimum {catalog_item.minimum_inventory})"
+                     for catalog_item in catalog_items]
+            sections.append("\n".join(
+                [catalog.message_text or catalog.title] + lines))
+        subject = next(iter(catalogs)).subject if len(
+            catalogs) == 1 else "Low inventory digest"
+        emails.append(EmailMessage(
+            subject=subject or "Low inventory digest",
+            body="\n\n".join(sections),
+            from_email=settings.EMAIL_HOST_USER,
+            to=list(recipients),
+        ))
+
+    if emails:
+        with get_connection() as connection:
+            connection.send_messages(emails)
+
+    LowInventoryAlert.objects.filter(
+        pk__in=[alert.pk for alert in alerts]).update(sent_at=now)
+    return len(emails)
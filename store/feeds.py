@@ -0,0 +1,171 @@
+import base64
+import json
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from .models import File
+from .utils import get_base_url
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class FeedSource:
+    """
+    One model contributing rows to a feed. Every source is reduced to the same
+    set of columns so the sources can be combined with a single UNION ALL.
+    """
+
+    def __init__(self, model, title, route, filters=None, has_files=True):
+        self.model = model
+        self.title = title
+        self.route = route
+        self.filters = filters or Q()
+        self.has_files = has_files
+
+
+def format_file_size(file_size_in_bytes):
+    if not file_size_in_bytes:
+        return '0KB'
+    if file_size_in_bytes >= 1024 * 1024:
+        return f"{file_size_in_bytes / (1024 * 1024):.2f} MB"
+    return f"{file_size_in_bytes / 1024:.2f} KB"
+
+
+def _encode_cursor(row):
+    position = {'c': row['created_at'].isoformat(),
+                's': row['source'], 'i': row['id']}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse_datetime(position['c']), int(position['s']), int(position['i'])
+    except (ValueError, KeyError, TypeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def _keyset_filter(rank, cursor):
+    """
+    Helper function to select the rows of one source that sort after the cursor.
+    Rows are ordered by (created_at, source, id) descending and the source rank
+    is constant within a source, so the tuple comparison folds into one Q.
+    """
+    if cursor is None:
+        return Q()
+
+    created_at, source, id = cursor
+    if rank < source:
+        return Q(created_at__lte=created_at)
+    if rank == source:
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+    return Q(created_at__lt=created_at)
+
+
+def _get_source_queryset(rank, source, date_filter, cursor, include_status):
+    fields = ['id', 'created_at', 'name', 'email_address',
+              'source', 'attachment_count', 'attachment_bytes']
+    if include_status:
+        fields.append('status')
+
+    if source.has_files:
+        files = File.objects.filter(
+            content_type=ContentType.objects.get_for_model(source.model),
+            object_id=OuterRef('pk')
+        ).values('object_id')
+        attachment_count = Coalesce(Subquery(files.annotate(
+            total=Count('id')).values('total')[:1]), Value(0))
+        attachment_bytes = Coalesce(Subquery(files.annotate(
+            total=Sum('file_size')).values('total')[:1]), Value(0))
+    else:
+        attachment_count = Value(0)
+        attachment_bytes = Value(0)
+
+    return source.model.objects.filter(
+        date_filter, source.filters, _keyset_filter(rank, cursor)
+    ).annotate(
+        source=Value(rank, output_field=models.IntegerField()),
+        attachment_count=attachment_count,
+        attachment_bytes=attachment_bytes,
+    ).values(*fields)
+
+
+def _get_files_by_row(rows, sources):
+    """Helper function to load the files of a page of feed rows, one query per source."""
+    files_by_row = {}
+    for rank, source in enumerate(sources):
+        ids = [row['id'] for row in rows
+               if row['source'] == rank and row['attachment_count']]
+        if not ids:
+            continue
+        content_type = ContentType.objects.get_for_model(source.model)
+        for file in File.objects.filter(content_type=content_type, object_id__in=ids):
+            files_by_row.setdefault((rank, file.object_id), []).append(
+                file.path.url if file.path else '')
+    return files_by_row
+
+
+def get_feed_page(request, sources, include_status=False):
+    """
+    Returns one page of a feed merged from the given sources, newest first.
+    The sources are combined with UNION ALL and paginated by keyset on
+    (created_at, source, id), so memory use only depends on the page size.
+    """
+    date_filter = Q()
+    start_date = request.query_params.get('start_date')
+    end_date = request.query_params.get('end_date')
+    if start_date:
+        date_filter &= Q(created_at__gte=parse_datetime(start_date))
+    if end_date:
+        date_filter &= Q(created_at__lte=parse_datetime(end_date))
+
+    try:
+        page_size = min(int(request.query_params.get(
+            'page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValidationError({'page_size': 'A valid integer is required.'})
+    if page_size < 1:
+        raise ValidationError({'page_size': 'Ensure this value is greater than 0.'})
+
+    cursor = request.query_params.get('cursor')
+    cursor = _decode_cursor(cursor) if cursor else None
+
+    querysets = [
+        _get_source_queryset(rank, source, date_filter, cursor, include_status)
+        for rank, source in enumerate(sources)
+    ]
+    feed = querysets[0].union(*querysets[1:], all=True).order_by(
+        '-created_at', '-source', '-id')
+    rows = list(feed[:page_size + 1])
+
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', _encode_cursor(rows[-1]))
+
+    base_url = get_base_url(request)
+    files_by_row = _get_files_by_row(rows, sources)
+    results = []
+    for row in rows:
+        source = sources[row['source']]
+        message = {
+            'id': row['id'],
+            'Date': row['created_at'],
+            'title_and_tracking': source.title,
+            'From': row['name'],
+            'Email': row['email_address'],
+            'Attachments': format_file_size(row['attachment_bytes']) if source.has_files else 'n/a',
+            'Path': f"{base_url}/api/v1/store{source.route}{row['id']}",
+        }
+        if include_status:
+            message['Status'] = row['status']
+        message['Files'] = files_by_row.get((row['source'], row['id']), [])
+        results.append(message)
+
+    return {'next': next_url, 'results': results}
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The cache directory is walked again after this many seconds, to pick up
+# files written by other processes.
+CACHE_SIZE_RESCAN_INTERVAL = 60 * 5
+
+# The counters are logged at most this often, by the process that counted
+# them; attachments are read and written in the Celery worker.
+CACHE_METRICS_LOG_INTERVAL = 60 * 15
+
+# Counters of this process; read them with get_cache_metrics.
+_metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+_metrics_logged_at = {'at': time.monotonic()}
+_metrics_lock = threading.Lock()
+
+# Estimated size of the cache directory, kept up to date by this process's
+# writes between walks.
+_size = {'total': None, 'scanned_at': 0}
+_size_lock = threading.Lock()
+
+
+def _count(metric, amount=1):
+    now = time.monotonic()
+    with _metrics_lock:
+        _metrics[metric] += amount
+        log_due = now - _metrics_logged_at['at'] >= CACHE_METRICS_LOG_INTERVAL
+        if log_due:
+            _metrics_logged_at['at'] = now
+    if log_due:
+        log_cache_metrics()
+
+
+def get_cache_metrics():
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics['hits'] + metrics['misses']
+    metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0
+    return metrics
+
+
+def log_cache_metrics():
+    metrics = get_cache_metrics()
+    logger.info(
+        "Attachment cache: %d hits, %d misses (%.1f%% hit rate), %d evictions",
+        metrics['hits'], metrics['misses'], metrics['hit_rate'] * 100, metrics['evictions'])
+
+
+def get_resource_key(resource):
+    """
+    Returns the cache key of a CloudinaryField value. Keys combine the public_id
+    and the version, so a re-uploaded file gets a new key instead of a stale hit.
+    Resources without a version are not cacheable and return None.
+    """
+    if not resource or not getattr(resource, 'version', None):
+        return None
+    return f"{resource.resource_type}/{resource.public_id}@{resource.version}"
+
+
+def _get_path(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(settings.ATTACHMENT_CACHE_DIR, digest[:2], digest)
+
+
+def read_cached_file(key):
+    """
+    Returns the cached content of key, or None on a miss. The file's mtime is
+    bumped so eviction sees it as recently used.
+    """
+    path = _get_path(key)
+    try:
+        with open(path, 'rb') as file:
+            content = file.read()
+        os.utime(path)
+    except FileNotFoundError:
+        _count('misses')
+        return None
+    _count('hits')
+    return content
+
+
+def write_cached_file(key, content):
+    """
+    Stores content under key. The file is written next to its final path and
+    renamed into place, so concurrent readers never see a partial file.
+    """
+    path = _get_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        replaced_size = os.path.getsize(path)
+    except FileNotFoundError:
+        replaced_size = 0
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _add_size(len(content) - replaced_size)
+
+
+def _add_size(change):
+    """
+    Helper function to update the estimated cache size after a write, walking
+    the cache directory only when the estimate crosses
+    ATTACHMENT_CACHE_MAX_BYTES or is older than CACHE_SIZE_RESCAN_INTERVAL.
+    """
+    with _size_lock:
+        if _size['total'] is not None:
+            _size['total'] += change
+        needs_scan = (_size['total'] is None
+                      or _size['total'] > settings.ATTACHMENT_CACHE_MAX_BYTES
+                      or time.monotonic() - _size['scanned_at'] > CACHE_SIZE_RESCAN_INTERVAL)
+    if needs_scan:
+        evict()
+
+
+def evict(max_bytes=None):
+    """Removes least recently used files until the cache fits in max_bytes."""
+    max_bytes = settings.ATTACHMENT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    scanned_at = time.monotonic()
+    entries = []
+    total = 0
+    for root, _, filenames in os.walk(settings.ATTACHMENT_CACHE_DIR):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total > max_bytes:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            _count('evictions')
+
+    with _size_lock:
+        _size['total'] = total
+        _size['scanned_at'] = scanned_at
@@ -0,0 +1,13 @@
+from django_filters.rest_framework import FilterSet, NumberFilter
+from .models import Order
+
+
+class OrderFilter(FilterSet):
+    min_balance = NumberFilter(field_name='balance', lookup_expr='gte')
+    max_balance = NumberFilter(field_name='balance', lookup_expr='lte')
+    min_total = NumberFilter(field_name='total_price', lookup_expr='gte')
+    max_total = NumberFilter(field_name='total_price', lookup_expr='lte')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'payment_status']
@@ -0,0 +1,147 @@
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from .models import Customer, CustomerImportJob
+from .serializers import CustomerImportRowSerializer, customer_fields
+
+User = get_user_model()
+
+CHUNK_SIZE = 500
+HASHING_WORKERS = 4
+COLUMNS = ['name', 'email', 'password',
+           'username', 'is_active'] + customer_fields[1:]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _validate_chunk(rows, first_row_number, seen_emails, seen_usernames):
+    """
+    Helper function to validate a chunk of rows. Existing emails and usernames
+    are loaded with one query each for the whole chunk, and values repeated
+    earlier in the file are rejected as well.
+    """
+    emails = {row.get('email') for row in rows}
+    usernames = {row.get('username') for row in rows}
+    existing_emails = set(User.objects.filter(
+        email__in=emails).values_list('email', flat=True))
+    existing_usernames = set(User.objects.filter(
+        username__in=usernames).values_list('username', flat=True))
+
+    valid_rows = []
+    errors = []
+    for row_number, row in enumerate(rows, start=first_row_number):
+        serializer = CustomerImportRowSerializer(data=row)
+        row_errors = {} if serializer.is_valid() else dict(serializer.errors)
+
+        email = row.get('email')
+        username = row.get('username')
+        if email in existing_emails or email in seen_emails:
+            row_errors.setdefault('email', []).append(
+                "A user with this email already exists.")
+        if username in existing_usernames or username in seen_usernames:
+            row_errors.setdefault('username', []).append(
+                "A user with this username already exists.")
+
+        if row_errors:
+            errors.append({'row': row_number, 'errors': row_errors})
+            continue
+
+        seen_emails.add(email)
+        seen_usernames.add(username)
+        valid_rows.append(serializer.validated_data)
+
+    return valid_rows, errors
+
+
+@transaction.atomic()
+def _create_customers(valid_rows, executor):
+    """Helper function to bulk create the users and customers of one chunk."""
+    hashed_passwords = executor.map(
+        make_password, [row['password'] for row in valid_rows])
+
+    users = [
+        User(
+            email=User.objects.normalize_email(row['email']),
+            username=row['username'],
+            name=row['name'],
+            is_active=row['is_active'],
+            password=hashed_password,
+        )
+        for row, hashed_password in zip(valid_rows, hashed_passwords)
+    ]
+    User.objects.bulk_create(users)
+
+    # Not every backend returns primary keys from bulk_create, so read them back.
+    user_ids = dict(User.objects.filter(
+        email__in=[user.email for user in users]).values_list('email', 'id'))
+
+    customer_field_names = set(customer_fields) - {'id', 'user_id'}
+    Customer.objects.bulk_create([
+        Customer(
+            user_id=user_ids[user.email],
+            **{key: value for key, value in row.items() if key in customer_field_names}
+        )
+        for row, user in zip(valid_rows, users)
+    ])
+    return len(users)
+
+
+def run_customer_import(job: CustomerImportJob):
+    """
+    Streams a customer CSV through validation, password hashing and chunked
+    bulk inserts, recording progress and per-row errors on the job. Passwords
+    are hashed on a thread pool: PBKDF2 releases the GIL, and Celery's prefork
+    workers are daemonic so they cannot start a process pool of their own.
+    """
+    job.status = CustomerImportJob.PROCESSING
+    job.save(update_fields=['status'])
+
+    reader = csv.DictReader(
+        io.StringIO(job.file_content),
+        fieldnames=None if job.has_header else COLUMNS
+    )
+    first_row_number = 2 if job.has_header else 1
+    seen_emails = set()
+    seen_usernames = set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=HASHING_WORKERS) as executor:
+            for rows in _chunks(reader, CHUNK_SIZE):
+                valid_rows, errors = _validate_chunk(
+                    rows, first_row_number, seen_emails, seen_usernames)
+                if valid_rows:
+                    job.created_count += _create_customers(
+                        valid_rows, executor)
+
+                first_row_number += len(rows)
+                job.processed_rows += len(rows)
+                job.errors.extend(errors)
+                job.save(update_fields=[
+                         'processed_rows', 'created_count', 'errors'])
+    except csv.Error as e:
+        job.errors.append({'row': first_row_number,
+                          'errors': {'file': [f"CSV parsing error: {str(e)}"]}})
+        job.status = CustomerImportJob.FAILED
+    except Exception:
+        job.status = CustomerImportJob.FAILED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        raise
+    else:
+        job.status = CustomerImportJob.COMPLETED
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'errors', 'finished_at'])
+    return job
@@ -0,0 +1,145 @@
+from collections import Counter
+from django.db.models import F, Sum
+from rest_framework import serializers
+from .caching import bump_version, get_stock_scopes
+from .models import CatalogItem, InventoryLedgerEntry, LowInventoryAlert
+
+
+def apply_inventory_change(catalog_item_id, quantity_change):
+    """
+    Adds quantity_change to a catalog item's available_inventory in a single
+    conditional UPDATE. Decrements only apply while enough stock is left, so
+    concurrent checkouts can neither oversell nor overwrite each other.
+    Returns whether the change was applied.
+    """
+    queryset = CatalogItem.objects.filter(pk=catalog_item_id)
+    if quantity_change < 0:
+        queryset = queryset.filter(available_inventory__gte=-quantity_change)
+    applied = queryset.update(
+        available_inventory=F('available_inventory') + quantity_change) == 1
+    if applied:
+        bump_stock_versions(catalog_item_id)
+    return applied
+
+
+def bump_stock_versions(catalog_item_id):
+    """
+    Invalidates the cached listings that include a catalog item's
+    available_inventory: its catalog's and those of the portals the catalog
+    is assigned to.
+    """
+    rows = list(CatalogItem.objects.filter(pk=catalog_item_id).values_list(
+        'catalog_id', 'catalog__portal_contents__portal_id'))
+    catalog_ids = {catalog_id for catalog_id, _ in rows}
+    portal_ids = {portal_id for _, portal_id in rows if portal_id is not None}
+    bump_version(*get_stock_scopes(catalog_ids, portal_ids))
+
+
+def record_low_inventory(catalog_item_ids):
+    """
+    Opens a LowInventoryAlert for each of the given catalog items that is now
+    below its minimum_inventory and has no open alert yet. The alerts are sent
+    later, as digests, by send_low_inventory_digests_task.
+    """
+    low_catalog_item_ids = CatalogItem.objects.filter(
+        pk__in=catalog_item_ids,
+        track_inventory_automatically=True,
+        catalog__specify_low_inventory_message=True,
+        available_inventory__lt=F('minimum_inventory'),
+    ).exclude(
+        pk__in=LowInventoryAlert.objects.filter(
+            resolved_at__isnull=True).values('catalog_item_id')
+    ).values_list('id', flat=True)
+
+    LowInventoryAlert.objects.bulk_create([
+        LowInventoryAlert(catalog_item_id=catalog_item_id)
+        for catalog_item_id in low_catalog_item_ids
+    ])
+
+
+def _out_of_stock(catalog_item):
+    return serializers.ValidationError(
+        {"quantity": f"The quantity of {catalog_item.title} is more than the available inventory."})
+
+
+def reserve_order_items(order_items):
+    """
+    Reserves stock for saved order items with one statement per catalog item
+    and records the reservations in the ledger. Raises a ValidationError when
+    an item is out of stock; callers run inside a transaction, so earlier
+    reservations are rolled back with it.
+    """
+    order_items = [order_item for order_item in order_items
+                   if order_item.catalog_item.tracks_inventory]
+    quantities = Counter()
+    catalog_items = {}
+    for order_item in order_items:
+        quantities[order_item.catalog_item_id] += order_item.quantity
+        catalog_items[order_item.catalog_item_id] = order_item.catalog_item
+
+    for catalog_item_id, quantity in quantities.items():
+        if not apply_inventory_change(catalog_item_id, -quantity):
+            raise _out_of_stock(catalog_items[catalog_item_id])
+    if quantities:
+        record_low_inventory(quantities.keys())
+
+    InventoryLedgerEntry.objects.bulk_create([
+        InventoryLedgerEntry(
+            catalog_item_id=order_item.catalog_item_id,
+            order_id=order_item.order_id,
+            order_item_id=order_item.pk,
+            quantity_change=-order_item.quantity,
+            reason=InventoryLedgerEntry.RESERVATION,
+        )
+        for order_item in order_items
+    ])
+
+
+def adjust_order_item(order_item, previous_quantity):
+    """Reserves or releases the difference after an order item's quantity changed."""
+    quantity_change = previous_quantity - order_item.quantity
+    if not quantity_change or not order_item.catalog_item.tracks_inventory:
+        return
+
+    if not apply_inventory_change(order_item.catalog_item_id, quantity_change):
+        raise _out_of_stock(order_item.catalog_item)
+
+    entries = []
+    if not InventoryLedgerEntry.objects.filter(order_item_id=order_item.pk).exists():
+        # Ordered before the ledger existed; record the stock it already held.
+        entries.append(InventoryLedgerEntry(
+            catalog_item_id=order_item.catalog_item_id,
+            order_id=order_item.order_id,
+            order_item_id=order_item.pk,
+            quantity_change=-previous_quantity,
+            reason=InventoryLedgerEntry.ADJUSTMENT,
+        ))
+    entries.append(InventoryLedgerEntry(
+        catalog_item_id=order_item.catalog_item_id,
+        order_id=order_item.order_id,
+        order_item_id=order_item.pk,
+        quantity_change=quantity_change,
+        reason=InventoryLedgerEntry.RELEASE if quantity_change > 0 else InventoryLedgerEntry.RESERVATION,
+    ))
+    InventoryLedgerEntry.objects.bulk_create(entries)
+    if quantity_change < 0:
+        record_low_inventory([order_item.catalog_item_id])
+
+
+def release_order_item(order_item):
+    """
+    Returns the stock a deleted order item still holds according to the ledger.
+    Items ordered before the ledger existed hold nothing and are skipped.
+    """
+    reserved = -(InventoryLedgerEntry.objects.filter(order_item_id=order_item.pk).aggregate(
+        total=Sum('quantity_change'))['total'] or 0)
+    if reserved <= 0:
+        return
+    apply_inventory_change(order_item.catalog_item_id, reserved)
+    InventoryLedgerEntry.objects.create(
+        catalog_item_id=order_item.catalog_item_id,
+        order_id=order_item.order_id,
+        order_item_id=order_item.pk,
+        quantity_change=reserved,
+        reason=InventoryLedgerEntry.RELEASE,
+    )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from store.models import Cart, CartItem
+from store.utils import reprice_cart_items
+
+
+class Command(BaseCommand):
+    help = ("Re-prices cart items against current pricing and recomputes the "
+            "denormalized item_count and total_price of every cart.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report stale item prices and cart totals, without fixing them.")
+
+    def reprice_items(self):
+        """Helper function to find cart items whose stored prices no longer match their pricing."""
+        items = CartItem.objects.select_related('catalog_item').order_by('pk')
+        stale = []
+        chunk = []
+        for item in items.iterator(chunk_size=1000):
+            chunk.append(item)
+            if len(chunk) == 1000:
+                stale += reprice_cart_items(chunk)
+                chunk = []
+        stale += reprice_cart_items(chunk)
+        for item in stale:
+            self.stdout.write(
+                f"Cart item {item.id} of cart {item.cart_id}: "
+                f"unit_price -> {item.unit_price}, sub_total -> {item.sub_total}")
+        return stale
+
+    @transaction.atomic()
+    def handle(self, *args, **options):
+        stale_items = self.reprice_items()
+        if not options['check']:
+            CartItem.objects.bulk_update(
+                stale_items, ['unit_price', 'sub_total'], batch_size=500)
+
+        carts = Cart.objects.annotate(
+            actual_item_count=Count('items'),
+            actual_total_price=Sum('items__sub_total')
+        ).only('id', 'item_count', 'total_price')
+
+        stale = []
+        for cart in carts.iterator(chunk_size=1000):
+            actual_total_price = cart.actual_total_price or 0
+            if cart.item_count == cart.actual_item_count and cart.total_price == actual_total_price:
+                continue
+            self.stdout.write(
+                f"Cart {cart.id}: item_count {cart.item_count} -> {cart.actual_item_count}, "
+                f"total_price {cart.total_price} -> {actual_total_price}")
+            cart.item_count = cart.actual_item_count
+            cart.total_price = actual_total_price
+            stale.append(cart)
+
+        if options['check']:
+            if stale_items or stale:
+                raise CommandError(
+                    f"{len(stale_items)} cart item(s) have stale prices and "
+                    f"{len(stale)} cart(s) have stale totals.")
+            self.stdout.write(self.style.SUCCESS("All cart prices and totals are up to date."))
+            return
+
+        Cart.objects.bulk_update(
+            stale, ['item_count', 'total_price'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-priced {len(stale_items)} cart item(s) and recomputed totals for {len(stale)} cart(s)."))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q, Sum
+from store.inventory import apply_inventory_change
+from store.models import InventoryLedgerEntry, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the stock each order item holds according to the inventory ledger "
+        "with its current quantity and corrects available_inventory for any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report order items whose reservations drifted, without fixing them.")
+
+    @transaction.atomic()
+    def handle(self, *args, **options):
+        ledger = InventoryLedgerEntry.objects.filter(
+            Q(catalog_item__restrict_orders_to_inventory=True) |
+            Q(catalog_item__track_inventory_automatically=True),
+            order_item__isnull=False
+        ).values('order_item_id', 'order_id', 'catalog_item_id').annotate(
+            reserved=-Sum('quantity_change')
+        ).order_by('order_item_id')
+        ledger = list(ledger)
+        quantities = dict(OrderItem.objects.filter(
+            pk__in=[row['order_item_id'] for row in ledger]).values_list('id', 'quantity'))
+
+        drifted = []
+        for row in ledger:
+            expected = quantities.get(row['order_item_id'], 0)
+            if row['reserved'] == expected:
+                continue
+            self.stdout.write(
+                f"Order item {row['order_item_id']} (catalog item {row['catalog_item_id']}): "
+                f"ledger holds {row['reserved']}, expected {expected}")
+            drifted.append((row, expected - row['reserved']))
+
+        if options['check']:
+            if drifted:
+                raise CommandError(
+                    f"{len(drifted)} order item(s) have drifted reservations.")
+            self.stdout.write(self.style.SUCCESS(
+                "The inventory ledger matches every order item."))
+            return
+
+        failed = 0
+        for row, missing in drifted:
+            if not apply_inventory_change(row['catalog_item_id'], -missing):
+                failed += 1
+                self.stderr.write(
+                    f"Not enough stock to reserve {missing} more for order item {row['order_item_id']}.")
+                continue
+            InventoryLedgerEntry.objects.create(
+                catalog_item_id=row['catalog_item_id'],
+                order_id=row['order_id'],
+                order_item_id=row['order_item_id'],
+                quantity_change=-missing,
+                reason=InventoryLedgerEntry.ADJUSTMENT,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {len(drifted) - failed} order item(s)."))
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_portal_access(apps, schema_editor):
+    Portal = apps.get_model('store', 'Portal')
+    PortalContent = apps.get_model('store', 'PortalContent')
+    CustomerGroup = apps.get_model('store', 'CustomerGroup')
+    PortalAccess = apps.get_model('store', 'PortalAccess')
+    group_members = CustomerGroup.customers.through.objects
+
+    rows = set()
+    rows.update(
+        (customer_id, portal_id, None)
+        for portal_id, customer_id in Portal.customers.through.objects.values_list('portal_id', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, None)
+        for portal_id, customer_id in group_members.filter(
+            customergroup__portals__isnull=False
+        ).values_list('customergroup__portals', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, content_id)
+        for content_id, portal_id, customer_id in PortalContent.customers.through.objects.values_list(
+            'portalcontent_id', 'portalcontent__portal_id', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, content_id)
+        for content_id, portal_id, customer_id in group_members.filter(
+            customergroup__accessible_contents__isnull=False
+        ).values_list(
+            'customergroup__accessible_contents', 'customergroup__accessible_contents__portal_id', 'customer_id')
+    )
+
+    PortalAccess.objects.bulk_create([
+        PortalAccess(customer_id=customer_id, portal_id=portal_id,
+                     portal_content_id=content_id)
+        for customer_id, portal_id, content_id in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0135_orderitem_back_pdf_name_orderitem_front_pdf_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogitem',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Confirming', 'Confirming'), ('Processing', 'Processing'), ('Updated', 'Updated'), ('Approving', 'Approving'), ('Completed', 'Completed')], default='Completed', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PortalAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='portal_access', to='store.customer')),
+                ('portal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_index', to='store.portal')),
+                ('portal_content', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='access_index', to='store.portalcontent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'portal'], name='store_access_cust_portal_idx'), models.Index(fields=['customer', 'portal_content'], name='store_access_cust_content_idx')],
+            },
+        ),
+        migrations.RunPython(populate_portal_access,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0136_portalaccess'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    carts = Cart.objects.annotate(
+        actual_item_count=Count('items'), actual_total_price=Sum('items__sub_total'))
+    for cart in carts:
+        cart.item_count = cart.actual_item_count
+        cart.total_price = cart.actual_total_price or 0
+    Cart.objects.bulk_update(carts, ['item_count', 'total_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0137_catalogitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12),
+        ),
+        migrations.RunPython(populate_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+import cloudinary.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0139_customerimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='proof_pdf',
+            field=cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='raw'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0140_order_proof_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_change', models.IntegerField()),
+                ('reason', models.CharField(choices=[('Reservation', 'Reservation'), ('Release', 'Release'), ('Adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('catalog_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_ledger', to='store.catalogitem')),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='store.order')),
+                ('order_item', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='store.orderitem')),
+            ],
+        ),
+    ]
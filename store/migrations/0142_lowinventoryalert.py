@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0141_inventoryledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowInventoryAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('catalog_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_inventory_alerts', to='store.catalogitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolved_at', 'sent_at'], name='store_lowinv_open_idx')],
+            },
+        ),
+    ]
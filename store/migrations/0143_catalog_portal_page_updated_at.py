@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0142_lowinventoryalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='portal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='portalcontent',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
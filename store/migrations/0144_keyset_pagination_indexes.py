@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0143_catalog_portal_page_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactinquiry',
+            index=models.Index(fields=['created_at', 'id'], name='store_inquiry_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileexchange',
+            index=models.Index(fields=['created_at', 'id'], name='store_exchange_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filetransfer',
+            index=models.Index(fields=['created_at', 'id'], name='store_transfer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onlinepayment',
+            index=models.Index(fields=['created_at', 'id'], name='store_payment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onlineproof',
+            index=models.Index(fields=['created_at', 'id'], name='store_proof_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='store_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quoterequest',
+            index=models.Index(fields=['created_at', 'id'], name='store_quote_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['created_at', 'id'], name='store_request_created_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
+import hashlib
+import json
 from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework.response import Response
 from rest_framework import status
+from .caching import get_versions, is_versioning_enabled
 from .models import File
 
 
@@ -23,3 +28,58 @@ class HandleImagesMixin:
 
             headers = self.get_success_headers(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified validators to GET responses and answers 304
+    Not Modified when the client's copy is current. Validators are derived
+    from the versions of conditional_scopes, which live in the cache, so a
+    matching request returns before any queryset is evaluated. They also vary
+    with the user, since several of these responses are filtered per customer.
+    Nothing is added while versioning is off; see is_versioning_enabled.
+    """
+    conditional_scopes = ()
+    conditional_actions = ('list', 'retrieve')
+
+    def get_conditional_scopes(self):
+        return self.conditional_scopes
+
+    def get_validators(self, request):
+        versions = get_versions(*self.get_conditional_scopes())
+        key = json.dumps([sorted(versions.items()), request.user.pk, self.action,
+                          request.get_full_path(), request.accepted_media_type])
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+        last_modified = max(versions.values()) // 10 ** 9 if versions else None
+        return etag, last_modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if (request.method in ('GET', 'HEAD') and self.action in self.conditional_actions
+                and is_versioning_enabled()):
+            self.validators = self.get_validators(request)
+            etag, last_modified = self.validators
+            response = get_conditional_response(
+                request._request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'validators', None) and response.status_code in (200, 304):
+            etag, last_modified = self.validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -149,6 +149,12 @@ class ContactInquiry(CommonFields):
     questions = models.TextField()
     comments = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_inquiry_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - Inquiry"
 
@@ -193,6 +199,12 @@ class QuoteRequest(CommonFields):
         default='New'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_quote_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.project_name}"
 
@@ -220,6 +232,10 @@ class OnlineProof(models.Model):
         permissions = [
             ('online_proofing', "Online Proofing")
         ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_proof_created_idx'),
+        ]
 
 
 class Note(models.Model):
@@ -294,6 +310,12 @@ class Request(CommonFields):
     notes = GenericRelation(Note, related_query_name='requests')
     transactions = GenericRelation(Transaction, related_query_name='requests')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_request_created_idx'),
+        ]
+
 
 class File(models.Model):
     path = CloudinaryField("auto", blank=True, null=True)
@@ -332,6 +354,35 @@ class Customer(models.Model):
         return self.user.name
 
 
+class CustomerImportJob(models.Model):
+    PENDING = 'Pending'
+    PROCESSING = 'Processing'
+    COMPLETED = 'Completed'
+    FAILED = 'Failed'
+
+    STATUS_CHOICES = [
+        (PENDING, PENDING),
+        (PROCESSING, PROCESSING),
+        (COMPLETED, COMPLETED),
+        (FAILED, FAILED),
+    ]
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    file_content = models.TextField()
+    has_header = models.BooleanField(default=True)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Customer import {self.id} - {self.status}"
+
+
 class CustomerGroup(models.Model):
     title = models.CharField(max_length=255, unique=True)
     customers = models.ManyToManyField(
@@ -417,6 +468,10 @@ class FileTransfer(BaseTransaction):
         permissions = [
             ('transfer_files', "Transfer Files")
         ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_transfer_created_idx'),
+        ]
 
 
 class Portal(models.Model):
@@ -428,6 +483,7 @@ class Portal(models.Model):
     customer_groups = models.ManyToManyField(
         CustomerGroup, blank=True, related_name='portals')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -453,6 +509,7 @@ class Portal(models.Model):
 class Page(models.Model):
     content = models.TextField(default='')
     title = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -515,6 +572,7 @@ class Catalog(models.Model):
         help_text="Enable to display items on the same page as the catalog."
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -590,6 +648,7 @@ class PortalContent(models.Model):
     logo = CloudinaryField(blank=True, null=True)
     payment_proof = models.BooleanField(default=False)
     order_history = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -632,6 +691,32 @@ class PortalContentCatalog(models.Model):
         return f"{self.portal_content} - {self.catalog}"
 
 
+class PortalAccess(models.Model):
+    """
+    Materialized view of which customers can reach which portals and contents.
+    A row without a portal_content grants access to the portal itself, while a
+    row with one grants access to that content (directly or through a group).
+    Rows are rebuilt by the m2m_changed handlers in store.signals.handlers.
+    """
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name='portal_access')
+    portal = models.ForeignKey(
+        Portal, on_delete=models.CASCADE, related_name='access_index')
+    portal_content = models.ForeignKey(
+        PortalContent, on_delete=models.CASCADE, null=True, blank=True, related_name='access_index')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'portal'],
+                         name='store_access_cust_portal_idx'),
+            models.Index(fields=['customer', 'portal_content'],
+                         name='store_access_cust_content_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.portal_id} - {self.portal_content_id}"
+
+
 class CatalogItem(models.Model):
     NON_EDITABLE = 'Non-editable'
     BUSINESS_CARD = 'Business Card'
@@ -693,6 +778,7 @@ class CatalogItem(models.Model):
         max_length=255, default='default')
     is_favorite = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     can_be_edited = models.BooleanField(default=False)
     item_type = models.CharField(
         max_length=50, default=NON_EDITABLE, choices=ITEM_TYPE_CHOICES)
@@ -721,6 +807,11 @@ class CatalogItem(models.Model):
     def __str__(self):
         return self.title
 
+    @property
+    def tracks_inventory(self):
+        """Orders of this item reserve and release available_inventory."""
+        return self.restrict_orders_to_inventory or self.track_inventory_automatically
+
     class Meta:
         permissions = [
             ('catalog_items', "Catalog Items")
@@ -780,7 +871,7 @@ class Attribute(models.Model):
     def save(self, *args, **kwargs):
         if self.pricing_tiers:
             self.pricing_tiers = sorted(
-                self.pricing_tiers, key=lambda x: x.get('quantity', 0))
+                self.pricing_tiers, key=lambda x: x.get('minimum_quantity', 0))
         super().save(*args, **kwargs)
 
 
@@ -805,7 +896,7 @@ class AttributeOption(models.Model):
     def save(self, *args, **kwargs):
         if self.pricing_tiers:
             self.pricing_tiers = sorted(
-                self.pricing_tiers, key=lambda x: x.get('quantity', 0))
+                self.pricing_tiers, key=lambda x: x.get('minimum_quantity', 0))
         super().save(*args, **kwargs)
 
 
@@ -836,10 +927,21 @@ class Cart(models.Model):
     customer = models.ForeignKey(
         Customer, on_delete=models.SET_NULL, null=True, blank=True)
     portal = models.ForeignKey(Portal, on_delete=models.SET_NULL, null=True)
+    item_count = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal(0))
 
     class Meta:
         unique_together = [['customer', 'portal']]
 
+    @classmethod
+    def adjust_totals(cls, cart_id, item_count, total_price):
+        """Applies a change in item count and total price to a cart in one UPDATE."""
+        cls.objects.filter(pk=cart_id).update(
+            item_count=models.F('item_count') + item_count,
+            total_price=models.F('total_price') + total_price
+        )
+
 
 class ItemDetails(models.Model):
     title = models.CharField(max_length=255, null=True, blank=True)
@@ -899,11 +1001,17 @@ class Order(BaseTransaction):
     po_number = models.CharField(max_length=100)
     shipping_address = models.TextField(blank=True, null=True)
     project_due_date = models.DateField(default=datetime.date.today)
+    proof_pdf = CloudinaryField(
+        'raw', resource_type='raw', blank=True, null=True)
 
     class Meta:
         permissions = [
             ('order', "Order Administration")
         ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_order_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -938,33 +1046,91 @@ class OrderItem(models.Model):
     back_pdf_name = models.CharField(max_length=255, blank=True, null=True)
     front_pdf_name = models.CharField(max_length=255, blank=True, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so edits can reserve or release the difference.
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+
     @transaction.atomic()
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        quantity_to_subtract = self.quantity
+        from .inventory import adjust_order_item, reserve_order_items
         is_new = self._state.adding
         catalog_item = self.catalog_item
 
         if catalog_item and self.quantity and ((is_new and not self.unit_price) or not is_new):
-            pricing_grid = catalog_item.pricing_grid
-            item = next(
-                (entry for entry in pricing_grid if entry["minimum_quantity"] == self.quantity), None)
+            from .pricing import quote_item
+            quote = quote_item(catalog_item, self.quantity)
+
+            if quote:
+                self.unit_price = quote.unit_price
+                self.sub_total = quote.sub_total
 
-            if item:
-                self.unit_price = item['unit_price']
-                self.sub_total = item['minimum_quantity'] * self.unit_price
+        previous_quantity = None if is_new else getattr(
+            self, '_loaded_quantity', None)
+        if not is_new and previous_quantity is None:
+            previous_quantity = OrderItem.objects.filter(
+                pk=self.pk).values_list('quantity', flat=True).first()
 
-            if catalog_item.track_inventory_automatically:
-                if not is_new:
-                    order_item = OrderItem.objects.get(pk=self.pk)
-                    if order_item.quantity != quantity_to_subtract:
-                        new_quantity = order_item.quantity - quantity_to_subtract
-                        catalog_item.available_inventory += new_quantity
-                else:
-                    catalog_item.available_inventory -= quantity_to_subtract
+        super().save(force_insert, force_update, using, update_fields)
 
-                catalog_item.save()
+        if is_new:
+            reserve_order_items([self])
+        elif previous_quantity is not None:
+            adjust_order_item(self, previous_quantity)
+        self._loaded_quantity = self.quantity
 
-        return super().save(force_insert, force_update, using, update_fields)
+
+class InventoryLedgerEntry(models.Model):
+    """
+    Append-only record of every change orders make to a catalog item's
+    available_inventory. Entries keep the ids of deleted orders and order
+    items, so the history survives them.
+    """
+    RESERVATION = 'Reservation'
+    RELEASE = 'Release'
+    ADJUSTMENT = 'Adjustment'
+
+    REASON_CHOICES = [
+        (RESERVATION, RESERVATION),
+        (RELEASE, RELEASE),
+        (ADJUSTMENT, ADJUSTMENT),
+    ]
+
+    catalog_item = models.ForeignKey(
+        CatalogItem, on_delete=models.CASCADE, related_name='inventory_ledger')
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    order_item = models.ForeignKey(
+        OrderItem, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    quantity_change = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.reason} of {self.quantity_change} for {self.catalog_item_id}"
+
+
+class LowInventoryAlert(models.Model):
+    """
+    A catalog item that fell below its minimum_inventory. An alert stays open
+    until the stock recovers, so an item is reported once per shortage.
+    """
+    catalog_item = models.ForeignKey(
+        CatalogItem, on_delete=models.CASCADE, related_name='low_inventory_alerts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resolved_at', 'sent_at'],
+                         name='store_lowinv_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"Low inventory of {self.catalog_item_id} - {self.created_at}"
 
 
 class OnlinePayment(models.Model):
@@ -996,6 +1162,10 @@ class OnlinePayment(models.Model):
     class Meta:
         verbose_name = "Online Payment"
         verbose_name_plural = "Online Payments"
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_payment_created_idx'),
+        ]
 
 
 class FileExchange(models.Model):
@@ -1013,6 +1183,12 @@ class FileExchange(models.Model):
             self.file_size = self.file.size
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='store_exchange_created_idx'),
+        ]
+
     def __str__(self):
         return f"Transfer to {self.recipient_name} from {self.name}"
 
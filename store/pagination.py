@@ -0,0 +1,143 @@
+import base64
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .feeds import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder drops microseconds past milliseconds, which would
+    # skip rows created within the same millisecond.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a list newest first by keyset on (created_at, id), or on id
+    alone for models without created_at. An ordering chosen through
+    OrderingFilter is honoured, with id appended to break ties. Each page is
+    one indexed range query whatever its depth, and prefetches only run for
+    the rows of the page. Clients pass page_size to pick the page size, up to
+    MAX_PAGE_SIZE, and follow the next cursor.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = min(int(request.query_params.get(
+                self.page_size_query_param, DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError(
+                {self.page_size_query_param: 'A valid integer is required.'})
+        if page_size < 1:
+            raise ValidationError(
+                {self.page_size_query_param: 'Ensure this value is greater than 0.'})
+        return page_size
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter) and request.query_params.get(backend.ordering_param):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+                        ordering = list(ordering) + ['-id']
+                    return ordering
+
+        try:
+            queryset.model._meta.get_field('created_at')
+        except FieldDoesNotExist:
+            return ['-id']
+        return ['-created_at', '-id']
+
+    def _get_field(self, model, path):
+        """Helper function to resolve an ordering such as '-catalog__title' to its model field."""
+        field = None
+        for name in path.lstrip('-').split('__'):
+            if field is not None:
+                model = field.related_model
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        return field
+
+    def _decode_cursor(self, cursor, ordering, model):
+        # Cursors come back from clients, so every value is converted with its
+        # field before it reaches the query.
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            return [self._get_field(model, field).to_python(value)
+                    for field, value in zip(ordering, values)]
+        except (ValueError, TypeError, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def _encode_cursor(self, row, ordering):
+        values = []
+        for field in ordering:
+            value = row
+            for name in field.lstrip('-').split('__'):
+                value = getattr(value, name)
+            values.append(value)
+        return base64.urlsafe_b64encode(json.dumps(values, cls=CursorEncoder).encode()).decode()
+
+    def _keyset_filter(self, ordering, values):
+        """
+        Helper function to select the rows that sort after the cursor. The
+        tuple comparison is expanded into (a > x) OR (a = x AND b > y) ...,
+        with the comparison of each column following its direction.
+        """
+        after = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return after
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+
+        queryset = queryset.order_by(*ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._keyset_filter(
+                ordering, self._decode_cursor(cursor, ordering, queryset.model)))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self._encode_cursor(rows[-1], ordering)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
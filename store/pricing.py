@@ -0,0 +1,217 @@
+import bisect
+import threading
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+from .models import Attribute
+
+CENTS = Decimal('0.01')
+CACHE_SIZE = 2048
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def to_money(value):
+    return Decimal(str(value)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+class Tiers:
+    """
+    A pricing grid or tier list compiled into parallel lists sorted by
+    minimum_quantity, so lookups are a bisect instead of a linear scan.
+    """
+
+    def __init__(self, tiers):
+        ordered = sorted(
+            (tier['minimum_quantity'], Decimal(str(tier['unit_price'])))
+            for tier in (tiers if isinstance(tiers, list) else [])
+        )
+        self.quantities = [quantity for quantity, _ in ordered]
+        self.prices = [price for _, price in ordered]
+
+    def __bool__(self):
+        return bool(self.quantities)
+
+    def exact(self, quantity):
+        """Returns the price of the tier whose minimum_quantity is exactly quantity."""
+        index = bisect.bisect_left(self.quantities, quantity)
+        if index < len(self.quantities) and self.quantities[index] == quantity:
+            return self.prices[index]
+        return None
+
+    def applicable(self, quantity):
+        """Returns the price of the highest tier reached by quantity."""
+        index = bisect.bisect_right(self.quantities, quantity) - 1
+        return self.prices[index] if index >= 0 else None
+
+
+class Modifier:
+    def __init__(self, attribute, tiers, modifier_type, option=None):
+        self.attribute_id = attribute.id
+        self.label = attribute.label if option is None else f"{attribute.label}: {option.option}"
+        self.option_id = option.id if option else None
+        self.scope = attribute.price_modifier_scope
+        self.modifier_type = modifier_type
+        self.tiers = Tiers(tiers)
+
+    def apply(self, quantity, unit_price):
+        """Returns the (per unit, whole order) amounts this modifier adds."""
+        value = self.tiers.applicable(quantity)
+        if value is None:
+            return Decimal(0), Decimal(0)
+
+        if self.scope == Attribute.PER_UNIT:
+            amount = unit_price * value / 100 if self.modifier_type == 'percentage' else value
+            return amount, Decimal(0)
+
+        amount = unit_price * quantity * value / 100 if self.modifier_type == 'percentage' else value
+        return Decimal(0), amount
+
+
+class PriceQuote:
+    def __init__(self, quantity, base_unit_price, unit_price, sub_total, modifiers):
+        self.quantity = quantity
+        self.base_unit_price = base_unit_price
+        self.unit_price = unit_price
+        self.sub_total = sub_total
+        self.modifiers = modifiers
+
+
+class CompiledPricing:
+    """
+    The pricing grid and attribute tiers of one catalog item. Required
+    attributes without options always apply; option tiers apply when the
+    option is selected.
+    """
+
+    def __init__(self, catalog_item, attributes):
+        self.grid = Tiers(catalog_item.pricing_grid)
+        self.required_modifiers = []
+        self.option_modifiers = {}
+
+        for attribute in attributes:
+            options = list(attribute.options.all())
+            if options:
+                for option in options:
+                    if option.pricing_tiers:
+                        self.option_modifiers[option.id] = Modifier(
+                            attribute, option.pricing_tiers, option.price_modifier_type, option)
+            elif attribute.is_required and attribute.pricing_tiers:
+                self.required_modifiers.append(Modifier(
+                    attribute, attribute.pricing_tiers, attribute.price_modifier_type))
+
+    def quote(self, quantity, option_ids=()):
+        """Returns a PriceQuote, or None when quantity is not in the pricing grid."""
+        base_unit_price = self.grid.exact(quantity)
+        if base_unit_price is None:
+            return None
+
+        modifiers = self.required_modifiers + [
+            self.option_modifiers[option_id] for option_id in option_ids
+            if option_id in self.option_modifiers
+        ]
+        per_unit_total = Decimal(0)
+        whole_order_total = Decimal(0)
+        applied = []
+        for modifier in modifiers:
+            per_unit, whole_order = modifier.apply(quantity, base_unit_price)
+            if not per_unit and not whole_order:
+                continue
+            per_unit_total += per_unit
+            whole_order_total += whole_order
+            applied.append({
+                'attribute': modifier.attribute_id,
+                'option': modifier.option_id,
+                'label': modifier.label,
+                'per_unit': to_money(per_unit),
+                'total': to_money(per_unit * quantity + whole_order),
+            })
+
+        unit_price = to_money(base_unit_price + per_unit_total)
+        sub_total = to_money(unit_price * quantity + whole_order_total)
+        return PriceQuote(quantity, to_money(base_unit_price), unit_price, sub_total, applied)
+
+
+def _cache_key(catalog_item):
+    return catalog_item.pk, catalog_item.updated_at
+
+
+def _store(key, pricing):
+    with _cache_lock:
+        _cache[key] = pricing
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _lookup(key):
+    with _cache_lock:
+        pricing = _cache.get(key)
+        if pricing is not None:
+            _cache.move_to_end(key)
+        return pricing
+
+
+def get_pricing(catalog_item):
+    """
+    Returns the CompiledPricing of a catalog item. Compiled structures are kept
+    in a bounded in-process cache keyed by the item id and its updated_at, which
+    is bumped whenever the item or one of its attributes changes.
+    """
+    key = _cache_key(catalog_item)
+    pricing = _lookup(key)
+    if pricing is None:
+        if 'attributes' in getattr(catalog_item, '_prefetched_objects_cache', {}):
+            attributes = catalog_item.attributes.all()
+        else:
+            attributes = Attribute.objects.filter(
+                catalog_item=catalog_item).prefetch_related('options')
+        pricing = CompiledPricing(catalog_item, attributes)
+        _store(key, pricing)
+    return pricing
+
+
+def _compile_missing(catalog_items):
+    """Helper function to compile every uncached item with two queries in total."""
+    missing = {}
+    for catalog_item in catalog_items:
+        key = _cache_key(catalog_item)
+        if _lookup(key) is None:
+            missing[key] = catalog_item
+    if not missing:
+        return
+
+    attributes_by_item = {}
+    attributes = Attribute.objects.filter(
+        catalog_item_id__in={catalog_item.pk for catalog_item in missing.values()}
+    ).prefetch_related('options')
+    for attribute in attributes:
+        attributes_by_item.setdefault(
+            attribute.catalog_item_id, []).append(attribute)
+
+    for key, catalog_item in missing.items():
+        _store(key, CompiledPricing(
+            catalog_item, attributes_by_item.get(catalog_item.pk, [])))
+
+
+def quote_item(catalog_item, quantity, option_ids=()):
+    return get_pricing(catalog_item).quote(quantity, option_ids)
+
+
+def price_cart(items):
+    """
+    Prices a whole cart (or any list of objects with catalog_item and quantity)
+    in one call. Returns a dict mapping each item's pk to its PriceQuote, or to
+    None when its quantity is not in the pricing grid, and the cart total. Items
+    without a quote keep contributing their stored sub_total.
+    """
+    items = list(items)
+    _compile_missing([item.catalog_item for item in items])
+
+    quotes = {}
+    total = Decimal(0)
+    for item in items:
+        quote = get_pricing(item.catalog_item).quote(item.quantity)
+        quotes[item.pk] = quote
+        total += quote.sub_total if quote else Decimal(item.sub_total or 0)
+    return quotes, total
@@ -0,0 +1,112 @@
+import hashlib
+import tempfile
+from cloudinary import uploader
+from django.core.cache import cache
+from reportlab.graphics import renderPDF
+from reportlab.pdfgen import canvas
+from .models import CatalogItem
+from .rendering import get_catalog_item_template, get_render_pool, render_card, svg_to_drawing
+from .serializers import SVG_TEMPLATE, TEMPLATE_FIELDS
+
+PAGE_CACHE_PREFIX = 'proof-page:'
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+DETAIL_FIELDS = ['title', 'name', 'email_address', 'phone_number',
+                 'office_number', 'extension', 'description']
+# Template field labels used by the default business card template.
+DETAIL_ALIASES = {'position': 'title',
+                  'phone': 'phone_number', 'email': 'email_address'}
+
+
+def get_item_values(order_item):
+    """Helper function to map an order item's ItemDetails onto template field labels."""
+    details = order_item.details
+    if details is None:
+        return {}
+    values = {field: getattr(details, field) or '' for field in DETAIL_FIELDS}
+    for label, field in DETAIL_ALIASES.items():
+        values[label] = values[field]
+    return values
+
+
+def is_editable(order_item):
+    catalog_item = order_item.catalog_item
+    return catalog_item.item_type == CatalogItem.BUSINESS_CARD or bool(
+        catalog_item.front_svg_code or catalog_item.back_svg_code)
+
+
+def get_item_pages(order_item):
+    """Returns the rendered SVG of every side of an order item, front first."""
+    catalog_item = order_item.catalog_item
+    sides = [catalog_item.front_svg_code or SVG_TEMPLATE]
+    if catalog_item.sides == CatalogItem.FRONT_AND_BACK:
+        sides.append(catalog_item.back_svg_code or SVG_TEMPLATE)
+
+    values = get_item_values(order_item)
+    return [
+        render_card(get_catalog_item_template(
+            catalog_item, svg_code, TEMPLATE_FIELDS), values)
+        for svg_code in sides
+    ]
+
+
+def _get_drawings(pages):
+    """
+    Helper function to convert rendered pages into reportlab Drawings. Pages
+    are cached by the hash of their content and the missing ones are parsed
+    in parallel in the rendering pool.
+    """
+    keys = [PAGE_CACHE_PREFIX + hashlib.sha256(page.encode('utf-8')).hexdigest()
+            for page in pages]
+    drawings = cache.get_many(keys)
+
+    missing = {key: page for key, page in zip(
+        keys, pages) if key not in drawings}
+    if missing:
+        rendered = dict(zip(missing, get_render_pool().map(
+            svg_to_drawing, missing.values())))
+        cache.set_many(rendered, PAGE_CACHE_TIMEOUT)
+        drawings.update(rendered)
+
+    return [drawings[key] for key in keys]
+
+
+def build_order_proof(order, output):
+    """
+    Writes a print-ready PDF with one vector page per side of every editable
+    item of the order into the file-like output. Returns the number of pages.
+    """
+    pages = [page for order_item in order.items.all()
+             if is_editable(order_item) for page in get_item_pages(order_item)]
+    if not pages:
+        return 0
+
+    pdf = canvas.Canvas(output)
+    for drawing in _get_drawings(pages):
+        pdf.setPageSize((drawing.width, drawing.height))
+        renderPDF.draw(drawing, pdf, 0, 0)
+        pdf.showPage()
+    pdf.save()
+    return len(pages)
+
+
+def generate_order_proof(order):
+    """
+    Builds the proof PDF of an order in a temporary file and uploads it to
+    Cloudinary as Order.proof_pdf, so the document is never held in memory.
+    Returns the number of pages; orders without editable items are left as is.
+    """
+    with tempfile.TemporaryFile() as output:
+        page_count = build_order_proof(order, output)
+        if not page_count:
+            return 0
+
+        output.seek(0)
+        order.proof_pdf = uploader.upload_resource(
+            output,
+            resource_type='raw',
+            public_id=f"order_proofs/order_{order.pk}.pdf",
+            overwrite=True,
+        )
+    order.save(update_fields=['proof_pdf'])
+    return page_count
@@ -0,0 +1,161 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.core.cache import cache
+from django.template import Context, Template
+from svglib.svglib import svg2rlg
+
+TEMPLATE_CACHE_SIZE = 256
+RENDER_CACHE_PREFIX = 'rendered-card:'
+RENDER_CACHE_TIMEOUT = 60 * 60
+RASTERIZE_WORKERS = 2
+# Rasterizations allowed to wait for a worker before new ones are refused.
+RASTERIZE_QUEUE_SIZE = 8
+RASTERIZE_TIMEOUT = 30
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_rasterize_slots = threading.BoundedSemaphore(
+    RASTERIZE_WORKERS + RASTERIZE_QUEUE_SIZE)
+
+
+class RenderBusy(Exception):
+    pass
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class CardTemplate:
+    """
+    A compiled SVG template and the (label, placeholder) pairs of its fields.
+    Fields come either from TemplateField rows or from dicts such as the
+    default TEMPLATE_FIELDS.
+    """
+
+    def __init__(self, svg_code, fields):
+        self.svg_hash = _hash(svg_code)
+        self.template = Template(svg_code)
+        self.fields = [
+            (field['label'], field.get('placeholder')) if isinstance(field, dict)
+            else (field.label, field.placeholder)
+            for field in fields
+        ]
+
+    def get_context_data(self, values):
+        return {label: values.get(label, "") or placeholder
+                for label, placeholder in self.fields}
+
+
+def _lookup(key):
+    with _templates_lock:
+        card_template = _templates.get(key)
+        if card_template is not None:
+            _templates.move_to_end(key)
+        return card_template
+
+
+def _store(key, card_template):
+    with _templates_lock:
+        _templates[key] = card_template
+        _templates.move_to_end(key)
+        while len(_templates) > TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+
+
+def get_card_template(svg_code, fields, owner_key=None):
+    """
+    Returns the CardTemplate for svg_code, compiling it on the first call.
+    Compiled templates are kept in a bounded in-process cache keyed by the
+    owner (e.g. the catalog item and its updated_at) and the hash of the SVG.
+    fields may be a callable so it is only evaluated on a cache miss.
+    """
+    key = (owner_key, _hash(svg_code))
+    card_template = _lookup(key)
+    if card_template is None:
+        card_template = CardTemplate(
+            svg_code, fields() if callable(fields) else fields)
+        _store(key, card_template)
+    return card_template
+
+
+def get_catalog_item_template(catalog_item, svg_code, default_fields):
+    """Helper function to get the CardTemplate of a catalog item side without re-querying its template fields."""
+    def get_fields():
+        return list(catalog_item.template_fields.all()) or default_fields
+
+    return get_card_template(
+        svg_code, get_fields, (catalog_item.pk, catalog_item.updated_at))
+
+
+def _rasterize(svg_output):
+    # Imported here because cairosvg needs the native cairo library, which
+    # only has to be present where cards are actually rasterized.
+    import cairosvg
+    return cairosvg.svg2png(bytestring=svg_output.encode('utf-8'))
+
+
+def get_render_pool():
+    """
+    Returns the rendering pool, creating it on first use. Processes
+    keep CPU-heavy renders off the web workers; daemonic processes such as
+    Celery prefork workers cannot have children, so they use threads instead.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if multiprocessing.current_process().daemon:
+                _executor = ThreadPoolExecutor(max_workers=RASTERIZE_WORKERS)
+            else:
+                _executor = ProcessPoolExecutor(
+                    max_workers=RASTERIZE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def svg_to_drawing(svg_output):
+    """Parses an SVG document into a reportlab Drawing, which keeps it as vectors."""
+    drawing = svg2rlg(io.BytesIO(svg_output.encode('utf-8')))
+    if drawing is None:
+        raise ValueError("The SVG document could not be parsed.")
+    return drawing
+
+
+def rasterize(svg_output):
+    """
+    Converts an SVG document to PNG bytes in the bounded pool. Raises
+    RenderBusy when the pool already has a full queue.
+    """
+    if not _rasterize_slots.acquire(blocking=False):
+        raise RenderBusy()
+    try:
+        return get_render_pool().submit(_rasterize, svg_output).result(timeout=RASTERIZE_TIMEOUT)
+    finally:
+        _rasterize_slots.release()
+
+
+def render_card(card_template, values, output_format='svg'):
+    """
+    Renders a card as SVG text or PNG bytes. Outputs are cached by the template
+    hash, the format and the field values, so repeated previews with the same
+    input skip both template rendering and rasterization.
+    """
+    context_data = card_template.get_context_data(values)
+    cache_key = RENDER_CACHE_PREFIX + _hash(json.dumps(
+        [card_template.svg_hash, output_format, context_data], sort_keys=True))
+    output = cache.get(cache_key)
+    if output is not None:
+        return output
+
+    output = card_template.template.render(Context(context_data))
+    if output_format == 'png':
+        output = rasterize(output)
+    cache.set(cache_key, output, RENDER_CACHE_TIMEOUT)
+    return output
@@ -3,7 +3,6 @@ import os
 import re
 import json
 from uuid import uuid4
-import requests
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.db import transaction
@@ -14,23 +13,24 @@ from dotenv import load_dotenv
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
 from io import TextIOWrapper
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import AttributeOption, Attribute, Cart, CartItem, Catalog, CatalogItem, ContactInquiry, FileExchange, Page, OnlinePayment, OnlineProof, OrderItem, Portal, QuoteRequest, File, Customer, Request, FileTransfer, CustomerGroup, PortalContent, Order, OrderItem, PortalContentCatalog, Note, BillingInfo, Shipment, Transaction, ItemDetails, TemplateField, EditableCatalogItemFile
+from .models import AttributeOption, Attribute, Cart, CartItem, Catalog, CatalogItem, ContactInquiry, CustomerImportJob, FileExchange, Page, OnlinePayment, OnlineProof, OrderItem, Portal, QuoteRequest, File, Customer, Request, FileTransfer, CustomerGroup, PortalContent, Order, OrderItem, PortalContentCatalog, Note, BillingInfo, Shipment, Transaction, ItemDetails, TemplateField, EditableCatalogItemFile
 from .utils import create_instance_with_files, validate_catalog, save_item
-from .signals import file_transferred
+from .pricing import price_cart
+from .inventory import reserve_order_items
+from .caching import CATALOGS, bump_version
+from .signals import file_transferred, order_created
 from decimal import Decimal
 from django.template.loader import render_to_string
 import xml.etree.ElementTree as ET
-from django.dispatch import Signal
-
-order_created = Signal()
-
 User = get_user_model()
 
 load_dotenv()
 
+CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
+
 
 def send_email(user, context, subject, template):
     message = render_to_string(template, context)
@@ -43,57 +43,6 @@ def send_email(user, context, subject, template):
         html_message=message
     )
 
-def send_html_email_with_attachments(subject, context, template_name, from_email, recipient_list, files=[]):
-    # Render HTML and plain-text bodies
-    html_content = render_to_string(template_name, context)
-    # text_content = render_to_string(template_name, context)
-
-    # Create email with HTML + plain text
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body='',
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email.attach_alternative(html_content, "text/html")
-    print(len(files))
-
-    existing_filenames = set()
-
-    for file in files:
-        url = file.get("url")
-        name = file.get("name")
-
-        if not url:
-            print("Skipping file with no URL.")
-            continue
-
-        try:
-            response = requests.get(url)
-            print(f"Fetching: {url} - Status: {response.status_code}")
-
-            if response.status_code == 200:
-                filename = name or os.path.basename(url.split('?')[0])
-                
-                # Ensure unique filename
-                if filename in existing_filenames:
-                    base, ext = os.path.splitext(filename)
-                    count = 1
-                    while f"{base}_{count}{ext}" in existing_filenames:
-                        count += 1
-                    filename = f"{base}_{count}{ext}"
-                existing_filenames.add(filename)
-
-                content_type = response.headers.get("Content-Type", "application/octet-stream")
-                email.attach(filename, response.content, content_type)
-                print(f"Attached: {filename} ({len(response.content)} bytes)")
-            else:
-                print(f"Failed to download: {url}")
-        except Exception as e:
-            print(f"Error attaching {url}: {e}")
-
-    email.send()
-
 SVG_TEMPLATE = """<svg width="336" height="192" viewBox="0 0 336 192" fill="none" xmlns="http://www.w3.org/2000/svg">
  <g clip-path="url(#clip0_407_397)">
  <path d="M326 0H10C4.47715 0 0 4.47715 0 10V182C0 187.523 4.47715 192 10 192H326C331.523 192 336 187.523 336 182V10C336 4.47715 331.523 0 326 0Z" fill="white"/>
@@ -609,6 +558,20 @@ def _implement_permission_change(validated_data, instance, old_customers):
             _notify_customer_permission_change(list(affected_customers))
 
 
+def get_portal_member_ids(portal):
+    """
+    Helper function to get the ids of the customers who belong to a portal,
+    directly or through a group. Reads the prefetched customers and groups
+    when present and is computed once per portal instance.
+    """
+    if not hasattr(portal, '_member_ids'):
+        member_ids = {customer.id for customer in portal.customers.all()}
+        for group in portal.customer_groups.all():
+            member_ids.update(customer.id for customer in group.customers.all())
+        portal._member_ids = member_ids
+    return portal._member_ids
+
+
 def get_old_customers(instance):
     old_customers = set()
     old_customers.update(instance.customers.only('id'))
@@ -908,6 +871,8 @@ class CustomerSerializer(serializers.ModelSerializer):
         return customer.user.email
 
     def get_groups_count(self, customer: Customer):
+        if hasattr(customer, 'groups_count'):
+            return customer.groups_count
         return customer.groups.count()
 
     def get_is_active(self, customer: Customer):
@@ -1047,6 +1012,30 @@ class CreateCustomerSerializer(serializers.ModelSerializer):
         return customer
 
 
+class CustomerImportRowSerializer(CreateCustomerSerializer):
+    """
+    Validates one row of a customer CSV import. Email and username uniqueness
+    are checked by the import pipeline against sets prefetched per chunk.
+    """
+
+    class Meta(CreateCustomerSerializer.Meta):
+        fields = [*customer_fields, 'email',
+                  'password', 'username', 'name', 'is_active']
+
+    def validate_email(self, value):
+        return value
+
+    def validate_username(self, value):
+        return value
+
+
+class CustomerImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomerImportJob
+        fields = ['id', 'status', 'processed_rows', 'created_count',
+                  'errors', 'created_at', 'finished_at']
+
+
 class CustomerGroupSerializer(serializers.ModelSerializer):
     customers = SimpleCustomerSerializer(many=True, read_only=True)
     members = serializers.SerializerMethodField()
@@ -1055,7 +1044,15 @@ class CustomerGroupSerializer(serializers.ModelSerializer):
         model = CustomerGroup
         fields = ['id', 'title', 'customers', "date_created", "members"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Member lists are only included when the view expands them.
+        if 'customers' not in self.context.get('expand', {'customers'}):
+            self.fields.pop('customers')
+
     def get_members(self, customer_group: CustomerGroup):
+        if hasattr(customer_group, 'members_count'):
+            return customer_group.members_count
         return customer_group.customers.count()
 
 
@@ -1533,21 +1530,16 @@ class PortalContentSerializer(serializers.ModelSerializer):
         return True
 
     def get_groups_count(self, portal_content: PortalContent):
-        return portal_content.customer_groups.count()
+        return len(portal_content.customer_groups.all())
 
     def get_user_count(self, portal_content: PortalContent):
-        return portal_content.customers.count()
+        return len(portal_content.customers.all())
 
     def get_customers(self, portal_content: PortalContent):
-        customers = portal_content.customers.all()
-        portal = Portal.objects.get(contents=portal_content)
-        portal_customers = portal.customers.all()
-        portal_group_customers = Customer.objects.filter(
-            groups__in=portal.customer_groups.all())
-
-        filtered_customers = customers.intersection(portal_customers).union(
-            customers.intersection(portal_group_customers))
-        return PortalCustomerSerializer(filtered_customers, many=True).data
+        member_ids = get_portal_member_ids(portal_content.portal)
+        customers = [customer for customer in portal_content.customers.all()
+                     if customer.id in member_ids]
+        return PortalCustomerSerializer(customers, many=True).data
 
     def get_can_have_catalogs(self, obj):
         return obj.title == CreatePortalSerializer.ONLINE_ORDERS
@@ -1566,17 +1558,28 @@ class PortalSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'contents', 'can_user_access',
                   'customers', 'customer_groups', 'created_at', 'logo', 'number_of_cart_items']
 
+    # Fields left out unless their relation is in the 'expand' context.
+    expandable_fields = {'contents': 'contents', 'customers': 'customers',
+                         'customer_groups': 'customer_groups', 'carts': 'number_of_cart_items'}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand', self.expandable_fields.keys())
+        for name, field in self.expandable_fields.items():
+            if name not in expand:
+                self.fields.pop(field)
+
     def get_contents(self, obj: Portal):
         customer_id = self.context.get('customer_id')
 
         if not customer_id:
             return PortalContentSerializer(obj.contents.all(), many=True, context={'request': self.context['request']}).data
 
+        accessible_content_ids = self.context.get('accessible_content_ids', set())
         filtered_content = [
             content for content in obj.contents.all()
-            if content.everyone or customer_id in content.customers.values_list('id', flat=True) or
-            any(customer_id in group.customers.values_list('id', flat=True)
-                for group in content.customer_groups.all()) or content.title == CreatePortalSerializer.WELCOME
+            if content.everyone or content.id in accessible_content_ids or
+            content.title == CreatePortalSerializer.WELCOME
         ]
         return PortalContentSerializer(filtered_content, many=True, context={'request': self.context['request']}).data
 
@@ -1586,17 +1589,30 @@ class PortalSerializer(serializers.ModelSerializer):
     def get_number_of_cart_items(self, obj: Portal):
         customer_id = self.context.get('customer_id')
 
-        carts = obj.cart_set.all().prefetch_related('items')
-        if customer_id:
-            carts = carts.filter(customer_id=customer_id)
-
-        return sum([cart.items.count() for cart in carts])
+        return sum(
+            cart.item_count for cart in obj.cart_set.all()
+            if not customer_id or cart.customer_id == customer_id
+        )
 
     def delete(self, instance):
         _implement_permission_change(instance, instance, instance.customers)
         instance.delete()
 
 
+class PortalSummarySerializer(serializers.ModelSerializer):
+    """Portal list entry with counts annotated by annotate_portal_counts instead of the related rows."""
+    logo = serializers.ImageField(read_only=True)
+    contents_count = serializers.IntegerField(read_only=True)
+    customers_count = serializers.IntegerField(read_only=True)
+    customer_groups_count = serializers.IntegerField(read_only=True)
+    number_of_cart_items = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Portal
+        fields = ['id', 'title', 'logo', 'created_at', 'contents_count',
+                  'customers_count', 'customer_groups_count', 'number_of_cart_items']
+
+
 class PatchPortalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Portal
@@ -1616,9 +1632,12 @@ class BulkPortalContentCatalogSerializer(serializers.ListSerializer):
         for item in validated_data:
             item['portal_content_id'] = content_id
 
-        return PortalContentCatalog.objects.bulk_create([
+        assignments = PortalContentCatalog.objects.bulk_create([
             PortalContentCatalog(**item) for item in validated_data
         ])
+        # bulk_create sends no post_save signals.
+        bump_version(CATALOGS)
+        return assignments
 
     def validate(self, data):
         # Validate for duplicates in the incoming data
@@ -1923,7 +1942,6 @@ class CatalogItemSerializer(serializers.ModelSerializer):
                 'front_svg_code', 'back_svg_code', 'sides']
 
     def get_url(self, field):
-        cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
         if not field:
             return None
 
@@ -1934,7 +1952,7 @@ class CatalogItemSerializer(serializers.ModelSerializer):
         if 'http' in url:
             return url
 
-        return f"https://res.cloudinary.com/{cloud_name}/{url}"
+        return f"https://res.cloudinary.com/{CLOUDINARY_CLOUD_NAME}/{url}"
 
     def get_preview_image(self, catalog_item: CatalogItem):
         return self.get_url(catalog_item.preview_image)
@@ -2192,13 +2210,8 @@ class CartItemSerializer(serializers.ModelSerializer):
                   'sub_total', 'unit_price', 'details', 'front_pdf', 'back_pdf', 'created_at']
 
     def get_sub_total(self, cart_item: CartItem):
-        pricing_grid = cart_item.catalog_item.pricing_grid
-        quantity = cart_item.quantity
-        item = next(
-            (entry for entry in pricing_grid if entry["minimum_quantity"] == quantity), None)
-        total_price = (quantity * item['unit_price']
-                       ) if item else cart_item.sub_total
-        return total_price
+        # Kept current by reprice_carts, and summed into Cart.total_price.
+        return cart_item.sub_total
     
     def get_url(self, field: CartItem):
         return field.url if field else None
@@ -2249,16 +2262,7 @@ class CartSerializer(serializers.ModelSerializer):
         return attrs
 
     def get_total_price(self, cart: Cart):
-        return sum(
-            Decimal(
-                cart_item.quantity * next(
-                    (entry['unit_price'] for entry in cart_item.catalog_item.pricing_grid
-                     if entry['minimum_quantity'] == cart_item.quantity),
-                    0
-                ) or cart_item.sub_total
-            )
-            for cart_item in cart.items.all()
-        )
+        return cart.total_price
 
 
 class AddCartItemSerializer(serializers.ModelSerializer):
@@ -2307,6 +2311,18 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ["quantity"]
 
+    def validate(self, attrs):
+        # quantity is the only field, so a partial update without it changes nothing.
+        if 'quantity' not in attrs:
+            return attrs
+        return validate_catalog(self.context, attrs, Cart, 'cart', self.instance)
+
+    @transaction.atomic()
+    def update(self, instance, validated_data):
+        if 'quantity' not in validated_data:
+            return instance
+        return save_item(self.context, validated_data, CartItem, 'cart_id', instance)
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     catalog_item = SimpleCatalogItemSerializer()
@@ -2393,12 +2409,19 @@ class OrderSerializer(serializers.ModelSerializer):
     transactions = TransactionSerializer(many=True, read_only=True)
     notes = NoteSerializer(many=True, read_only=True)
     shipments = ShipmentSerializer(many=True, read_only=True)
-    tax = serializers.SerializerMethodField()
-    shipment_cost = serializers.SerializerMethodField()
-    total_paid = serializers.SerializerMethodField()
-    sub_total = serializers.SerializerMethodField()
-    balance = serializers.SerializerMethodField()
-    total_price = serializers.SerializerMethodField()
+    tax = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    shipment_cost = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    total_paid = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    sub_total = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    balance = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    total_price = serializers.DecimalField(
+        max_digits=14, decimal_places=2, read_only=True)
+    proof_pdf = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -2411,32 +2434,11 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipments', 'transactions', 'status',
             'tracking_number', 'tax', 'shipment_cost',
             'sub_total', 'total_paid', 'balance',
-            "total_price"
+            "total_price", 'proof_pdf'
         ]
 
-    def get_sub_total(self, obj: Order):
-        total_price = sum([item.sub_total for item in obj.items.all()])
-        return total_price
-
-    def get_tax(self, obj: Order):
-        return sum([item.sub_total * (item.tax / 100) for item in obj.items.all()])
-
-    def get_shipment_cost(self, obj: Order):
-        return sum([shipment.shipment_cost for shipment in obj.shipments.all()])
-
-    def get_total_paid(self, obj: Order):
-        total_paid = sum([
-            transaction.amount if transaction.type == 'payment' else (
-                -1 * transaction.amount)
-            for transaction in obj.transactions.all()
-        ])
-        return total_paid
-
-    def get_total_price(self, obj: Order):
-        return self.get_sub_total(obj) + self.get_tax(obj) + self.get_shipment_cost(obj)
-
-    def get_balance(self, obj: Order):
-        return self.get_total_price(obj) - self.get_total_paid(obj)
+    def get_proof_pdf(self, order: Order):
+        return order.proof_pdf.url if order.proof_pdf else None
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -2507,45 +2509,16 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         cart_items = CartItem.objects.select_related(
             "catalog_item").filter(cart_id=cart_id)
         cart = Cart.objects.get(id=cart_id)
+        quotes, _ = price_cart(cart_items)
 
         order = Order.objects.create(customer=cart.customer, **validated_data)
 
         order_items = []
-        catalog_items = []
-        contains_business_card = False
-        attached_files = []
 
         for item in cart_items:
-            catalog_item = item.catalog_item
-            quantity = item.quantity
-
-            if catalog_item.item_type == CatalogItem.BUSINESS_CARD:
-                contains_business_card = True
-
-            if catalog_item.restrict_orders_to_inventory:
-                catalog_item.available_inventory -= quantity
-                catalog_items.append(catalog_item)
-
-            if catalog_item.track_inventory_automatically and catalog_item.available_inventory < catalog_item.minimum_inventory:
-                catalog = catalog_item.catalog
-                if catalog.specify_low_inventory_message:
-                    send_mail(
-                        subject=catalog.subject,
-                        message=catalog.message_text,
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=[
-                            email.strip() for email in catalog.recipient_emails.split(",")],
-                        fail_silently=False,
-                    )
-
-            unit_price = next(
-                (entry['unit_price'] for entry in item.catalog_item.pricing_grid if entry['minimum_quantity'] == item.quantity), item.unit_price)
-            sub_total = item.quantity * unit_price
-
-            if item.front_pdf:
-                attached_files.append({'url':item.front_pdf.url, 'name': item.front_pdf_name})
-            if item.back_pdf:
-                attached_files.append({'url':item.back_pdf.url, 'name': item.back_pdf_name})
+            quote = quotes[item.pk]
+            unit_price = quote.unit_price if quote else item.unit_price
+            sub_total = quote.sub_total if quote else item.quantity * unit_price
 
             order_items.append(OrderItem(
                 order=order,
@@ -2562,55 +2535,17 @@ class CreateOrderSerializer(serializers.ModelSerializer):
                 front_pdf_name=item.front_pdf_name
             ))
         
-        if catalog_items:
-            CatalogItem.objects.bulk_update(
-                catalog_items, ['available_inventory'])
         if order_items:
             OrderItem.objects.bulk_create(order_items)
+            # Reloaded because bulk_create does not set primary keys on MySQL.
+            reserve_order_items(order.items.select_related('catalog_item'))
 
         Cart.objects.filter(pk=cart_id).delete()
 
-        context = {
-            'order_number': order.po_number,
-            'customer_name': order.name,
-            'response_days': 2,
-            'wallsprinting_phone': os.getenv('WALLSPRINTING_PHONE'),
-            'wallsprinting_website': os.getenv('WALLSPRINTING_WEBSITE'),
-            'invoice_number': order.po_number,
-            'po_number': order.po_number,
-            'payment_submission_link': 'your_payment_submission_link_here'
-        }
-
-        if auto_send_proof:
-            template = 'email/order_confirmation_editable.html' if contains_business_card else 'email/order_confirmation.html'
-            subject = f"Your Walls Printing Order Confirmation - {order.po_number}"
-            message = render_to_string(template, context=context)
-            # send_mail(
-            #     subject=subject,
-            #     message='',
-            #     from_email=settings.EMAIL_HOST_USER,
-            #     recipient_list=[order.email_address],
-            #     html_message=message,
-            #     fail_silently=False,
-            #     attachments=[
-            #         (file.name, file.read(), file.content_type) for file in attached_files if file
-            #     ]
-            # )
-
-            send_html_email_with_attachments(
-                subject=subject,
-                context=context,
-                template_name=template,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[order.email_address],
-                files=attached_files,
-            )
-
         order_created.send(
             sender=None,
             order=order,
-            attached_files=attached_files,
-            context=context
+            send_confirmation=auto_send_proof
         )
         return order
 
@@ -1,4 +1,5 @@
 from django.dispatch import Signal
 
 group_created = Signal()
-file_transferred = Signal()
\ No newline at end of file
+file_transferred = Signal()
+order_created = Signal()
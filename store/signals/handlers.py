@@ -1,14 +1,18 @@
 import os
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, m2m_changed, pre_delete, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.conf import settings
 from dotenv import load_dotenv
-from ..models import FileExchange
-from ..signals import file_transferred
-from ..utils import get_base_url
-from store.tasks import send_file_transfer_email_task
+from ..models import FileExchange, Portal, PortalContent, Customer, CustomerGroup, Catalog, CatalogItem, Attribute, AttributeOption, TemplateField, OrderItem, PortalContentCatalog, Cart, CartItem, Page
+from ..signals import file_transferred, order_created
+from ..utils import get_base_url, rebuild_portal_access, get_portal_ids_for_groups, reprice_carts
+from ..inventory import release_order_item
+from ..caching import CATALOGS, PAGES, PORTALS, bump_version
+from store.tasks import send_file_transfer_email_task, send_order_emails_task
 
 
 @receiver(file_transferred)
@@ -32,3 +36,156 @@ def send_file_transfer_email(sender, **kwargs):
     }
 
     send_file_transfer_email_task.delay(subject, context, recipient)
+
+
+@receiver(order_created)
+def send_order_emails(sender, **kwargs):
+    order = kwargs['order']
+    send_confirmation = kwargs['send_confirmation']
+    transaction.on_commit(
+        lambda: send_order_emails_task.delay(order.id, send_confirmation))
+
+
+def _get_affected_portal_ids(sender, instance, reverse, pk_set):
+    """Helper function to find the portals whose access rows an m2m change touches."""
+    if sender is CustomerGroup.customers.through:
+        if not reverse:
+            return get_portal_ids_for_groups([instance.pk])
+        group_ids = pk_set if pk_set is not None else instance.groups.values_list(
+            'id', flat=True)
+        return get_portal_ids_for_groups(group_ids)
+
+    if sender in (Portal.customers.through, Portal.customer_groups.through):
+        if not reverse:
+            return {instance.pk}
+        if pk_set is not None:
+            return set(pk_set)
+        return set(instance.portals.values_list('id', flat=True))
+
+    if not reverse:
+        return {instance.portal_id}
+    if pk_set is None:
+        contents = instance.portal_contents if sender is PortalContent.customers.through else instance.accessible_contents
+        pk_set = contents.values_list('id', flat=True)
+    return set(PortalContent.objects.filter(pk__in=pk_set).values_list('portal_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Portal.customers.through)
+@receiver(m2m_changed, sender=Portal.customer_groups.through)
+@receiver(m2m_changed, sender=PortalContent.customers.through)
+@receiver(m2m_changed, sender=PortalContent.customer_groups.through)
+@receiver(m2m_changed, sender=CustomerGroup.customers.through)
+def sync_portal_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('pre_'):
+        instance._affected_portal_ids = _get_affected_portal_ids(
+            sender, instance, reverse, pk_set)
+        return
+
+    rebuild_portal_access(instance.__dict__.pop('_affected_portal_ids', set()))
+
+
+@receiver(pre_delete, sender=CustomerGroup)
+def collect_group_portal_access(sender, instance, **kwargs):
+    instance._affected_portal_ids = get_portal_ids_for_groups([instance.pk])
+
+
+@receiver(post_delete, sender=CustomerGroup)
+def sync_group_portal_access(sender, instance, **kwargs):
+    rebuild_portal_access(instance.__dict__.pop('_affected_portal_ids', set()))
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def touch_catalog_item_on_attribute_change(sender, instance, **kwargs):
+    CatalogItem.objects.filter(pk=instance.catalog_item_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=AttributeOption)
+@receiver(post_delete, sender=AttributeOption)
+def touch_catalog_item_on_option_change(sender, instance, **kwargs):
+    CatalogItem.objects.filter(attributes=instance.item_attribute_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=CatalogItem)
+def reprice_carts_on_catalog_item_change(sender, instance, created, **kwargs):
+    if not created:
+        reprice_carts(CatalogItem.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def reprice_carts_on_attribute_change(sender, instance, **kwargs):
+    reprice_carts(CatalogItem.objects.filter(pk=instance.catalog_item_id))
+
+
+@receiver(post_save, sender=AttributeOption)
+@receiver(post_delete, sender=AttributeOption)
+def reprice_carts_on_option_change(sender, instance, **kwargs):
+    reprice_carts(CatalogItem.objects.filter(attributes=instance.item_attribute_id))
+
+
+@receiver(post_save, sender=TemplateField)
+@receiver(post_delete, sender=TemplateField)
+def touch_catalog_item_on_template_field_change(sender, instance, **kwargs):
+    if instance.catalog_item_id:
+        CatalogItem.objects.filter(pk=instance.catalog_item_id).update(
+            updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=OrderItem)
+def release_inventory_on_order_item_delete(sender, instance, **kwargs):
+    release_order_item(instance)
+
+
+@receiver(post_save, sender=Catalog)
+@receiver(post_delete, sender=Catalog)
+@receiver(post_save, sender=CatalogItem)
+@receiver(post_delete, sender=CatalogItem)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_save, sender=AttributeOption)
+@receiver(post_delete, sender=AttributeOption)
+@receiver(post_save, sender=TemplateField)
+@receiver(post_delete, sender=TemplateField)
+@receiver(post_save, sender=PortalContentCatalog)
+@receiver(post_delete, sender=PortalContentCatalog)
+@receiver(post_delete, sender=PortalContent)
+def bump_catalogs_version(sender, **kwargs):
+    bump_version(CATALOGS)
+
+
+@receiver(post_save, sender=Portal)
+@receiver(post_delete, sender=Portal)
+@receiver(post_save, sender=PortalContent)
+@receiver(post_delete, sender=PortalContent)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=CustomerGroup)
+@receiver(post_delete, sender=CustomerGroup)
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def bump_portals_version(sender, **kwargs):
+    bump_version(PORTALS)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_portals_version_on_user_change(sender, created, update_fields, **kwargs):
+    # Portals list customer names and emails; logins alone change neither.
+    if not created and update_fields != frozenset(['last_login']):
+        bump_version(PORTALS)
+
+
+@receiver(m2m_changed, sender=PortalContent.catalogs.through)
+def bump_versions_on_catalog_assignment(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version(CATALOGS, PORTALS)
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def bump_pages_version(sender, **kwargs):
+    bump_version(PAGES)
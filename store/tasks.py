@@ -1,7 +1,13 @@
 from celery import shared_task
 from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db.models import Prefetch
 from django.template.loader import render_to_string
+from .copying import copy_catalog_items
+from .emails import send_low_inventory_digests, send_order_emails
+from .imports import run_customer_import
+from .models import CustomerImportJob, Order, OrderItem
+from .proofs import generate_order_proof
 
 
 @shared_task
@@ -15,3 +21,33 @@ def send_file_transfer_email_task(subject, context, recipient):
     )
     email.content_subtype = "html"
     email.send()
+
+
+@shared_task
+def import_customers_task(job_id):
+    run_customer_import(CustomerImportJob.objects.get(pk=job_id))
+
+
+@shared_task
+def send_order_emails_task(order_id, send_confirmation):
+    order = Order.objects.prefetch_related(Prefetch(
+        'items', queryset=OrderItem.objects.select_related('catalog_item'))).get(pk=order_id)
+    send_order_emails(order, send_confirmation)
+
+
+@shared_task
+def generate_order_proof_task(order_id):
+    order = Order.objects.prefetch_related(Prefetch(
+        'items', queryset=OrderItem.objects.select_related('catalog_item', 'details').prefetch_related(
+            'catalog_item__template_fields'))).get(pk=order_id)
+    return generate_order_proof(order)
+
+
+@shared_task
+def send_low_inventory_digests_task():
+    return send_low_inventory_digests()
+
+
+@shared_task
+def copy_catalog_items_task(source_catalog_id, catalog_id):
+    return copy_catalog_items(source_catalog_id, catalog_id)
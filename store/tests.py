@@ -1,3 +1,1324 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request as APIRequest
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core.models import StaffNotification, User
+from . import filecache
+from .caching import get_cached_listing
+from .copying import copy_catalog, copy_catalog_items, copy_portal
+from .pagination import KeysetPagination
+from .pricing import Tiers, get_pricing, price_cart, quote_item
+from .emails import send_low_inventory_digests
+from .inventory import apply_inventory_change, record_low_inventory, reserve_order_items
+from .models import (Attribute, AttributeOption, BillingInfo, Cart, CartItem, Catalog, CatalogItem,
+                     ContactInquiry, Customer, CustomerGroup, CustomerImportJob, File, FileExchange, FileTransfer,
+                     InventoryLedgerEntry, ItemDetails, LowInventoryAlert, Note, OnlineProof, OnlinePayment, Order, OrderItem, Page, Portal,
+                     PortalContent, PortalContentCatalog, QuoteRequest, Request, Shipment,
+                     TemplateField, Transaction)
 
-# Create your tests here.
+API_PREFIXES = ('api/v1/store/', 'api/v1/core/', 'api/v1/auth/')
+
+# Versioned caching is off with the per-process local memory cache, so the
+# tests of it run against a cache every process could share.
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'wallsprint-test-cache'),
+    }
+}
+
+# Query budgets of every GET route of the API as (staff, customer), keyed by
+# the route with its URL arguments in braces. A budget holds at any number of
+# rows, so a serializer that queries once per row fails here before it ships.
+# Lower a budget when a change saves queries; raising one needs a reason.
+QUERY_BUDGETS = {
+    'core/groups/': (9, 2),
+    'core/groups/with-users/': (9, 2),
+    'core/groups/without-users/': (5, 2),
+    'core/groups/{pk}/': (9, 2),
+    'core/groups/{pk}/list_users/': (9, 2),
+    'core/permissions/': (3, 3),
+    'core/permissions/online-proof-permissions/': (3, 3),
+    'core/permissions/web-content-permissions/': (3, 3),
+    'core/permissions/{pk}/': (3, 3),
+    'core/request-metrics/': (2, 2),
+    'core/test-websocket/': (1, 1),
+    'auth/customer/users/': (2, 5),
+    'auth/customer/users/me/': (2, 7),
+    'auth/customer/users/{id}/': (2, 5),
+    'auth/groups/': (9, 2),
+    'auth/groups/with-users/': (9, 2),
+    'auth/groups/without-users/': (5, 2),
+    'auth/groups/{pk}/': (9, 2),
+    'auth/groups/{pk}/list_users/': (9, 2),
+    'auth/permissions/': (3, 2),
+    'auth/permissions/online-proof-permissions/': (3, 2),
+    'auth/permissions/web-content-permissions/': (3, 2),
+    'auth/permissions/{pk}/': (3, 2),
+    'auth/staff-notifications/': (4, 2),
+    'auth/staff-notifications/{pk}/': (4, 2),
+    'auth/staffs/': (7, 2),
+    'auth/staffs/list-with-group-status/': (13, 2),
+    'auth/staffs/me/': (7, 2),
+    'auth/staffs/not-in-notification/': (3, 2),
+    'auth/staffs/with-groups/': (7, 2),
+    'auth/staffs/without-groups/': (5, 2),
+    'auth/staffs/{pk}/': (5, 2),
+    'auth/users/': (7, 2),
+    'auth/users/me/': (6, 2),
+    'auth/users/{id}/': (5, 2),
+    'store/carts/customer-cart-per-portal/': (11, 13),
+    'store/carts/customer-carts/': (11, 13),
+    'store/carts/{cart_pk}/items/': (3, 3),
+    'store/carts/{cart_pk}/items/{item_pk}/details/': (3, 3),
+    'store/carts/{cart_pk}/items/{item_pk}/details/{pk}/': (3, 3),
+    'store/carts/{cart_pk}/items/{pk}/': (3, 3),
+    'store/carts/{pk}/': (9, 10),
+    'store/catalog-items/': (6, 2),
+    'store/catalog-items/get-catalog-items-for-portal/': (6, 2),
+    'store/catalog-items/{pk}/': (6, 2),
+    'store/catalogs/': (3, 3),
+    'store/catalogs/{catalog_pk}/items/': (6, 6),
+    'store/catalogs/{catalog_pk}/items/get-catalog-items-for-portal/': (6, 6),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/attributes/': (4, 4),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/attributes/{attribute_pk}/options/': (3, 3),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/attributes/{attribute_pk}/options/{pk}/': (3, 3),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/attributes/{pk}/': (4, 4),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/template-fields/': (3, 3),
+    'store/catalogs/{catalog_pk}/items/{catalog_item_pk}/template-fields/{pk}/': (3, 3),
+    'store/catalogs/{catalog_pk}/items/{pk}/': (6, 6),
+    'store/catalogs/{pk}/': (3, 3),
+    'store/catalogs/{pk}/favorites/': (7, 7),
+    'store/contact-us/': (3, 5),
+    'store/contact-us/{pk}/': (3, 5),
+    'store/customer-groups/': (3, 5),
+    'store/customer-groups/{pk}/': (4, 5),
+    'store/customers/': (4, 5),
+    'store/customers/bulk-upload/{job_id}/': (3, 5),
+    'store/customers/me/': (3, 6),
+    'store/customers/{pk}/': (4, 5),
+    'store/editable-files/': (4, 2),
+    'store/editable-files/{editable_item_pk}/template-fields/': (3, 3),
+    'store/editable-files/{editable_item_pk}/template-fields/{pk}/': (3, 3),
+    'store/editable-files/{pk}/': (4, 2),
+    'store/file-transfers/': (8, 5),
+    'store/file-transfers/{file_transfer_pk}/billing-info/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/billing-info/{pk}/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/notes/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/notes/{pk}/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/shipments/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/shipments/{pk}/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/transactions/': (3, 3),
+    'store/file-transfers/{file_transfer_pk}/transactions/{pk}/': (3, 3),
+    'store/file-transfers/{pk}/': (8, 5),
+    'store/images/': (3, 3),
+    'store/message-center/': (3, 5),
+    'store/online-payments/': (4, 4),
+    'store/online-payments/{pk}/': (4, 4),
+    'store/online-proofs/': (4, 5),
+    'store/online-proofs/{pk}/': (4, 5),
+    'store/orders/': (13, 14),
+    'store/orders/{order_pk}/items/': (3, 2),
+    'store/orders/{order_pk}/items/{order_item_pk}/details/': (3, 3),
+    'store/orders/{order_pk}/items/{order_item_pk}/details/{pk}/': (3, 3),
+    'store/orders/{order_pk}/items/{pk}/': (3, 2),
+    'store/orders/{order_pk}/notes/': (3, 3),
+    'store/orders/{order_pk}/notes/{pk}/': (3, 3),
+    'store/orders/{order_pk}/shipments/': (3, 3),
+    'store/orders/{order_pk}/shipments/{pk}/': (3, 3),
+    'store/orders/{order_pk}/transactions/': (3, 3),
+    'store/orders/{order_pk}/transactions/{pk}/': (3, 3),
+    'store/orders/{pk}/': (13, 14),
+    'store/pages/': (3, 3),
+    'store/pages/{pk}/': (3, 3),
+    'store/portal-content-catalogs/': (3, 3),
+    'store/portal-content-catalogs/{pk}/': (3, 3),
+    'store/portals/': (3, 5),
+    'store/portals/{pk}/': (16, 18),
+    'store/portals/{portal_pk}/contents/': (12, 12),
+    'store/portals/{portal_pk}/contents/{content_pk}/catalogs/': (3, 3),
+    'store/portals/{portal_pk}/contents/{content_pk}/catalogs/{pk}/': (3, 3),
+    'store/portals/{portal_pk}/contents/{pk}/': (12, 12),
+    'store/quote-requests/': (4, 5),
+    'store/quote-requests/{pk}/': (4, 5),
+    'store/recent-orders/': (6, 5),
+    'store/requests/': (8, 5),
+    'store/requests/{pk}/': (8, 5),
+    'store/requests/{request_pk}/billing-info/': (3, 3),
+    'store/requests/{request_pk}/billing-info/{pk}/': (3, 3),
+    'store/requests/{request_pk}/notes/': (3, 3),
+    'store/requests/{request_pk}/notes/{pk}/': (3, 3),
+    'store/requests/{request_pk}/shipments/': (3, 3),
+    'store/requests/{request_pk}/shipments/{pk}/': (3, 3),
+    'store/requests/{request_pk}/transactions/': (3, 3),
+    'store/requests/{request_pk}/transactions/{pk}/': (3, 3),
+    'store/transfer-files/': (3, 5),
+    'store/transfer-files/{pk}/': (3, 5),
+}
+
+# Each resource below has its own test in QueryBudgetTests.
+BUDGETED_RESOURCES = (
+    'core/groups/',
+    'core/permissions/',
+    'core/request-metrics/',
+    'core/test-websocket/',
+    'auth/customer/users/',
+    'auth/groups/',
+    'auth/permissions/',
+    'auth/staff-notifications/',
+    'auth/staffs/',
+    'auth/users/',
+    'store/carts/',
+    'store/catalog-items/',
+    'store/catalogs/',
+    'store/contact-us/',
+    'store/customer-groups/',
+    'store/customers/',
+    'store/editable-files/',
+    'store/file-transfers/',
+    'store/images/',
+    'store/message-center/',
+    'store/online-payments/',
+    'store/online-proofs/',
+    'store/orders/',
+    'store/pages/',
+    'store/portal-content-catalogs/',
+    'store/portals/',
+    'store/quote-requests/',
+    'store/recent-orders/',
+    'store/requests/',
+    'store/transfer-files/',
+)
+
+# Query strings the routes need to get past validation, filled from fixtures.
+QUERY_STRINGS = {
+    'auth/staffs/list-with-group-status/': 'group_id={group}',
+    'store/carts/customer-cart-per-portal/': 'portal_id={portal}&customer_id={customer}',
+    'store/carts/customer-carts/': 'customer_id={customer}',
+    'store/catalog-items/get-catalog-items-for-portal/': 'portal_id={portal}',
+    'store/catalogs/{catalog_pk}/items/get-catalog-items-for-portal/': 'portal_id={portal}',
+}
+
+# The fixture each URL argument is filled from; pk and id depend on the route.
+URL_ARGUMENTS = {
+    'portal_pk': 'portal',
+    'content_pk': 'portal_content',
+    'catalog_pk': 'catalog',
+    'catalog_item_pk': 'catalog_item',
+    'attribute_pk': 'attribute',
+    'cart_pk': 'cart',
+    'item_pk': 'cart_item',
+    'order_pk': 'order',
+    'order_item_pk': 'order_item',
+    'request_pk': 'request_object',
+    'file_transfer_pk': 'file_transfer',
+    'editable_item_pk': 'catalog_item',
+    'job_id': 'import_job',
+}
+
+PK_FIXTURES = {
+    'groups': 'group', 'group': 'group', 'permissions': 'permission', 'permission': 'permission',
+    'staffs': 'staff', 'staff-notifications': 'staff_notification', 'user': 'staff',
+    'carts': 'cart', 'cart-items': 'cart_item', 'cart-details': 'item_details',
+    'quote-requests': 'quote_request', 'file-transfers': 'file_transfer',
+    'transfer-files': 'file_exchange', 'online-proofs': 'online_proof',
+    'catalogs': 'catalog', 'catalog-items': 'catalog_item', 'orders': 'order',
+    'order-items': 'order_item', 'order-details': 'item_details', 'portals': 'portal',
+    'portal-contents': 'portal_content', 'pages': 'page', 'customers': 'customer',
+    'customer-groups': 'customer_group', 'requests': 'request_object',
+    'portal-content-catalogs': 'portal_content_catalog', 'content-catalogs': 'portal_content_catalog',
+    'online-payments': 'online_payment', 'contact-us': 'contact_inquiry',
+    'editable-files': 'catalog_item', 'attributes': 'attribute',
+    'attribute-options': 'attribute_option', 'template-fields': 'template_field',
+    'request-notes': 'request_note', 'file-transfer-notes': 'file_transfer_note',
+    'order-notes': 'order_note', 'request-billing-info': 'billing_info',
+    'file-transfer-billing-info': 'billing_info', 'request-shipments': 'request_shipment',
+    'file-transfer-shipments': 'file_transfer_shipment', 'order-shipments': 'order_shipment',
+    'request-transactions': 'request_transaction',
+    'file-transfer-transactions': 'file_transfer_transaction',
+    'order-transactions': 'order_transaction',
+}
+
+
+def get_api_routes():
+    """
+    Returns {route: (basename, url arguments)} for every route of the API that
+    answers GET, with routes written like store/catalogs/{catalog_pk}/items/.
+    """
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern))
+            else:
+                yield prefix + str(pattern.pattern), pattern
+
+    routes = {}
+    for route, pattern in walk(get_resolver().url_patterns, ''):
+        route = re.sub(r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>',
+                       lambda match: '{%s}' % (match.group(1) or match.group(2)), route)
+        route = route.replace('^', '').replace('$', '')
+        if not route.startswith(API_PREFIXES) or '{format}' in route or '.json' in route:
+            continue
+        callback = pattern.callback
+        if hasattr(callback, 'actions'):
+            if 'get' not in callback.actions:
+                continue
+        elif not hasattr(getattr(callback, 'view_class', None), 'get'):
+            continue
+        if pattern.name == 'api-root':
+            continue
+        basename = getattr(callback, 'initkwargs', {}).get('basename', pattern.name)
+        routes[route[len('api/v1/'):]] = (basename, re.findall(r'{(\w+)}', route))
+    return routes
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Requests every GET route of the API as staff and as a customer, first
+    with 10 rows behind each collection and then with 100, and checks that
+    the number of queries stays within QUERY_BUDGETS and does not grow. The
+    requests are made once for the class; each test checks one resource.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        cls.routes = get_api_routes()
+        cls.seeded = 1
+        cls.seed(9)
+        cls.small = cls.count_queries()
+        cls.seed(90)
+        cls.large = cls.count_queries()
+
+    @classmethod
+    def create_fixtures(cls):
+        cls.staff = User.objects.create(
+            email='staff@example.com', username='staff', name='Staff',
+            is_staff=True, is_superuser=True)
+        cls.customer_user = User.objects.create(
+            email='customer@example.com', username='customer', name='Customer')
+        cls.customer = Customer.objects.create(
+            user=cls.customer_user, company='Customer Co')
+        cls.staff_notification = StaffNotification.objects.create(user=cls.staff)
+        cls.group = Group.objects.create(name='Budget staff')
+        cls.permission = Permission.objects.first()
+
+        cls.customer_group = CustomerGroup.objects.create(title='Budget customers')
+        cls.customer_group.customers.add(cls.customer)
+        cls.page = Page.objects.create(title='Page', content='<p>Page</p>')
+
+        cls.catalog = Catalog.objects.create(title='Catalog')
+        cls.catalog_item = cls.create_catalog_item(0)
+        cls.attribute = cls.catalog_item.attributes.get()
+        cls.attribute_option = cls.attribute.options.get()
+        cls.template_field = cls.catalog_item.template_fields.get()
+
+        cls.portal = Portal.objects.create(title='Portal')
+        cls.portal.customers.add(cls.customer)
+        cls.portal.customer_groups.add(cls.customer_group)
+        cls.portal_content = cls.create_portal_content(0)
+        cls.portal_content_catalog = PortalContentCatalog.objects.get(
+            portal_content=cls.portal_content, catalog=cls.catalog)
+
+        cls.item_details = ItemDetails.objects.create(title='Details', name='Customer')
+        cls.cart = Cart.objects.create(customer=cls.customer, portal=cls.portal)
+        cls.cart_item = cls.create_cart_item(0)
+        cls.billing_info = BillingInfo.objects.create(
+            first_name='Customer', last_name='Co', email_address='customer@example.com',
+            phone_number='5550100', address='1 Main St', state='IL', city='Chicago',
+            zip_code='60601')
+
+        cls.order = Order.objects.create(
+            name='Customer', email_address='customer@example.com', customer=cls.customer,
+            portal=cls.portal, address='1 Main St', po_number='PO-1',
+            billing_info=cls.billing_info)
+        cls.order_item = cls.create_order_item(0)
+        cls.request_object = Request.objects.create(
+            name='Customer', email_address='customer@example.com', project_name='Project',
+            you_are_a='New Customer', this_is_an='Order Request',
+            billing_info=cls.billing_info)
+        cls.file_transfer = FileTransfer.objects.create(
+            name='Customer', email_address='customer@example.com', file_type='Other',
+            application_type='PC', billing_info=cls.billing_info)
+        for name, target in [('request', cls.request_object),
+                             ('file_transfer', cls.file_transfer), ('order', cls.order)]:
+            note, shipment, transaction = cls.create_activity(target, 0)
+            setattr(cls, f'{name}_note', note)
+            setattr(cls, f'{name}_shipment', shipment)
+            setattr(cls, f'{name}_transaction', transaction)
+
+        cls.quote_request = QuoteRequest.objects.create(
+            name='Customer', email_address='customer@example.com', project_name='Quote')
+        cls.online_proof = OnlineProof.objects.create(
+            name='Staff', email_address='staff@example.com', proof_status='Pending',
+            recipient_name='Customer', recipient_email='customer@example.com')
+        cls.online_payment = OnlinePayment.objects.create(
+            name='Customer', email_address='customer@example.com',
+            payment_method='credit_card', po_number='PO-1', amount=10)
+        cls.contact_inquiry = ContactInquiry.objects.create(
+            name='Customer', email_address='customer@example.com', questions='Questions')
+        cls.file_exchange = cls.create_file_exchange(0)
+        cls.import_job = CustomerImportJob.objects.create(
+            file_content='company\n', created_by=cls.staff)
+
+    @classmethod
+    def create_catalog_item(cls, index):
+        catalog_item = CatalogItem.objects.create(
+            title=f'Item {index}', catalog=cls.catalog, item_sku=f'SKU-{index}',
+            description='Item', pricing_grid=[{'minimum_quantity': 1, 'unit_price': 5}],
+            file_name=f'card-{index}.pdf', is_favorite=True)
+        attribute = Attribute.objects.create(
+            label='Paper', catalog_item=catalog_item, attribute_type=Attribute.SELECT_MENU)
+        AttributeOption.objects.create(
+            option='Matte', alternate_display_text='Matte', item_attribute=attribute)
+        TemplateField.objects.create(label='name', catalog_item=catalog_item)
+        return catalog_item
+
+    @classmethod
+    def create_portal_content(cls, index):
+        portal_content = PortalContent.objects.create(
+            title=f'Content {index}', portal=cls.portal, page=cls.page, can_have_catalogs=True)
+        portal_content.customers.add(cls.customer)
+        portal_content.customer_groups.add(cls.customer_group)
+        portal_content.catalogs.add(cls.catalog)
+        PortalContentCatalog.objects.create(portal_content=portal_content, catalog=cls.catalog)
+        return portal_content
+
+    @classmethod
+    def create_cart_item(cls, index):
+        return CartItem.objects.create(
+            cart=cls.cart, catalog_item=cls.catalog_item, quantity=1, unit_price=5,
+            sub_total=5, details=cls.item_details)
+
+    @classmethod
+    def create_order_item(cls, index):
+        return OrderItem.objects.create(
+            order=cls.order, catalog_item=cls.catalog_item, quantity=1, unit_price=5,
+            sub_total=5, details=cls.item_details)
+
+    @classmethod
+    def create_activity(cls, target, index):
+        content_type = ContentType.objects.get_for_model(target)
+        note = Note.objects.create(
+            content=f'Note {index}', author=cls.staff, content_type=content_type,
+            object_id=target.pk)
+        shipment = Shipment.objects.create(
+            first_name='Customer', last_name='Co', email_address='customer@example.com',
+            phone_number='5550100', address='1 Main St', state='IL', city='Chicago',
+            zip_code='60601', content_type=content_type, object_id=target.pk)
+        transaction = Transaction.objects.create(
+            amount=10, type=Transaction.PAYMENT, content_type=content_type, object_id=target.pk)
+        File.objects.create(
+            file_name=f'file-{index}.pdf', content_type=content_type, object_id=target.pk)
+        return note, shipment, transaction
+
+    @classmethod
+    def create_file_exchange(cls, index):
+        return FileExchange.objects.create(
+            email_address='staff@example.com', recipient_name='Customer',
+            recipient_email='customer@example.com', file=f'uploads/file-{index}.pdf',
+            file_size=1)
+
+    @classmethod
+    def seed(cls, count):
+        """Adds count rows to every collection the routes list or nest."""
+        customers = []
+        staff = []
+        for index in range(count):
+            user = User.objects.create(
+                email=f'seeded-{cls.seeded}@example.com', username=f'seeded-{cls.seeded}',
+                name=f'Seeded {cls.seeded}', is_staff=index % 2 == 0)
+            if not user.is_staff:
+                customer = Customer.objects.create(user=user, company=f'Company {cls.seeded}')
+                customers.append(customer)
+                Order.objects.create(
+                    name='Seeded', email_address=user.email, customer=customer,
+                    address='1 Main St', po_number='PO')
+            else:
+                staff.append(user)
+            cls.seeded += 1
+
+            cls.create_catalog_item(cls.seeded)
+            cls.create_portal_content(cls.seeded)
+            cls.create_cart_item(cls.seeded)
+            cls.create_order_item(cls.seeded)
+            Order.objects.create(
+                name='Customer', email_address='customer@example.com', customer=cls.customer,
+                portal=cls.portal, address='1 Main St', po_number=f'PO-{cls.seeded}')
+            for target in [cls.request_object, cls.file_transfer, cls.order]:
+                cls.create_activity(target, cls.seeded)
+            Catalog.objects.create(title=f'Catalog {cls.seeded}')
+            Page.objects.create(title=f'Page {cls.seeded}')
+            CustomerGroup.objects.create(title=f'Group {cls.seeded}')
+            Request.objects.create(
+                name='Seeded', email_address='seeded@example.com', project_name='Project',
+                you_are_a='New Customer', this_is_an='Estimate Request')
+            FileTransfer.objects.create(
+                name='Seeded', email_address='seeded@example.com', file_type='Other',
+                application_type='PC')
+            QuoteRequest.objects.create(
+                name='Seeded', email_address='seeded@example.com', project_name='Quote')
+            OnlineProof.objects.create(
+                name='Staff', email_address='staff@example.com', proof_status='Pending',
+                recipient_name='Seeded', recipient_email='seeded@example.com')
+            OnlinePayment.objects.create(
+                name='Seeded', email_address='seeded@example.com',
+                payment_method='credit_card', po_number='PO', amount=10)
+            ContactInquiry.objects.create(
+                name='Seeded', email_address='seeded@example.com', questions='Questions')
+            cls.create_file_exchange(cls.seeded)
+
+        cls.customer_group.customers.add(*customers)
+        cls.portal.customers.add(*customers)
+        cls.group.user_set.add(*staff)
+
+    @classmethod
+    def get_client(cls, user):
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    @classmethod
+    def get_url(cls, route, basename, arguments):
+        values = {}
+        for argument in arguments:
+            if argument in ('pk', 'id'):
+                fixture = PK_FIXTURES[basename]
+            else:
+                fixture = URL_ARGUMENTS[argument]
+            values[argument] = getattr(cls, fixture).pk
+        url = '/api/v1/' + route.format(**values)
+        query_string = QUERY_STRINGS.get(route)
+        if query_string:
+            url += '?' + query_string.format(**{
+                fixture: getattr(cls, fixture).pk for fixture in re.findall(r'{(\w+)}', query_string)})
+        return url
+
+    @classmethod
+    def count_queries(cls):
+        """
+        Returns {(route, role): (url, status code, number of queries)} with
+        every cache cold.
+        """
+        counts = {}
+        for role, user in [('staff', cls.staff), ('customer', cls.customer_user)]:
+            client = cls.get_client(user)
+            for route, (basename, arguments) in cls.routes.items():
+                url = cls.get_url(route, basename, arguments)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                counts[route, role] = (url, response.status_code, len(queries))
+        return counts
+
+    def assertWithinBudgets(self, resource):
+        routes = [route for route in QUERY_BUDGETS if route.startswith(resource)]
+        self.assertTrue(routes, f'No query budgets for {resource}')
+        for route in routes:
+            for role, budget in zip(['staff', 'customer'], QUERY_BUDGETS[route]):
+                with self.subTest(route=route, role=role):
+                    url, status_code, small = self.small[route, role]
+                    self.assertLess(status_code, 500, f'{role} GET {url}')
+                    url, status_code, large = self.large[route, role]
+                    self.assertLess(status_code, 500, f'{role} GET {url}')
+                    self.assertLessEqual(large, small, 'Queries grow with the number of rows')
+                    self.assertLessEqual(large, budget, 'Over the query budget')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(set(self.routes) - set(QUERY_BUDGETS), set(),
+                         'Routes without a query budget')
+        self.assertEqual(set(QUERY_BUDGETS) - set(self.routes), set(),
+                         'Query budgets of routes that no longer exist')
+        self.assertEqual([route for route in QUERY_BUDGETS if not route.startswith(BUDGETED_RESOURCES)], [],
+                         'Routes not covered by a test below')
+
+    def test_core_groups(self):
+        self.assertWithinBudgets('core/groups/')
+
+    def test_core_permissions(self):
+        self.assertWithinBudgets('core/permissions/')
+
+    def test_core_request_metrics(self):
+        self.assertWithinBudgets('core/request-metrics/')
+
+    def test_core_test_websocket(self):
+        self.assertWithinBudgets('core/test-websocket/')
+
+    def test_auth_customer_users(self):
+        self.assertWithinBudgets('auth/customer/users/')
+
+    def test_auth_groups(self):
+        self.assertWithinBudgets('auth/groups/')
+
+    def test_auth_permissions(self):
+        self.assertWithinBudgets('auth/permissions/')
+
+    def test_auth_staff_notifications(self):
+        self.assertWithinBudgets('auth/staff-notifications/')
+
+    def test_auth_staffs(self):
+        self.assertWithinBudgets('auth/staffs/')
+
+    def test_auth_users(self):
+        self.assertWithinBudgets('auth/users/')
+
+    def test_store_carts(self):
+        self.assertWithinBudgets('store/carts/')
+
+    def test_store_catalog_items(self):
+        self.assertWithinBudgets('store/catalog-items/')
+
+    def test_store_catalogs(self):
+        self.assertWithinBudgets('store/catalogs/')
+
+    def test_store_contact_us(self):
+        self.assertWithinBudgets('store/contact-us/')
+
+    def test_store_customer_groups(self):
+        self.assertWithinBudgets('store/customer-groups/')
+
+    def test_store_customers(self):
+        self.assertWithinBudgets('store/customers/')
+
+    def test_store_editable_files(self):
+        self.assertWithinBudgets('store/editable-files/')
+
+    def test_store_file_transfers(self):
+        self.assertWithinBudgets('store/file-transfers/')
+
+    def test_store_images(self):
+        self.assertWithinBudgets('store/images/')
+
+    def test_store_message_center(self):
+        self.assertWithinBudgets('store/message-center/')
+
+    def test_store_online_payments(self):
+        self.assertWithinBudgets('store/online-payments/')
+
+    def test_store_online_proofs(self):
+        self.assertWithinBudgets('store/online-proofs/')
+
+    def test_store_orders(self):
+        self.assertWithinBudgets('store/orders/')
+
+    def test_store_pages(self):
+        self.assertWithinBudgets('store/pages/')
+
+    def test_store_portal_content_catalogs(self):
+        self.assertWithinBudgets('store/portal-content-catalogs/')
+
+    def test_store_portals(self):
+        self.assertWithinBudgets('store/portals/')
+
+    def test_store_quote_requests(self):
+        self.assertWithinBudgets('store/quote-requests/')
+
+    def test_store_recent_orders(self):
+        self.assertWithinBudgets('store/recent-orders/')
+
+    def test_store_requests(self):
+        self.assertWithinBudgets('store/requests/')
+
+    def test_store_transfer_files(self):
+        self.assertWithinBudgets('store/transfer-files/')
+
+@override_settings(CACHES=SHARED_CACHES)
+class CatalogListingCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = Catalog.objects.create(title='Catalog')
+        cls.other_catalog = Catalog.objects.create(title='Other catalog')
+        cls.catalog_item = CatalogItem.objects.create(
+            title='Item', catalog=cls.catalog, item_sku='SKU-1', description='Item',
+            pricing_grid=[{'minimum_quantity': 1, 'unit_price': 5}], available_inventory=10)
+        cls.portal = Portal.objects.create(title='Portal')
+        cls.other_portal = Portal.objects.create(title='Other portal')
+        page = Page.objects.create(title='Page', content='<p>Page</p>')
+        PortalContent.objects.create(
+            title='Content', portal=cls.portal, page=page).catalogs.add(cls.catalog)
+        PortalContent.objects.create(
+            title='Content', portal=cls.other_portal, page=page).catalogs.add(cls.other_catalog)
+
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+
+    def get_listing(self, kind, owner_id):
+        def build():
+            self.builds.append((kind, owner_id))
+            return []
+        return get_cached_listing(kind, owner_id, build)
+
+    def get_listings(self):
+        self.builds = []
+        for kind, owner_id in [('catalog', self.catalog.pk), ('catalog', self.other_catalog.pk),
+                               ('portal', self.portal.pk), ('portal', self.other_portal.pk)]:
+            self.get_listing(kind, owner_id)
+        return self.builds
+
+    def test_stock_changes_only_invalidate_listings_showing_the_item(self):
+        self.get_listings()
+        self.assertEqual(self.get_listings(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(apply_inventory_change(self.catalog_item.pk, -2))
+
+        self.assertEqual(self.get_listings(), [
+            ('catalog', self.catalog.pk), ('portal', self.portal.pk)])
+
+    def test_catalog_edits_invalidate_every_listing(self):
+        self.get_listings()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog_item.save()
+
+        self.assertEqual(len(self.get_listings()), 4)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_listings_are_not_cached_in_a_per_process_cache(self):
+        self.get_listings()
+        self.assertEqual(len(self.get_listings()), 4)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(
+            email='staff@example.com', username='staff', name='Staff',
+            is_staff=True, is_superuser=True)
+        cls.page = Page.objects.create(title='Page', content='<p>Page</p>')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+
+    def test_current_copy_is_not_modified(self):
+        response = self.client.get('/api/v1/store/pages/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            '/api/v1/store/pages/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_the_etag(self):
+        etag = self.client.get('/api/v1/store/pages/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+
+        response = self.client.get('/api/v1/store/pages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_no_validators_with_a_per_process_cache(self):
+        response = self.client.get('/api/v1/store/pages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class FileCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            ATTACHMENT_CACHE_DIR=directory.name, ATTACHMENT_CACHE_MAX_BYTES=10)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        filecache._size.update(total=None, scanned_at=0)
+
+    def test_read_returns_what_was_written(self):
+        filecache.write_cached_file('proof@1', b'12345')
+
+        self.assertEqual(filecache.read_cached_file('proof@1'), b'12345')
+        self.assertIsNone(filecache.read_cached_file('proof@2'))
+
+    def test_least_recently_used_files_are_evicted(self):
+        filecache.write_cached_file('first@1', b'1234')
+        filecache.write_cached_file('second@1', b'1234')
+        os.utime(filecache._get_path('first@1'), (0, 0))
+        filecache.write_cached_file('third@1', b'1234')
+
+        self.assertIsNone(filecache.read_cached_file('first@1'))
+        self.assertEqual(filecache.read_cached_file('second@1'), b'1234')
+        self.assertEqual(filecache.read_cached_file('third@1'), b'1234')
+
+    def test_directory_is_only_walked_when_the_cache_may_be_full(self):
+        with mock.patch.object(filecache.os, 'walk', wraps=os.walk) as walk:
+            filecache.write_cached_file('first@1', b'1234')
+            filecache.write_cached_file('second@1', b'1234')
+            filecache.write_cached_file('second@1', b'12345')
+            self.assertEqual(walk.call_count, 1)
+
+            filecache.write_cached_file('third@1', b'1234')
+            self.assertEqual(walk.call_count, 2)
+
+    def test_metrics_are_logged_periodically(self):
+        filecache._metrics_logged_at['at'] = 0
+        filecache.write_cached_file('proof@1', b'12345')
+
+        with self.assertLogs('store.filecache', 'INFO') as logs:
+            filecache.read_cached_file('proof@1')
+        self.assertIn('hits', logs.output[0])
+
+        with self.assertNoLogs('store.filecache', 'INFO'):
+            filecache.read_cached_file('proof@2')
+
+
+class PricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalog = Catalog.objects.create(title='Catalog')
+        cls.catalog_item = CatalogItem.objects.create(
+            title='Cards', catalog=catalog, item_sku='CARDS', description='Cards',
+            pricing_grid=[{'minimum_quantity': 100, 'unit_price': '8.00'},
+                          {'minimum_quantity': 1, 'unit_price': '10.00'}])
+        Attribute.objects.create(
+            label='Rush', catalog_item=cls.catalog_item, is_required=True,
+            price_modifier_scope=Attribute.PER_UNIT,
+            pricing_tiers=[{'minimum_quantity': 1, 'unit_price': '1.00'},
+                           {'minimum_quantity': 50, 'unit_price': '0.50'}])
+        paper = Attribute.objects.create(
+            label='Paper', catalog_item=cls.catalog_item, attribute_type=Attribute.SELECT_MENU,
+            price_modifier_scope=Attribute.ALL_UNITS)
+        cls.gloss = AttributeOption.objects.create(
+            option='Gloss', alternate_display_text='Gloss', item_attribute=paper,
+            price_modifier_type='percentage',
+            pricing_tiers=[{'minimum_quantity': 1, 'unit_price': '10'}])
+        cls.matte = AttributeOption.objects.create(
+            option='Matte', alternate_display_text='Matte', item_attribute=paper)
+
+    def test_tier_boundaries(self):
+        tiers = Tiers([{'minimum_quantity': 50, 'unit_price': 2},
+                       {'minimum_quantity': 10, 'unit_price': 3}])
+
+        self.assertIsNone(tiers.applicable(9))
+        self.assertEqual(tiers.applicable(10), Decimal(3))
+        self.assertEqual(tiers.applicable(49), Decimal(3))
+        self.assertEqual(tiers.applicable(50), Decimal(2))
+        self.assertEqual(tiers.applicable(1000), Decimal(2))
+        self.assertEqual(tiers.exact(50), Decimal(2))
+        self.assertIsNone(tiers.exact(49))
+        self.assertFalse(Tiers('not a list'))
+
+    def test_quantities_outside_the_grid_have_no_quote(self):
+        self.assertIsNone(quote_item(self.catalog_item, 50))
+
+    def test_required_attributes_apply_their_tier(self):
+        quote = quote_item(self.catalog_item, 1)
+        self.assertEqual((quote.base_unit_price, quote.unit_price, quote.sub_total),
+                         (Decimal('10.00'), Decimal('11.00'), Decimal('11.00')))
+
+        quote = quote_item(self.catalog_item, 100)
+        self.assertEqual((quote.base_unit_price, quote.unit_price, quote.sub_total),
+                         (Decimal('8.00'), Decimal('8.50'), Decimal('850.00')))
+
+    def test_selected_options_apply_to_the_whole_order(self):
+        quote = quote_item(self.catalog_item, 100, [self.gloss.pk, self.matte.pk])
+
+        self.assertEqual(quote.unit_price, Decimal('8.50'))
+        self.assertEqual(quote.sub_total, Decimal('930.00'))
+        self.assertEqual([modifier['label'] for modifier in quote.modifiers],
+                         ['Rush', 'Paper: Gloss'])
+        self.assertEqual(quote.modifiers[1]['total'], Decimal('80.00'))
+
+    def test_compiled_pricing_follows_changes_to_the_item(self):
+        get_pricing(self.catalog_item)
+        self.catalog_item.pricing_grid = [{'minimum_quantity': 1, 'unit_price': '12.00'}]
+        self.catalog_item.save()
+
+        self.assertEqual(quote_item(self.catalog_item, 1).unit_price, Decimal('13.00'))
+
+    def test_cart_items_without_a_quote_keep_their_sub_total(self):
+        cart = Cart.objects.create()
+        priced = CartItem.objects.create(
+            cart=cart, catalog_item=self.catalog_item, quantity=100, unit_price=0, sub_total=0)
+        unpriced = CartItem.objects.create(
+            cart=cart, catalog_item=self.catalog_item, quantity=50, unit_price=1, sub_total=7)
+
+        quotes, total = price_cart(cart.items.select_related('catalog_item'))
+
+        self.assertEqual(quotes[priced.pk].sub_total, Decimal('850.00'))
+        self.assertIsNone(quotes[unpriced.pk])
+        self.assertEqual(total, Decimal('857.00'))
+
+
+class InventoryReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalog = Catalog.objects.create(title='Catalog')
+        cls.catalog_item = CatalogItem.objects.create(
+            title='Cards', catalog=catalog, item_sku='CARDS', description='Cards',
+            pricing_grid=[{'minimum_quantity': 1, 'unit_price': 5}],
+            available_inventory=10, restrict_orders_to_inventory=True)
+        cls.order = Order.objects.create(
+            name='Customer', email_address='customer@example.com', address='1 Main St',
+            po_number='PO-1')
+
+    def get_available_inventory(self):
+        self.catalog_item.refresh_from_db()
+        return self.catalog_item.available_inventory
+
+    def get_ledger(self):
+        return list(InventoryLedgerEntry.objects.order_by('pk').values_list(
+            'order_item_id', 'quantity_change', 'reason'))
+
+    def create_order_item(self, quantity):
+        return OrderItem.objects.create(
+            order=self.order, catalog_item=self.catalog_item, quantity=quantity,
+            unit_price=5, sub_total=5 * quantity)
+
+    def test_ordering_reserves_stock(self):
+        order_item = self.create_order_item(4)
+
+        self.assertEqual(self.get_available_inventory(), 6)
+        self.assertEqual(self.get_ledger(), [
+            (order_item.pk, -4, InventoryLedgerEntry.RESERVATION)])
+
+    def test_overselling_is_rejected(self):
+        self.create_order_item(8)
+
+        with self.assertRaises(ValidationError):
+            self.create_order_item(3)
+
+        self.assertEqual(self.get_available_inventory(), 2)
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertEqual(len(self.get_ledger()), 1)
+
+    def test_decrements_only_apply_while_stock_lasts(self):
+        self.assertFalse(apply_inventory_change(self.catalog_item.pk, -11))
+        self.assertTrue(apply_inventory_change(self.catalog_item.pk, -10))
+        self.assertFalse(apply_inventory_change(self.catalog_item.pk, -1))
+        self.assertEqual(self.get_available_inventory(), 0)
+
+    def test_quantities_of_the_same_item_are_reserved_together(self):
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, catalog_item=self.catalog_item, quantity=6,
+                      unit_price=5, sub_total=30)
+            for _ in range(2)])
+
+        with self.assertRaises(ValidationError):
+            reserve_order_items(OrderItem.objects.filter(
+                pk__in=[order_item.pk for order_item in order_items]).select_related('catalog_item'))
+        self.assertEqual(self.get_available_inventory(), 10)
+
+    def test_quantity_changes_reserve_or_release_the_difference(self):
+        order_item = self.create_order_item(4)
+
+        order_item.quantity = 7
+        order_item.save()
+        self.assertEqual(self.get_available_inventory(), 3)
+
+        order_item.quantity = 2
+        order_item.save()
+        self.assertEqual(self.get_available_inventory(), 8)
+        self.assertEqual(self.get_ledger(), [
+            (order_item.pk, -4, InventoryLedgerEntry.RESERVATION),
+            (order_item.pk, -3, InventoryLedgerEntry.RESERVATION),
+            (order_item.pk, 5, InventoryLedgerEntry.RELEASE)])
+
+        order_item.quantity = 20
+        with self.assertRaises(ValidationError):
+            order_item.save()
+        self.assertEqual(self.get_available_inventory(), 8)
+
+    def test_deleting_an_order_item_releases_its_stock(self):
+        order_item = self.create_order_item(4)
+        order_item_id = order_item.pk
+
+        order_item.delete()
+
+        self.assertEqual(self.get_available_inventory(), 10)
+        self.assertEqual(self.get_ledger()[-1],
+                         (order_item_id, 4, InventoryLedgerEntry.RELEASE))
+
+    def test_items_that_do_not_track_inventory_are_left_alone(self):
+        CatalogItem.objects.filter(pk=self.catalog_item.pk).update(
+            restrict_orders_to_inventory=False)
+        self.catalog_item.refresh_from_db()
+
+        self.create_order_item(40)
+
+        self.assertEqual(self.get_available_inventory(), 10)
+        self.assertEqual(self.get_ledger(), [])
+
+
+class LowInventoryDigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = Catalog.objects.create(
+            title='Catalog', specify_low_inventory_message=True,
+            recipient_emails='stock@example.com, buyer@example.com',
+            subject='Cards are running low', message_text='Reorder these cards')
+        cls.other_catalog = Catalog.objects.create(
+            title='Other catalog', specify_low_inventory_message=True,
+            recipient_emails='buyer@example.com,stock@example.com',
+            subject='Flyers are running low', message_text='Reorder these flyers')
+        cls.catalog_item = cls.create_catalog_item(cls.catalog, 'Cards')
+        cls.other_catalog_item = cls.create_catalog_item(cls.other_catalog, 'Flyers')
+
+    @classmethod
+    def create_catalog_item(cls, catalog, title):
+        return CatalogItem.objects.create(
+            title=title, catalog=catalog, item_sku=title, description=title,
+            available_inventory=10, minimum_inventory=5, track_inventory_automatically=True)
+
+    def test_items_below_their_minimum_are_alerted_once(self):
+        apply_inventory_change(self.catalog_item.pk, -6)
+        record_low_inventory([self.catalog_item.pk, self.other_catalog_item.pk])
+        apply_inventory_change(self.catalog_item.pk, -1)
+        record_low_inventory([self.catalog_item.pk])
+
+        self.assertEqual(list(LowInventoryAlert.objects.values_list('catalog_item', flat=True)),
+                         [self.catalog_item.pk])
+
+    def test_one_digest_per_recipient_list(self):
+        for catalog_item in [self.catalog_item, self.other_catalog_item]:
+            apply_inventory_change(catalog_item.pk, -6)
+        record_low_inventory([self.catalog_item.pk, self.other_catalog_item.pk])
+
+        self.assertEqual(send_low_inventory_digests(), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(sorted(mail.outbox[0].to), ['buyer@example.com', 'stock@example.com'])
+        self.assertIn('- Cards: 4 left (minimum 5)', mail.outbox[0].body)
+        self.assertIn('- Flyers: 4 left (minimum 5)', mail.outbox[0].body)
+        self.assertEqual(send_low_inventory_digests(), 0)
+
+    def test_recovered_items_are_resolved_and_alerted_again_later(self):
+        apply_inventory_change(self.catalog_item.pk, -6)
+        record_low_inventory([self.catalog_item.pk])
+        send_low_inventory_digests()
+
+        apply_inventory_change(self.catalog_item.pk, 6)
+        send_low_inventory_digests()
+        self.assertFalse(LowInventoryAlert.objects.filter(resolved_at__isnull=True).exists())
+
+        apply_inventory_change(self.catalog_item.pk, -6)
+        record_low_inventory([self.catalog_item.pk])
+        self.assertEqual(send_low_inventory_digests(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, 'Cards are running low')
+
+
+class CopyingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = Catalog.objects.create(title='Catalog')
+        for title in ['Cards', 'Flyers']:
+            catalog_item = CatalogItem.objects.create(
+                title=title, catalog=cls.catalog, item_sku=title, description=title)
+            for label in ['Paper', 'Finish']:
+                attribute = Attribute.objects.create(
+                    label=f'{title} {label}', catalog_item=catalog_item,
+                    attribute_type=Attribute.SELECT_MENU)
+                for option in ['A', 'B']:
+                    AttributeOption.objects.create(
+                        option=f'{attribute.label} {option}', alternate_display_text=option,
+                        item_attribute=attribute)
+            TemplateField.objects.create(label=f'{title} name', catalog_item=catalog_item)
+
+    def describe(self, catalog):
+        """Returns every (item, attribute, option) and (item, template field) of a catalog."""
+        options = AttributeOption.objects.filter(
+            item_attribute__catalog_item__catalog=catalog).values_list(
+            'item_attribute__catalog_item__title', 'item_attribute__label', 'option')
+        template_fields = TemplateField.objects.filter(
+            catalog_item__catalog=catalog).values_list('catalog_item__title', 'label')
+        return sorted(options), sorted(template_fields)
+
+    def test_copied_children_belong_to_the_copies_of_their_parents(self):
+        new_catalog = Catalog.objects.create(title='Copy')
+
+        self.assertEqual(copy_catalog_items(self.catalog.pk, new_catalog.pk), 2)
+
+        self.assertEqual(self.describe(new_catalog), self.describe(self.catalog))
+        self.assertEqual(AttributeOption.objects.count(), 16)
+
+    def test_copies_are_mapped_when_bulk_create_returns_no_keys(self):
+        bulk_create = QuerySet.bulk_create
+
+        def bulk_create_without_keys(queryset, objs, *args, **kwargs):
+            # Like MySQL, which does not return the keys of inserted rows.
+            objs = bulk_create(queryset, objs, *args, **kwargs)
+            for obj in objs:
+                obj.pk = None
+            return objs
+
+        new_catalog = Catalog.objects.create(title='Copy')
+        with mock.patch.object(QuerySet, 'bulk_create', bulk_create_without_keys):
+            copy_catalog_items(self.catalog.pk, new_catalog.pk)
+
+        self.assertEqual(self.describe(new_catalog), self.describe(self.catalog))
+
+    def test_large_catalogs_are_copied_in_the_background(self):
+        with mock.patch('store.copying.COPY_IN_BACKGROUND_THRESHOLD', 1), \
+                mock.patch('store.tasks.copy_catalog_items_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            new_catalog, copying_items = copy_catalog(self.catalog, 'Copy', copy_items=True)
+
+        self.assertTrue(copying_items)
+        delay.assert_called_once_with(self.catalog.pk, new_catalog.pk)
+        self.assertFalse(new_catalog.catalog_items.exists())
+
+    def test_portal_copies_keep_redirects_and_catalogs_within_the_copy(self):
+        portal = Portal.objects.create(title='Portal')
+        page = Page.objects.create(title='Page', content='<p>Page</p>')
+        target = PortalContent.objects.create(title='Target', portal=portal, page=page)
+        source = PortalContent.objects.create(
+            title='Source', portal=portal, page=page, redirect_page=target)
+        source.catalogs.add(self.catalog)
+
+        new_portal = copy_portal(portal, 'Copy', logo=None, same_catalogs=True)
+
+        contents = {content.title: content for content in new_portal.contents.all()}
+        self.assertEqual(set(contents), {'Target', 'Source'})
+        self.assertEqual(contents['Source'].redirect_page_id, contents['Target'].pk)
+        self.assertEqual(list(contents['Source'].catalogs.all()), [self.catalog])
+        self.assertEqual(list(contents['Target'].catalogs.all()), [])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Ties on created_at, and two rows a microsecond apart.
+        created_at = [now, now, now, now - timedelta(seconds=1), now - timedelta(seconds=1),
+                      now - timedelta(seconds=2), now - timedelta(seconds=2, microseconds=1)]
+        names = ['b', 'a', 'b', 'c', 'a', 'b', 'a']
+        for index, (name, timestamp) in enumerate(zip(names, created_at)):
+            inquiry = ContactInquiry.objects.create(
+                name=name, email_address=f'{index}@example.com', questions='Questions')
+            ContactInquiry.objects.filter(pk=inquiry.pk).update(created_at=timestamp)
+
+    def page_through(self, view=None, **params):
+        ids = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            paginator = KeysetPagination()
+            request = APIRequest(RequestFactory().get('/', params))
+            rows = paginator.paginate_queryset(ContactInquiry.objects.all(), request, view)
+            self.assertLessEqual(len(rows), int(params.get('page_size', 50)))
+            ids += [row.pk for row in rows]
+            cursor = paginator.next_cursor
+            if cursor is None:
+                return ids
+
+    def test_pages_neither_repeat_nor_skip_rows_with_equal_timestamps(self):
+        expected = list(ContactInquiry.objects.order_by(
+            '-created_at', '-id').values_list('id', flat=True))
+
+        for page_size in range(1, 8):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.page_through(page_size=page_size), expected)
+
+    def test_pages_follow_the_requested_ordering(self):
+        class View:
+            filter_backends = [OrderingFilter]
+            ordering_fields = ['name']
+
+        expected = list(ContactInquiry.objects.order_by(
+            '-name', '-id').values_list('id', flat=True))
+
+        self.assertEqual(self.page_through(View(), ordering='-name', page_size=2), expected)
+
+    def test_invalid_parameters_are_rejected(self):
+        tampered = [['notadate', 1], [timezone.now().isoformat(), 'notanid'], [1, 2, 3], {'id': 1}]
+        cursors = [base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+                   for values in tampered]
+        for params in [{'cursor': 'not a cursor'}, {'page_size': '0'}, {'page_size': 'many'},
+                       *[{'cursor': cursor} for cursor in cursors]]:
+            with self.subTest(params=params), self.assertRaises(ValidationError):
+                KeysetPagination().paginate_queryset(
+                    ContactInquiry.objects.all(), APIRequest(RequestFactory().get('/', params)))
+
+    def test_tampered_cursor_is_a_bad_request(self):
+        staff = User.objects.create(
+            email='staff@example.com', username='staff', name='Staff',
+            is_staff=True, is_superuser=True)
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(staff)}')
+        cursor = base64.urlsafe_b64encode(json.dumps(['notadate', 1]).encode()).decode()
+
+        response = client.get('/api/v1/store/contact-us/', {'cursor': cursor})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'cursor': 'Invalid cursor.'})
+
+
+class MessageCenterFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(
+            email='staff@example.com', username='staff', name='Staff',
+            is_staff=True, is_superuser=True)
+        now = timezone.now()
+        cls.now = now
+        # Every source has rows at the same instants, so only the source rank
+        # and id order the rows within a timestamp.
+        for created_at in [now, now, now - timedelta(seconds=1), now - timedelta(days=2)]:
+            rows = [
+                QuoteRequest.objects.create(
+                    name='Customer', email_address='customer@example.com', project_name='Quote'),
+                Request.objects.create(
+                    name='Customer', email_address='customer@example.com', project_name='Project',
+                    you_are_a='New Customer', this_is_an='Estimate Request'),
+                Request.objects.create(
+                    name='Customer', email_address='customer@example.com', project_name='Project',
+                    you_are_a='New Customer', this_is_an='Order Request'),
+                ContactInquiry.objects.create(
+                    name='Customer', email_address='customer@example.com', questions='Questions'),
+            ]
+            for row in rows:
+                type(row).objects.filter(pk=row.pk).update(created_at=created_at)
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+
+    def get_expected(self, **filters):
+        rows = []
+        sources = [
+            ('Quote Request', QuoteRequest.objects.all()),
+            ('Estimate Request', Request.objects.filter(this_is_an='Estimate Request')),
+            ('General Contact', ContactInquiry.objects.all()),
+        ]
+        for rank, (title, queryset) in enumerate(sources):
+            rows += [(created_at, rank, id, title) for created_at, id
+                     in queryset.filter(**filters).values_list('created_at', 'id')]
+        rows.sort(reverse=True)
+        return [(title, id) for _, _, id, title in rows]
+
+    def page_through(self, url):
+        messages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            messages += [(message['title_and_tracking'], message['id'])
+                         for message in response.data['results']]
+            url = response.data['next']
+        return messages
+
+    def test_pages_are_ordered_by_created_at_source_and_id(self):
+        expected = self.get_expected()
+        self.assertEqual(len(expected), 12)
+
+        for page_size in range(1, 6):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.page_through(
+                    f'/api/v1/store/message-center/?page_size={page_size}'), expected)
+
+    def test_date_filters_apply_to_every_source(self):
+        start_date = (self.now - timedelta(days=1)).isoformat().replace('+00:00', 'Z')
+        expected = self.get_expected(created_at__gte=self.now - timedelta(days=1))
+        self.assertEqual(len(expected), 9)
+
+        self.assertEqual(self.page_through(
+            f'/api/v1/store/message-center/?page_size=2&start_date={start_date}'), expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/v1/store/message-center/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(
+            email='staff@example.com', username='staff', name='Staff',
+            is_staff=True, is_superuser=True)
+        customer = Customer.objects.create(
+            user=User.objects.create(
+                email='customer@example.com', username='customer', name='Customer'),
+            company='Customer Co')
+        catalog = Catalog.objects.create(title='Catalog')
+        cls.catalog_item = CatalogItem.objects.create(
+            title='Cards', catalog=catalog, item_sku='CARDS', description='Cards',
+            can_item_be_ordered=True, available_inventory=1000,
+            pricing_grid=[{'minimum_quantity': 1, 'unit_price': '10.00'},
+                          {'minimum_quantity': 100, 'unit_price': '8.00'}])
+        cls.cart = Cart.objects.create(customer=customer, item_count=1, total_price=10)
+        cls.cart_item = CartItem.objects.create(
+            cart=cls.cart, catalog_item=cls.catalog_item, quantity=1, unit_price=10, sub_total=10)
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+        self.item_url = f'/api/v1/store/carts/{self.cart.pk}/items/{self.cart_item.pk}/'
+
+    def test_patching_the_quantity_reprices_the_item_and_cart(self):
+        response = self.client.patch(self.item_url, {'quantity': 100}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.total_price), (1, Decimal('800.00')))
+
+    def test_patch_without_a_quantity_changes_nothing(self):
+        response = self.client.patch(self.item_url, {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.cart_item.refresh_from_db()
+        self.assertEqual((self.cart_item.quantity, self.cart_item.sub_total), (1, Decimal(10)))
+
+    def assertCartMatchesItsLines(self, total_price):
+        response = self.client.get(f'/api/v1/store/carts/{self.cart.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_price'], Decimal(total_price))
+        self.assertEqual(sum(item['sub_total'] for item in response.data['items']),
+                         Decimal(total_price))
+
+    def test_grid_changes_reprice_carts(self):
+        self.catalog_item.pricing_grid = [{'minimum_quantity': 1, 'unit_price': '12.00'}]
+        self.catalog_item.save()
+
+        self.assertCartMatchesItsLines('12.00')
+
+    def test_attribute_changes_reprice_carts(self):
+        attribute = Attribute.objects.create(
+            label='Rush', catalog_item=self.catalog_item, is_required=True,
+            price_modifier_scope=Attribute.PER_UNIT,
+            pricing_tiers=[{'minimum_quantity': 1, 'unit_price': '1.00'}])
+        self.assertCartMatchesItsLines('11.00')
+
+        attribute.delete()
+        self.assertCartMatchesItsLines('10.00')
+
+    def test_recompute_command_fixes_stale_prices(self):
+        CatalogItem.objects.filter(pk=self.catalog_item.pk).update(
+            pricing_grid=[{'minimum_quantity': 1, 'unit_price': '9.00'}], updated_at=timezone.now())
+
+        with self.assertRaises(CommandError):
+            call_command('recompute_cart_totals', '--check', stdout=StringIO())
+        call_command('recompute_cart_totals', stdout=StringIO())
+        call_command('recompute_cart_totals', '--check', stdout=StringIO())
+
+        self.assertCartMatchesItsLines('9.00')
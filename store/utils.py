@@ -1,4 +1,7 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Count, F, Q, Sum, Case, When, Value, Subquery, OuterRef, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
@@ -10,8 +13,10 @@ from rest_framework import status
 from cloudinary.uploader import upload
 from cloudinary.api import resource
 from cloudinary.exceptions import Error
-from .models import File, Cart, CatalogItem, CartItem
+from .models import File, Cart, CatalogItem, CartItem, Portal, PortalContent, PortalAccess, CustomerGroup, Order, OrderItem, Shipment, Transaction
 from django.http import HttpRequest
+from .pricing import get_pricing, price_cart, quote_item
+from .caching import PORTALS, bump_version
 
 def get_bulk_delete_serializer_class(model):
     class BulkDeleteSerializer(serializers.Serializer):
@@ -142,11 +147,144 @@ class CustomModelViewSet(ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+def rebuild_portal_access(portal_ids):
+    """
+    Recomputes the PortalAccess rows of the given portals with a fixed number of
+    set-based queries, regardless of how many contents or groups they have.
+    """
+    portal_ids = set(portal_ids)
+    if not portal_ids:
+        return
+
+    group_members = CustomerGroup.customers.through.objects
+    rows = set()
+
+    rows.update(
+        (customer_id, portal_id, None)
+        for portal_id, customer_id in Portal.customers.through.objects.filter(
+            portal_id__in=portal_ids).values_list('portal_id', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, None)
+        for portal_id, customer_id in group_members.filter(
+            customergroup__portals__in=portal_ids
+        ).values_list('customergroup__portals', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, content_id)
+        for content_id, portal_id, customer_id in PortalContent.customers.through.objects.filter(
+            portalcontent__portal_id__in=portal_ids
+        ).values_list('portalcontent_id', 'portalcontent__portal_id', 'customer_id')
+    )
+    rows.update(
+        (customer_id, portal_id, content_id)
+        for content_id, portal_id, customer_id in group_members.filter(
+            customergroup__accessible_contents__portal_id__in=portal_ids
+        ).values_list(
+            'customergroup__accessible_contents', 'customergroup__accessible_contents__portal_id', 'customer_id')
+    )
+
+    with transaction.atomic():
+        PortalAccess.objects.filter(portal_id__in=portal_ids).delete()
+        PortalAccess.objects.bulk_create([
+            PortalAccess(customer_id=customer_id, portal_id=portal_id,
+                         portal_content_id=content_id)
+            for customer_id, portal_id, content_id in rows
+        ], batch_size=1000)
+    bump_version(PORTALS)
+
+
+def get_portal_ids_for_groups(group_ids):
+    """Helper function to get the portals a set of customer groups grants access to."""
+    return set(Portal.objects.filter(customer_groups__in=group_ids).values_list('id', flat=True)) | set(
+        PortalContent.objects.filter(customer_groups__in=group_ids).values_list('portal_id', flat=True))
+
+
+MONEY_FIELD = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def _sum_subquery(queryset, group_field, expression):
+    """Helper function to sum an expression of related rows as a correlated subquery."""
+    total = queryset.values(group_field).annotate(
+        total=Sum(expression, output_field=MONEY_FIELD)
+    ).values('total')[:1]
+    return Coalesce(Subquery(total, output_field=MONEY_FIELD), Value(Decimal(0)), output_field=MONEY_FIELD)
+
+
+def _count_subquery(queryset, group_field, aggregate):
+    """Helper function to aggregate related rows into an integer as a correlated subquery."""
+    total = queryset.values(group_field).annotate(
+        total=aggregate).values('total')[:1]
+    return Coalesce(Subquery(total, output_field=models.IntegerField()), Value(0))
+
+
+def annotate_portal_counts(queryset, customer_id=None):
+    """
+    Annotates contents_count, customers_count, customer_groups_count and
+    number_of_cart_items on a Portal queryset, each in its own subquery, so
+    portals can be listed without loading their related rows. Cart items are
+    limited to the customer's cart when a customer_id is given.
+    """
+    portal = OuterRef('pk')
+    carts = Cart.objects.filter(portal=portal)
+    if customer_id:
+        carts = carts.filter(customer_id=customer_id)
+
+    return queryset.annotate(
+        contents_count=_count_subquery(
+            PortalContent.objects.filter(portal=portal), 'portal', Count('pk')),
+        customers_count=_count_subquery(
+            Portal.customers.through.objects.filter(portal=portal), 'portal', Count('pk')),
+        customer_groups_count=_count_subquery(
+            Portal.customer_groups.through.objects.filter(portal=portal), 'portal', Count('pk')),
+        number_of_cart_items=_count_subquery(
+            carts, 'portal', Sum('item_count')),
+    )
+
+
+def annotate_order_totals(queryset):
+    """
+    Annotates sub_total, tax, shipment_cost, total_paid, total_price and balance
+    on an Order queryset. Each related table is summed in its own subquery so the
+    items, shipments and transactions joins never multiply each other.
+    """
+    content_type = ContentType.objects.get_for_model(Order)
+    items = OrderItem.objects.filter(order=OuterRef('pk'))
+    shipments = Shipment.objects.filter(
+        content_type=content_type, object_id=OuterRef('pk'))
+    transactions = Transaction.objects.filter(
+        content_type=content_type, object_id=OuterRef('pk'))
+
+    return queryset.annotate(
+        sub_total=_sum_subquery(items, 'order', F('sub_total')),
+        tax=_sum_subquery(items, 'order', ExpressionWrapper(
+            F('sub_total') * F('tax') / Value(Decimal(100)), output_field=MONEY_FIELD)),
+        shipment_cost=_sum_subquery(
+            shipments, 'object_id', F('shipment_cost')),
+        total_paid=_sum_subquery(transactions, 'object_id', Case(
+            When(type=Transaction.PAYMENT, then=F('amount')),
+            default=-F('amount'),
+            output_field=MONEY_FIELD
+        )),
+    ).annotate(
+        total_price=ExpressionWrapper(
+            F('sub_total') + F('tax') + F('shipment_cost'), output_field=MONEY_FIELD),
+    ).annotate(
+        balance=ExpressionWrapper(
+            F('total_price') - F('total_paid'), output_field=MONEY_FIELD),
+    )
+
+
 def get_base_url(request: HttpRequest) -> str:
     scheme = request.scheme
     host = request.get_host()  
     return f"{scheme}://{host}"
 
+
+def get_expand(request):
+    """Helper function to read the comma separated relations requested with ?expand=."""
+    return {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+
 def validate_catalog_item_id(value):
         if not CatalogItem.objects.filter(pk=value).exists():
             raise serializers.ValidationError(
@@ -176,7 +314,7 @@ def validate_catalog(context, attrs, model_class, field_name, instance=None):
         raise serializers.ValidationError(
             "No pricing grid for this catalog item"
         )
-    if not any(entry["minimum_quantity"] == quantity for entry in pricing_grid):
+    if get_pricing(catalog_item).grid.exact(quantity) is None:
         raise serializers.ValidationError(
             {"quantity": "The quantity provided is not in the pricing grid."}
         )
@@ -187,11 +325,9 @@ def save_item(context, validated_data, model_class, field_name, old_instance):
     catalog_item = old_instance.catalog_item if old_instance else validated_data.get('catalog_item')
     quantity = validated_data['quantity']
 
-    pricing_grid = catalog_item.pricing_grid
-    item = next(
-        (entry for entry in pricing_grid if entry["minimum_quantity"] == quantity), None)
-    unit_price = item['unit_price']
-    sub_total = item['minimum_quantity'] * unit_price
+    quote = quote_item(catalog_item, quantity)
+    unit_price = quote.unit_price
+    sub_total = quote.sub_total
     validated_data['sub_total'] = sub_total
 
     if old_instance:
@@ -208,4 +344,47 @@ def save_item(context, validated_data, model_class, field_name, old_instance):
         unit_price=unit_price,
         **validated_data)
 
-    return instance
\ No newline at end of file
+    return instance
+
+
+def reprice_cart_items(cart_items):
+    """
+    Prices cart items against the current pricing of their catalog items and
+    returns the items whose stored unit_price or sub_total changed, updated in
+    memory but not saved. Items whose quantity left the pricing grid keep
+    their stored prices, as checkout does.
+    """
+    cart_items = list(cart_items)
+    quotes, _ = price_cart(cart_items)
+    changed = []
+    for item in cart_items:
+        quote = quotes[item.pk]
+        if quote and (quote.unit_price, quote.sub_total) != (item.unit_price, item.sub_total):
+            item.unit_price = quote.unit_price
+            item.sub_total = quote.sub_total
+            changed.append(item)
+    return changed
+
+
+def refresh_cart_totals(cart_ids):
+    """Recomputes the item_count and total_price of the given carts in one UPDATE."""
+    items = CartItem.objects.filter(cart=OuterRef('pk'))
+    Cart.objects.filter(pk__in=cart_ids).update(
+        item_count=_count_subquery(items, 'cart', Count('id')),
+        total_price=_sum_subquery(items, 'cart', 'sub_total'),
+    )
+
+
+def reprice_carts(catalog_items):
+    """
+    Re-prices the cart items of the given catalog items (a queryset) after a
+    price change and refreshes the totals of their carts, so carts keep
+    showing what checkout will charge.
+    """
+    changed = reprice_cart_items(CartItem.objects.filter(
+        catalog_item__in=catalog_items).select_related('catalog_item'))
+    if not changed:
+        return
+    CartItem.objects.bulk_update(
+        changed, ['unit_price', 'sub_total'], batch_size=500)
+    refresh_cart_totals({item.cart_id for item in changed})
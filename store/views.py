@@ -2,17 +2,18 @@ import csv
 import os
 import subprocess
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
 from django.shortcuts import render
 from django.db import models
 from django.shortcuts import get_object_or_404
 from django.utils.dateparse import parse_datetime
 from django.http import HttpResponse
-from django.template import Template, Context
 from django.views.decorators.csrf import csrf_exempt
 import io
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.filters import OrderingFilter
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, ValidationError, PermissionDenied
@@ -23,13 +24,19 @@ from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, CreateMode
 from .models import Cart, CartItem, CatalogItem, ContactInquiry, PortalContentCatalog, QuoteRequest, File, Customer, Request, FileTransfer, CustomerGroup, Portal, Order, OrderItem, Note, ContentType, BillingInfo, Shipment, Transaction, PortalContent, Catalog, TemplateField
 from .serializers import AddCartItemSerializer, CartItemSerializer, CartSerializer, CatalogItemSerializer, ContactInquirySerializer, CreateOrderSerializer, OrderSerializer, PortalContentCatalogSerializer, QuoteRequestSerializer, CreateQuoteRequestSerializer, FileSerializer, CreateCustomerSerializer, CustomerSerializer, CreateRequestSerializer, RequestSerializer, FileTransferSerializer, CreateFileTransferSerializer, UpdateCartItemSerializer, UpdateCustomerSerializer, UpdateOrderSerializer, User, CSVUploadSerializer, CustomerGroupSerializer, CreateCustomerGroupSerializer, PortalSerializer, customer_fields, CreateOrUpdateCatalogItemSerializer, NoteSerializer, BillingInfoSerializer, ShipmentSerializer, TransactionSerializer, CopyCatalogSerializer, CopyCatalogItemSerializer, CopyPortalSerializer, TemplateFieldSerializer, CreateTemplateFieldSerializer, BusinessCardSerializer
 from .permissions import FullDjangoModelPermissions, create_permission_class
-from .mixins import HandleImagesMixin
-from .utils import get_queryset_for_models_with_files, get_base_url
+from .mixins import ConditionalGetMixin, HandleImagesMixin
+from .utils import get_queryset_for_models_with_files, get_base_url, annotate_order_totals, annotate_portal_counts, get_expand
+from .filters import OrderFilter
+from .pagination import KeysetPagination
+from .feeds import FeedSource, get_feed_page
+from .rendering import RenderBusy, get_card_template, get_catalog_item_template, render_card
+from .caching import CATALOGS, INVENTORY, PAGES, PORTALS, get_cached_listing, get_listing_scopes
+from .copying import copy_catalog, copy_catalog_item, copy_portal
+from .tasks import import_customers_task, generate_order_proof_task
 from .utils import bulk_delete_objects, CustomModelViewSet
 from store import models
 from store import serializers
 import tempfile
-# import cairosvg
 # from selenium import webdriver
 # from selenium.webdriver.chrome.options import Options
 # from selenium import webdriver
@@ -58,72 +65,51 @@ class BusinessCardViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         validated_data = serializer.validated_data
-        name = validated_data["name"]
-        phone = validated_data["phone"]
-        email = validated_data["email"]
-        business_name = validated_data["business_name"]
         output_format = validated_data["format"]
 
         # Render the SVG template
-        template = Template(SVG_TEMPLATE)
-        context = Context({
-            "name": name,
-            "phone": phone,
-            "email": email,
-            "business_name": business_name,
-        })
-        svg_output = template.render(context)
-
-        # if output_format == "png":
-        #     try:
-        #         # Convert SVG string to a file-like object
-        #         svg_file = io.StringIO(svg_output)
-        #         # Convert SVG to ReportLab Graphics object
-        #         drawing = svg2rlg(svg_file)
-        #         # Create a bytes buffer for the PNG
-        #         png_buffer = io.BytesIO()
-        #         # Render the drawing as PNG to the buffer
-        #         renderPM.drawToFile(drawing, png_buffer, fmt="PNG")
-        #         # Get the PNG bytes
-        #         png_output = png_buffer.getvalue()
-        #         return HttpResponse(png_output, content_type="image/png")
-        #     except Exception as e:
-        #         return Response(
-        #             {"error": f"Failed to convert SVG to PNG: {str(e)}"},
-        #             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        #         )
-
-        # print(svg_output)
-        return HttpResponse(svg_output, content_type="image/svg+xml")
+        card_template = get_card_template(serializers.SVG_TEMPLATE, [
+            {"label": "name"},
+            {"label": "phone"},
+            {"label": "email"},
+            {"label": "business_name"},
+        ])
+
+        try:
+            output = render_card(card_template, validated_data, output_format)
+        except RenderBusy:
+            return Response({"error": "Too many cards are being rendered, please retry."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to convert SVG to PNG: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        content_type = "image/png" if output_format == "png" else "image/svg+xml"
+        return HttpResponse(output, content_type=content_type)
 
 
 @csrf_exempt  # Remove this if using CSRF tokens properly
 def generate_business_card(request, editable_item_id):
     editable_item = models.CatalogItem.objects.filter(
         pk=editable_item_id).first()
-
-    SVG_TEMPLATE = editable_item.front_svg_code or serializers.SVG_TEMPLATE
-    template_fields = editable_item.template_fields.all() or serializers.TEMPLATE_FIELDS
-
-    context_data = {}
-    for field in template_fields:
-        # Get the value from request.GET with a default empty string
-        field_value = request.GET.get(field.label, "")
-        context_data[field.label] = field_value or field.placeholder
-
+    if editable_item is None:
+        return HttpResponse(status=404)
+
+    card_template = get_catalog_item_template(
+        editable_item,
+        editable_item.front_svg_code or serializers.SVG_TEMPLATE,
+        serializers.TEMPLATE_FIELDS
+    )
     output_format = request.GET.get("format", "svg")
 
-    # Render the SVG template
-    template = Template(SVG_TEMPLATE)
-    context = Context(context_data)
-    svg_output = template.render(context)
-
     if output_format == "png":
         try:
-            # Convert SVG to PNG using CairoSVG
-            png_output = io.BytesIO()
-            cairosvg.svg2png(bytestring=svg_output.encode('utf-8'), write_to=png_output)
-            return HttpResponse(png_output.getvalue(), content_type="image/png")
+            png_output = render_card(card_template, request.GET, "png")
+            return HttpResponse(png_output, content_type="image/png")
+        except RenderBusy:
+            return HttpResponse(status=503)
         except Exception as e:
             print(f"SVG to PNG conversion error: {e}")
             return HttpResponse(
@@ -131,6 +117,7 @@ def generate_business_card(request, editable_item_id):
                 status=500
             )
 
+    svg_output = render_card(card_template, request.GET)
     return HttpResponse(svg_output, content_type="image/svg+xml")
 
 model_map = {
@@ -194,6 +181,7 @@ class CustomerCreationHandler:
 class ContactInquiryViewSet(CustomModelViewSet):
     queryset = ContactInquiry.objects.all()
     serializer_class = ContactInquirySerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -208,6 +196,7 @@ class ImageViewSet(ListModelMixin, GenericViewSet):
 
 class QuoteRequestViewSet(ModelViewSet, HandleImagesMixin):
     queryset = get_queryset_for_models_with_files(QuoteRequest)
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -223,6 +212,7 @@ class QuoteRequestViewSet(ModelViewSet, HandleImagesMixin):
 class RequestViewSet(CustomModelViewSet):
     queryset = get_queryset_for_models_with_files(
         Request).prefetch_related('transactions', 'shipments', 'notes__author').select_related('billing_info')
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -240,6 +230,7 @@ class RequestViewSet(CustomModelViewSet):
 class OnlineProofViewSet(ModelViewSet):
     queryset = get_queryset_for_models_with_files(models.OnlineProof)
     permission_classes = [create_permission_class('store.online_proofing')]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -250,6 +241,7 @@ class OnlineProofViewSet(ModelViewSet):
 class FileTransferViewSet(CustomModelViewSet):
     queryset = get_queryset_for_models_with_files(FileTransfer).prefetch_related(
         'transactions', 'shipments', 'notes__author').select_related('billing_info')
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -266,12 +258,15 @@ class FileTransferViewSet(CustomModelViewSet):
 
 class CustomerViewSet(CustomModelViewSet):
     queryset = Customer.objects.select_related(
-        'user').prefetch_related('groups').all()
+        'user').prefetch_related('groups').annotate(groups_count=Count('groups'))
     permission_classes = [WebsiteUsersPermissions]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'bulk_upload':
             return CSVUploadSerializer
+        elif self.action == 'bulk_upload_status':
+            return serializers.CustomerImportJobSerializer
         elif self.request.method == "POST":
             return CreateCustomerSerializer
         elif self.request.method in ["PUT", "PATCH"]:
@@ -279,13 +274,9 @@ class CustomerViewSet(CustomModelViewSet):
         return CustomerSerializer
 
     @action(detail=False, methods=['post'], url_path='bulk-upload', url_name='bulk_upload')
-    @transaction.atomic()
     def bulk_upload(self, request):
         """
-        Handles bulk upload of data from a CSV file.
-
-        This method accepts a file upload through a POST request and processes it as a CSV.
-        Each row in the CSV is read and converted to a dictionary format using `csv.DictReader`.
+        Starts a background import of customers from a CSV file.
 
         Expects:
             - The uploaded file to be in CSV format with UTF-8 encoding.
@@ -294,7 +285,8 @@ class CustomerViewSet(CustomModelViewSet):
         Returns:
             - HTTP 400 response with an error message if the file is missing, is not a CSV, 
             or there is a CSV parsing error.
-            - HTTP 200 response indicating success once the file is processed.
+            - HTTP 202 response with the import job, whose progress and per-row errors
+            can be followed at bulk-upload/<job_id>/.
         """
 
         serializer = CSVUploadSerializer(data=request.data)
@@ -302,50 +294,25 @@ class CustomerViewSet(CustomModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         csv_content = serializer.validated_data['file']
-        has_header = serializer.validated_data['has_header']
-        columns = ['name', 'email', 'password',
-                   'username', 'is_active'] + customer_fields[1:]
-
-        try:
-            csv_reader = csv.DictReader(csv_content.splitlines(
-            ), fieldnames=columns if not has_header else None)
-            rows = list(csv_reader)
-        except csv.Error as e:
-            return Response({"error": f"CSV parsing error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if not rows:
+        if not csv_content.strip():
             return Response({"error": "The uploaded file contains no data."}, status=status.HTTP_400_BAD_REQUEST)
 
-        errors = []
-        customer_count = 0
-
-        for row in rows:
-            serializer = CreateCustomerSerializer(data=row)
-            if serializer.is_valid():
-                user = User(email=row['email'], username=row['username'])
-                user.set_password(row['password'])
-                user.name = row['name']
-                user.save()
-
-                customer_data = {**row}
-                customer_data.pop('name', None)
-                customer_data.pop('email', None)
-                customer_data.pop('password', None)
-
-                customer_data['pay_tax'] = row.get(
-                    'pay_tax', 'FALSE') == 'TRUE'
-                customer_data['is_active'] = row.get(
-                    'is_active', 'FALSE') == 'TRUE'
-
-                Customer.objects.create(user=user, **customer_data)
-                customer_count += 1
-            else:
-                errors.append({**serializer.errors, "row": row})
+        job = models.CustomerImportJob.objects.create(
+            file_content=csv_content,
+            has_header=serializer.validated_data['has_header'],
+            created_by=request.user
+        )
+        transaction.on_commit(lambda: import_customers_task.delay(job.id))
 
-        if errors:
-            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializers.CustomerImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-        return Response({"success": f"{customer_count} customers created successfully."}, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=['get'], url_path=r'bulk-upload/(?P<job_id>\d+)', url_name='bulk_upload_status')
+    def bulk_upload_status(self, request, job_id=None):
+        """
+        Returns the progress of a customer import and the errors of every rejected row.
+        """
+        job = get_object_or_404(models.CustomerImportJob, pk=job_id)
+        return Response(serializers.CustomerImportJobSerializer(job).data)
 
     @action(detail=False, methods=["GET", "PUT"], permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -368,9 +335,30 @@ class CustomerViewSet(CustomModelViewSet):
 
 
 class CustomerGroupViewSet(CustomModelViewSet):
-    queryset = CustomerGroup.objects.prefetch_related('customers').all()
+    """
+    Customer groups with their member counts. Member lists are included on
+    the detail route, and on the list with ?expand=customers.
+    """
     permission_classes = [WebsiteUsersPermissions]
 
+    def get_expand(self):
+        if self.action == 'retrieve':
+            return {'customers'}
+        return get_expand(self.request)
+
+    def get_queryset(self):
+        queryset = CustomerGroup.objects.annotate(
+            members_count=Count('customers'))
+        if 'customers' in self.get_expand():
+            queryset = queryset.prefetch_related(Prefetch(
+                'customers', queryset=Customer.objects.select_related('user')))
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
     def get_serializer_class(self):
         if self.request.method == "GET":
             return CustomerGroupSerializer
@@ -379,33 +367,54 @@ class CustomerGroupViewSet(CustomModelViewSet):
         return CreateCustomerGroupSerializer
 
 
-class PortalViewSet(CustomModelViewSet):
+class PortalViewSet(ConditionalGetMixin, CustomModelViewSet):
+    conditional_scopes = (PORTALS, CATALOGS)
+
     def get_permissions(self):
         if self.request.method == 'GET':
             return [IsAuthenticated()]
         return [create_permission_class('portals')()]
 
+    # Relations that can be requested with ?expand= on the list, and the
+    # prefetches each one needs. The detail route always includes them all.
+    expandable_prefetches = {
+        'contents': ['contents__customer_groups__customers__user', 'contents__customers__user',
+                     'contents__catalogs', 'customers', 'customer_groups__customers'],
+        'customers': ['customers__user'],
+        'customer_groups': ['customer_groups__customers__user'],
+        'carts': ['cart_set'],
+    }
+
+    def get_expand(self):
+        if self.action != 'list':
+            return set(self.expandable_prefetches)
+        return get_expand(self.request) & set(self.expandable_prefetches)
+
     def get_queryset(self):
-        prefetch_array = [
-            'contents__customer_groups__customers__user', 'contents__customers__user',
-            'contents__catalogs', 'cart_set__items',
-            'customers__user', 'customer_groups__customers__user'
-        ]
+        expand = self.get_expand()
+        prefetch_array = [lookup for name in expand
+                          for lookup in self.expandable_prefetches[name]]
 
         user = self.request.user
         if user.is_staff:
-            return Portal.objects.prefetch_related(*prefetch_array).all()
+            queryset = Portal.objects.all()
         else:
             try:
                 customer = Customer.objects.get(user=user)
                 self.request.customer = customer
-                return Portal.objects.prefetch_related(*prefetch_array).filter(
-                    Q(customers=customer) | Q(
-                        customer_groups__customers=customer)
-                ).distinct()
+                queryset = Portal.objects.filter(
+                    id__in=models.PortalAccess.objects.filter(
+                        customer=customer, portal_content__isnull=True
+                    ).values('portal_id')
+                )
             except Customer.DoesNotExist:
                 return Portal.objects.none()
 
+        if self.action == 'list' and not expand:
+            customer = getattr(self.request, 'customer', None)
+            return annotate_portal_counts(queryset, customer.id if customer else None)
+        return queryset.prefetch_related(*prefetch_array)
+
     def get_permissions(self):
         if self.request.method == 'POST':
             return [PortalPermissions()]
@@ -414,6 +423,8 @@ class PortalViewSet(CustomModelViewSet):
     def get_serializer_class(self):
         if self.action == 'copy':
             return CopyPortalSerializer
+        if self.action == 'list' and not self.get_expand():
+            return serializers.PortalSummarySerializer
         if self.request.method == 'PATCH':
             return serializers.PatchPortalSerializer
         if self.request.method == 'POST':
@@ -423,8 +434,16 @@ class PortalViewSet(CustomModelViewSet):
     def get_serializer_context(self):
         customer_id = self.request.customer.id if hasattr(
             self.request, 'customer') else None
+        accessible_content_ids = set(models.PortalAccess.objects.filter(
+            customer_id=customer_id, portal_content__isnull=False
+        ).values_list('portal_content_id', flat=True)) if customer_id else set()
 
-        return {'request': self.request, 'customer_id': customer_id}
+        return {
+            'request': self.request,
+            'customer_id': customer_id,
+            'accessible_content_ids': accessible_content_ids,
+            'expand': self.get_expand(),
+        }
 
     # def list(self, request, *args, **kwargs):
     #     queryset = self.filter_queryset(self.get_queryset())
@@ -457,67 +476,21 @@ class PortalViewSet(CustomModelViewSet):
         serializer = serializers.CopyPortalSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        ['id', 'title', 'logo',
-         'same_permissions', 'copy_the_logo', 'same_catalogs', 'same_proofing_categories',
-         'customers', 'customer_groups', 'catalog',
-         ]
-
-        new_title = serializer.validated_data['title']
-        copy_the_logo = serializer.validated_data['copy_the_logo']
-        same_permissions = serializer.validated_data['same_permissions']
-        same_catalogs = serializer.validated_data['same_catalogs']
-        same_proofing_categories = serializer.validated_data['same_proofing_categories']
-        logo = serializer.validated_data.get('logo')
-        catalog = serializer.validated_data.get('new_catalog')
-        new_proofing_category_name = serializer.validated_data.get(
-            'new_proofing_category')
-        customers = serializer.validated_data.get('customers')
-        customer_groups = serializer.validated_data.get('customer_groups')
-
-        # Create a new portal
-        new_portal = Portal.objects.create(
-            title=new_title,
-            logo=portal.logo if copy_the_logo else logo,
-            copy_from_portal_id=portal.id
+        data = serializer.validated_data
+        customers = data.get('customers')
+        new_portal = copy_portal(
+            portal,
+            title=data['title'],
+            logo=portal.logo if data['copy_the_logo'] else data.get('logo'),
+            customers=customers,
+            customer_groups=data.get('customer_groups'),
+            same_permissions=data['same_permissions'],
+            same_catalogs=data['same_catalogs'],
+            catalog_title=data.get('catalog'),
         )
 
-        if same_permissions:
-            new_portal.customers.set(portal.customers.all())
-            new_portal.customer_groups.set(portal.customer_groups.all())
-        elif customers:
-            new_portal.customers.set(customers)
-        elif customer_groups:
-            new_portal.customer_groups.set(customer_groups)
-
         serializers._implement_permission_change(
-            serializer, new_portal, customers)
-
-        for content in portal.contents.all():
-            new_content = PortalContent.objects.create(
-                portal=new_portal,
-                title=content.title,
-                content=content.content,
-                page=content.page,
-                everyone=content.everyone,
-                display_in_site_navigation=content.display_in_site_navigation,
-                include_in_site_map=content.include_in_site_map,
-                page_redirect=content.page_redirect,
-                location=content.location,
-                logo=content.logo,
-                payment_proof=content.payment_proof,
-                order_history=content.order_history
-            )
-
-            if same_catalogs:
-                new_content.catalogs.set(content.catalogs.all())
-            else:
-                if catalog:
-                    Catalog.objects.create(title=catalog)
-                    # new_content.catalogs.add(new_catalog)
-
-            if same_proofing_categories:
-                # Implement logic to copy proofing categories if needed
-                pass
+            data, new_portal, customers)
 
         response_serializer = self.get_serializer(new_portal)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -541,7 +514,9 @@ class PortalContentViewSet(CustomModelViewSet):
         portal_id = self.kwargs.get('portal_pk')
         if not portal_id.isdigit():
             raise ValidationError("portal_pk must be an integer.")
-        return models.PortalContent.objects.filter(portal_id=portal_id).select_related('page', 'portal').prefetch_related('customers__user', 'customer_groups__customers__user', 'catalogs', 'content__catalogs')
+        return models.PortalContent.objects.filter(portal_id=portal_id).select_related('page', 'portal').prefetch_related(
+            'customers__user', 'customer_groups__customers__user', 'catalogs', 'content__catalogs',
+            'portal__customers', 'portal__customer_groups__customers')
 
     def get_serializer_context(self):
         portal_id = self.kwargs.get('portal_pk')
@@ -585,9 +560,10 @@ class PortalContentCatalogViewSet(ModelViewSet):
         serializer.save()
 
 
-class HTMLFileViewSet(CustomModelViewSet):
+class HTMLFileViewSet(ConditionalGetMixin, CustomModelViewSet):
     queryset = models.Page.objects.all()
     serializer_class = serializers.PageSerializer
+    conditional_scopes = (PAGES,)
 
 def validate_client_timezone(request):
     """
@@ -617,8 +593,15 @@ def validate_client_timezone(request):
         return client_timezone
     return None
 
-class CatalogViewSet(CustomModelViewSet):
+class CatalogViewSet(ConditionalGetMixin, CustomModelViewSet):
     queryset = models.Catalog.objects.all()
+    conditional_scopes = (CATALOGS,)
+    conditional_actions = ('list', 'retrieve', 'favorites')
+
+    def get_conditional_scopes(self):
+        if self.action == 'favorites':
+            return get_listing_scopes('catalog', self.kwargs['pk'])
+        return self.conditional_scopes
 
     def get_serializer_class(self):
         if self.action == 'copy':
@@ -632,38 +615,20 @@ class CatalogViewSet(CustomModelViewSet):
     @action(detail=True, methods=['post'])
     def copy(self, request, pk=None):
         """
-        Copy a catalog with a new title and optionally its items.
+        Copy a catalog with a new title and optionally its items. Large
+        catalogs have their items copied in the background and return 202.
         """
-        print(request.data)
         catalog = self.get_object()
         serializer = CopyCatalogSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        new_title = serializer.validated_data['title']
-        copy_items = serializer.validated_data['copy_items']
-        print(copy_items)
-
-        # Create a new catalog with the provided title
-        new_catalog = models.Catalog.objects.create(
-            title=new_title,
-            parent_catalog=catalog.parent_catalog,
-            specify_low_inventory_message=catalog.specify_low_inventory_message,
-            recipient_emails=catalog.recipient_emails,
-            subject=catalog.subject,
-            message_text=catalog.message_text,
-            description=catalog.description,
-            display_items_on_same_page=catalog.display_items_on_same_page
-        )
-
-        # Optionally copy catalog items
-        if copy_items:
-            for item in catalog.catalog_items.all():
-                item.pk = None  # Reset primary key to create a new object
-                item.catalog = new_catalog
-                item.save()
+        new_catalog, copying_items = copy_catalog(
+            catalog, serializer.validated_data['title'], serializer.validated_data['copy_items'])
 
         response_serializer = self.get_serializer(new_catalog)
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            response_serializer.data,
+            status=status.HTTP_202_ACCEPTED if copying_items else status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
     def favorites(self, request, pk=None):
@@ -671,8 +636,8 @@ class CatalogViewSet(CustomModelViewSet):
         Retrieve all favorite items in the catalog.
         """
         catalog = self.get_object()
-        favorite_items = catalog.catalog_items.filter(
-            is_favorite=True)  # Assuming there's an 'is_favorite' field
+        favorite_items = catalog.catalog_items.filter(is_favorite=True).prefetch_related(
+            'attributes__options', 'template_fields').select_related('catalog')
 
         response_serializer = serializers.CatalogItemSerializer(
             favorite_items, many=True)
@@ -693,206 +658,45 @@ class MessageCenterViewSet(ModelViewSet):
 
 class MessageCenterView(APIView):
     permission_classes = [create_permission_class('store.message_center')]
+    sources = [
+        FeedSource(QuoteRequest, 'Quote Request', '/quote-requests/'),
+        FeedSource(Request, 'Estimate Request', '/requests/',
+                   filters=Q(this_is_an='Estimate Request')),
+        FeedSource(ContactInquiry, 'General Contact',
+                   '/contact-us/', has_files=False),
+    ]
 
     def get(self, request):
-        base_url = get_base_url(request)
-        messages = []
-
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        date_filter = Q()
-        if start_date:
-            start_date = parse_datetime(start_date)
-            date_filter &= Q(created_at__gte=start_date)
-        if end_date:
-            end_date = parse_datetime(end_date)
-            date_filter &= Q(created_at__lte=end_date)
-
-        online_file_transfers = get_queryset_for_models_with_files(
-            FileTransfer).filter(date_filter)
-        online_orders = get_queryset_for_models_with_files(
-            Request).filter(date_filter)
-        general_contacts = ContactInquiry.objects.filter(date_filter)
-        online_requests = get_queryset_for_models_with_files(
-            QuoteRequest).filter(date_filter)
-        online_payments = models.OnlinePayment.objects.filter(date_filter)
-        online_proofs = models.OnlineProof.objects.filter(date_filter)
-        file_transfers = models.FileExchange.objects.filter(date_filter)
-
-        def calculate_file_size(instance):
-            file_size_in_bytes = sum(
-                [file.file_size for file in instance.files.all() if file.file_size]) if not isinstance(instance, models.FileExchange) else instance.file_size
-
-            if not file_size_in_bytes:
-                return '0KB'
-            if file_size_in_bytes >= 1024 * 1024:
-                return f"{file_size_in_bytes / (1024 * 1024):.2f} MB"
-            return f"{file_size_in_bytes / 1024:.2f} KB"
-
-        def create_message(instance, title, attachments='n/a', route=''):
-            files = []
-            if hasattr(instance, 'files') and instance.files.exists():
-                files = [
-                    file.path.url if file else '' for file in instance.files.all()]
-            elif hasattr(instance, 'file'):
-                file = instance.file.url
-                url = f'{base_url}{file}'
-                files = [url]
-
-            return {
-                'id': instance.id,
-                'Date': instance.created_at,
-                'title_and_tracking': title,
-                'From': instance.name,
-                'Email': instance.email_address,
-                'Attachments': attachments,
-                'Path': f'{base_url}/api/v1/store{route}{instance.id}',
-                "Files": files
-            }
-
-        # for online_proof in file_transfers:
-        #     messages.append(create_message(
-        #         online_proof,
-        #         'File Transfer',
-        #         calculate_file_size(online_proof)
-        #     ))
-
-        # for online_proof in online_proofs:
-        #     messages.append(create_message(
-        #         online_proof,
-        #         'Online Proof',
-        #         calculate_file_size(online_proof)
-        #     ))
-
-        for online_request in online_requests:
-            messages.append(create_message(
-                online_request,
-                'Quote Request',
-                calculate_file_size(online_request),
-                route='/quote-requests/'
-            ))
-
-        # Online orders
-        for online_order in online_orders:
-            if online_order.this_is_an == 'Estimate Request':
-                messages.append(create_message(
-                    online_order,
-                    'Estimate Request',
-                    calculate_file_size(online_order),
-                    route='/requests/'
-                ))
-
-        # General contacts
-        for general_contact in general_contacts:
-            messages.append(create_message(
-                general_contact,
-                'General Contact',
-                route='/contact-us/'
-            ))
-
-        # for online_payment in online_payments:
-        #     messages.append(create_message(
-        #         online_payment,
-        #         'Online Payment',
-        #     ))
-
-        messages.sort(key=lambda x: x['Date'], reverse=True)
-
-        return Response(messages)
+        return Response(get_feed_page(request, self.sources))
 
 
 class OrderView(APIView):
     permission_classes = [OrderPermissions]
+    sources = [
+        FeedSource(FileTransfer, 'Design-Ready Order', '/file-transfers/'),
+        FeedSource(Request, 'New Design Order', '/requests/',
+                   filters=Q(this_is_an='Order Request')),
+        FeedSource(Order, 'Portal order', '/orders/'),
+    ]
 
     def get(self, request):
-        base_url = get_base_url(request)
-        messages = []
-
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        date_filter = Q()
-        if start_date:
-            start_date = parse_datetime(start_date)
-            date_filter &= Q(created_at__gte=start_date)
-        if end_date:
-            end_date = parse_datetime(end_date)
-            date_filter &= Q(created_at__lte=end_date)
-
-        online_file_transfers = get_queryset_for_models_with_files(
-            FileTransfer).filter(date_filter)
-        online_orders = get_queryset_for_models_with_files(
-            Request).filter(date_filter)
-        orders = get_queryset_for_models_with_files(Order).filter(date_filter)
-
-        def calculate_file_size(instance):
-            file_size_in_bytes = sum(
-                [file.file_size for file in instance.files.all() if file.file_size]) if not isinstance(instance, models.FileExchange) else instance.file_size
-
-            if not file_size_in_bytes:
-                return '0KB'
-            if file_size_in_bytes >= 1024 * 1024:
-                return f"{file_size_in_bytes / (1024 * 1024):.2f} MB"
-            return f"{file_size_in_bytes / 1024:.2f} KB"
-
-        def create_message(instance, title, attachments='n/a', route=''):
-            files = []
-            if hasattr(instance, 'files') and instance.files.exists():
-                files = [
-                    file.path.url if file else '' for file in instance.files.all()]
-            elif hasattr(instance, 'file'):
-                file = instance.file.url
-                url = f'{base_url}{file}'
-                files = [url]
-
-            return {
-                'id': instance.id,
-                'Date': instance.created_at,
-                'title_and_tracking': title,
-                'From': instance.name,
-                'Email': instance.email_address,
-                'Attachments': attachments,
-                'Path': f'{base_url}/api/v1/store{route}{instance.id}',
-                'Status': instance.status,
-                "Files": files
-            }
-
-        # File transfers
-        for online_proof in online_file_transfers:
-            messages.append(create_message(
-                online_proof,
-                'Design-Ready Order',
-                calculate_file_size(online_proof),
-                route='/file-transfers/'
-            ))
-
-        for order in online_orders:
-            if order.this_is_an == 'Order Request':
-                messages.append(create_message(
-                    order,
-                    'New Design Order',
-                    calculate_file_size(order),
-                    route='/requests/'
-                ))
-
-        for order in orders:
-            messages.append(create_message(
-                order,
-                'Portal order',
-                calculate_file_size(order),
-                route='/orders/'
-            ))
-
-        messages.sort(key=lambda x: x['Date'], reverse=True)
-
-        return Response(messages)
-
-
-class CatalogItemViewSet(ModelViewSet):
+        return Response(get_feed_page(request, self.sources, include_status=True))
+
+
+class CatalogItemViewSet(ConditionalGetMixin, ModelViewSet):
     """
     A viewset for viewing and editing catalog items.
     """
+    conditional_scopes = (CATALOGS, INVENTORY)
+    conditional_actions = ('list', 'retrieve', 'get_catalog_items_for_portal')
+
+    def get_conditional_scopes(self):
+        portal_id = self.request.query_params.get('portal_id')
+        if self.action == 'get_catalog_items_for_portal' and portal_id:
+            return get_listing_scopes('portal', portal_id)
+        if self.kwargs.get('catalog_pk'):
+            return get_listing_scopes('catalog', self.kwargs['catalog_pk'])
+        return self.conditional_scopes
 
     def get_permissions(self):
         catalog_id = self.kwargs.get('catalog_pk')
@@ -909,8 +713,8 @@ class CatalogItemViewSet(ModelViewSet):
 
     def get_queryset(self):
         catalog_id = self.kwargs.get('catalog_pk')
-        queryset = CatalogItem.objects.filter(
-            status=CatalogItem.COMPLETED).prefetch_related('attributes__options')
+        queryset = CatalogItem.objects.filter(status=CatalogItem.COMPLETED).prefetch_related(
+            'attributes__options', 'template_fields').select_related('catalog')
         if catalog_id:
             queryset = queryset.filter(catalog_id=catalog_id)
         return queryset
@@ -923,6 +727,19 @@ class CatalogItemViewSet(ModelViewSet):
         
         return context
 
+    def list(self, request, *args, **kwargs):
+        """
+        Serves the items of a catalog from the listing cache.
+        """
+        catalog_id = self.kwargs.get('catalog_pk')
+        if not catalog_id:
+            return super().list(request, *args, **kwargs)
+
+        validate_client_timezone(request)
+        payload = get_cached_listing('catalog', catalog_id, lambda: self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True).data)
+        return Response(payload)
+
     def create(self, request, *args, **kwargs):
         """
         Override create to handle nested attributes.
@@ -946,7 +763,7 @@ class CatalogItemViewSet(ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='get-catalog-items-for-portal')
-    def get_catalog_items_for_portal(self, request):
+    def get_catalog_items_for_portal(self, request, catalog_pk=None):
         """
         Returns all catalog items associated with the portal.
         """
@@ -954,14 +771,14 @@ class CatalogItemViewSet(ModelViewSet):
         if not portal_id:
             return Response({'detail': 'Portal ID query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = CatalogItem.objects.filter(
-            catalog__portal_contents__portal_id=portal_id, status=CatalogItem.COMPLETED
-        ).prefetch_related('attributes__options').select_related('catalog')
+        def build():
+            queryset = CatalogItem.objects.filter(
+                catalog__portal_contents__portal_id=portal_id, status=CatalogItem.COMPLETED
+            ).prefetch_related('attributes__options', 'template_fields').select_related('catalog')
+            return CatalogItemSerializer(queryset, many=True).data
 
-        serializer = CatalogItemSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(get_cached_listing('portal', portal_id, build))
 
-    @transaction.atomic()
     @action(detail=True, methods=['post'])
     def copy(self, request, pk=None, catalog_pk=None):
         """
@@ -971,42 +788,20 @@ class CatalogItemViewSet(ModelViewSet):
         serializer = CopyCatalogItemSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        new_title = serializer.validated_data['title']
-        catalog = serializer.validated_data['catalog']
-
-        # Create a new catalog item with the provided title and parent catalog
-        new_catalog_item = CatalogItem.objects.create(
-            title=new_title,
-            catalog=catalog,
-            item_sku=catalog_item.item_sku,
-            description=catalog_item.description,
-            short_description=catalog_item.short_description,
-            default_quantity=catalog_item.default_quantity,
-            pricing_grid=catalog_item.pricing_grid,
-            thumbnail=catalog_item.thumbnail,
-            preview_image=catalog_item.preview_image,
-            preview_file=catalog_item.preview_file,
-            available_inventory=catalog_item.available_inventory,
-            minimum_inventory=catalog_item.minimum_inventory,
-            track_inventory_automatically=catalog_item.track_inventory_automatically,
-            restrict_orders_to_inventory=catalog_item.restrict_orders_to_inventory,
-            weight_per_piece_lb=catalog_item.weight_per_piece_lb,
-            weight_per_piece_oz=catalog_item.weight_per_piece_oz,
-            exempt_from_shipping_charges=catalog_item.exempt_from_shipping_charges,
-            is_this_item_taxable=catalog_item.is_this_item_taxable,
-            can_item_be_ordered=catalog_item.can_item_be_ordered,
-            details_page_per_layout=catalog_item.details_page_per_layout,
-        )
-
-        new_catalog_item.attributes.set(catalog_item.attributes.all())
+        new_catalog_item = copy_catalog_item(
+            catalog_item, serializer.validated_data['title'], serializer.validated_data['catalog'])
 
         response_serializer = self.get_serializer(new_catalog_item)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 
+CART_PREFETCHES = ['items__catalog_item__catalog',
+                   'items__catalog_item__attributes__options', 'items__details']
+
+
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     queryset = Cart.objects.select_related(
-        "customer__user").prefetch_related("items__catalog_item").all()
+        "customer__user").prefetch_related(*CART_PREFETCHES).all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
@@ -1046,7 +841,7 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
                 raise NotFound(f"No Customer found with id {user.id}.")
 
         cart = Cart.objects.prefetch_related(
-            "items__catalog_item").filter(customer_id=customer_id, portal_id=portal_id).first()
+            *CART_PREFETCHES).filter(customer_id=customer_id, portal_id=portal_id).first()
         if not cart:
             raise NotFound(
                 f"No cart found for customer with id {customer_id}.")
@@ -1072,7 +867,7 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
                 raise NotFound(f"No Customer found with id {user.id}.")
 
         cart = Cart.objects.prefetch_related(
-            "items__catalog_item").filter(customer_id=customer_id)
+            *CART_PREFETCHES).filter(customer_id=customer_id)
 
         serializer = self.get_serializer(cart, many=True)
         return Response(serializer.data)
@@ -1090,17 +885,39 @@ class CartItemViewSet(ModelViewSet):
 
     def get_queryset(self):
         cart_id = self.kwargs.get('cart_pk')
-        return CartItem.objects.filter(cart_id=cart_id).select_related("catalog_item", 'details')
+        return CartItem.objects.filter(cart_id=cart_id).select_related("catalog_item__catalog", 'details')
 
     def get_serializer_context(self):
         cart_id = self.kwargs.get('cart_pk')
         return {"cart_id": cart_id, 'user_id': self.request.user.id}
 
+    @transaction.atomic()
+    def perform_create(self, serializer):
+        cart_item = serializer.save()
+        Cart.adjust_totals(cart_item.cart_id, 1, cart_item.sub_total)
+
+    @transaction.atomic()
+    def perform_update(self, serializer):
+        old_sub_total = serializer.instance.sub_total
+        cart_item = serializer.save()
+        Cart.adjust_totals(cart_item.cart_id, 0,
+                           cart_item.sub_total - old_sub_total)
+
+    @transaction.atomic()
+    def perform_destroy(self, instance):
+        Cart.adjust_totals(instance.cart_id, -1, -instance.sub_total)
+        instance.delete()
+
 
 class OrderViewSet(ModelViewSet):
     http_method_names = ['get', 'patch', 'delete', 'post', 'head', 'options']
-    prefetch_related = ['items__catalog_item__catalog',
+    prefetch_related = ['items__catalog_item__catalog', 'items__details',
                         'notes__author', 'shipments', 'billing_info', 'transactions']
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = OrderFilter
+    ordering_fields = ['placed_at', 'sub_total',
+                       'total_price', 'total_paid', 'balance']
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method in ['PATCH', 'DELETE']:
@@ -1136,14 +953,26 @@ class OrderViewSet(ModelViewSet):
         if not hasattr(self, 'customer'):
             self.get_customer()
 
-        queryset = get_queryset_for_models_with_files(Order)\
-            .select_related('customer__user')\
+        queryset = annotate_order_totals(
+            get_queryset_for_models_with_files(Order)
+            .select_related('customer__user')
             .prefetch_related(*self.prefetch_related)
+        )
 
         if user.is_staff:
             return queryset
         return queryset.filter(customer=self.customer)
 
+    @action(detail=True, methods=['post'], url_path='proof-pdf', permission_classes=[IsAdminUser])
+    def proof_pdf(self, request, pk=None):
+        """
+        Starts building one print-ready PDF of every editable item in the order.
+        The file is available as proof_pdf on the order once it is done.
+        """
+        order = self.get_object()
+        generate_order_proof_task.delay(order.id)
+        return Response({"detail": "Proof generation started."}, status=status.HTTP_202_ACCEPTED)
+
 
 class OrderItemViewSet(ModelViewSet):
     # http_method_names = ['get', 'post', 'patch', 'delete']
@@ -1158,7 +987,7 @@ class OrderItemViewSet(ModelViewSet):
 
     def get_queryset(self):
         order_id = self.kwargs.get('order_pk')
-        return OrderItem.objects.filter(order_id=order_id).select_related('catalog_item__catalog')
+        return OrderItem.objects.filter(order_id=order_id).select_related('catalog_item__catalog', 'details')
 
     def get_serializer_context(self):
         order_id = self.kwargs.get('order_pk')
@@ -1171,6 +1000,7 @@ class OnlinePaymentViewSet(ModelViewSet):
     serializer_class = serializers.OnlinePaymentSerializer
     queryset = models.OnlinePayment.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_customer(self):
         try:
@@ -1201,6 +1031,7 @@ class FileExchangeViewSet(ModelViewSet):
     queryset = models.FileExchange.objects.all()
     serializer_class = serializers.FileExchangeSerializer
     permission_classes = [CanTransferFiles]
+    pagination_class = KeysetPagination
 
     def get_serializer_context(self):
         return {'request': self.request}
@@ -1215,7 +1046,7 @@ class NoteViewSet(ModelViewSet):
         return serializers.CreateNoteSerializer
 
     def get_queryset(self):
-        return get_queryset_for_content_types(self.kwargs, Note)
+        return get_queryset_for_content_types(self.kwargs, Note).select_related('author')
 
     def perform_create(self, serializer):
         content_type, object_id = get_content_type_and_id(self.kwargs)
@@ -1250,7 +1081,7 @@ class BillingInfoViewSet(ModelViewSet):
         if request_id:
             return BillingInfo.objects.filter(requests__id=request_id)
         elif file_transfer_id:
-            return BillingInfo.objects.filter(file_transfers__id=file_transfer_id)
+            return BillingInfo.objects.filter(filetransfer__id=file_transfer_id)
         return BillingInfo.objects.none()
 
 
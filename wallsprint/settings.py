@@ -70,6 +70,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -182,7 +183,7 @@ AUTH_USER_MODEL = "core.User"
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -278,6 +279,10 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        'store.filecache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
 }
 
@@ -294,6 +299,31 @@ SWAGGER_SETTINGS = {
     },
 }
 
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Shared by every process when REDIS_URL is set (token blacklist, caches);
+# otherwise each process falls back to its own local memory cache, and the
+# versioned listing caches and ETags of the store app are turned off.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Local copies of Cloudinary-hosted proof PDFs, evicted least recently used first.
+ATTACHMENT_CACHE_DIR = os.getenv(
+    'ATTACHMENT_CACHE_DIR', os.path.join(BASE_DIR, 'attachment_cache'))
+ATTACHMENT_CACHE_MAX_BYTES = int(
+    os.getenv('ATTACHMENT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_BROKER_URL')
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
@@ -301,9 +331,13 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 CELERY_BEAT_SCHEDULE = {
     'delete-expired-tokens': {
-        'task': 'core.tasks.delete_expired_tokens',
+        'task': 'core.tasks.delete_expired_tokens_task',
         'schedule': crontab(minute=0, hour=0)
     },
+    'send-low-inventory-digests': {
+        'task': 'store.tasks.send_low_inventory_digests_task',
+        'schedule': crontab(minute='*/15'),
+    },
     # 'notify_customers': {
     #     'task': 'playground.tasks.notify_customers',
     #     'schedule': 5,
@@ -51,6 +51,10 @@ router.register(r'api/v1/auth/generate-token-for-user',
 router.register(r'api/v1/auth/staff-notifications', views.StaffNotificationViewSet,
                 basename='staff-notifications'),
 
+# djoser's user routes, served by our UserViewSet.
+user_router = DefaultRouter()
+user_router.register(r'users', views.UserViewSet)
+
 
 urlpatterns = [
     re_path(r'^accounts/login/$',
@@ -60,10 +64,10 @@ urlpatterns = [
     path('api/v1/admin/', admin.site.urls),
     path('api/v1/core/', include('core.urls')),
     path('api/v1/store/', include('store.urls')),
-    path('api/v1/auth/', include('djoser.urls')),
+    path('api/v1/auth/', include(user_router.urls)),
     path('api/v1/auth/', include('djoser.urls.jwt')),
     path('api/v1/auth/', include('djoser.urls.authtoken')),
-    path('api/v1/auth/customer/', include('djoser.urls')),
+    path('api/v1/auth/customer/', include(user_router.urls)),
     path('api/v1/auth/customer/', include('djoser.urls.jwt')),
     path('__debug__/', include(debug_toolbar.urls)),
     path('api/v1/swagger/', schema_view.with_ui('swagger', cache_timeout=0)),